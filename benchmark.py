@@ -0,0 +1,304 @@
+"""Benchmark de ponta a ponta do LeadAnalyzerOffline.
+
+Gera uma planilha sintética determinística (mesma semente = mesmo arquivo), com
+períodos em formatos variados e colunas de porcentagem como nas planilhas reais,
+e mede cada etapa sem interface gráfica (backend Agg): leitura, preparação,
+índices, filtro, agregação, as oito visualizações e o relatório PDF.
+
+Os resultados saem em JSON, para comparar execuções antes e depois de uma mudança:
+
+    python benchmark.py --abas 4 --origens 60 --periodos 24 --linhas 20000 --saida resultado.json
+"""
+import matplotlib
+matplotlib.use("Agg")
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import main
+
+
+CITY_NAMES = ["Recife", "Natal", "Maceio", "Joao Pessoa", "Aracaju", "Teresina",
+              "Sao Luis", "Belem", "Manaus", "Goiania", "Curitiba", "Vitoria"]
+
+MONTH_NAMES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho",
+               "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+# Formas como um mesmo mês aparece nas planilhas reais
+PERIOD_STYLES = [
+    lambda dt: f"{main.MONTH_ABBR_DISPLAY[dt.month].capitalize()}-{dt:%y}",   # Fev-23
+    lambda dt: f"{main.MONTH_ABBR_DISPLAY[dt.month]}/{dt:%y}",                # fev/23
+    lambda dt: f"{MONTH_NAMES[dt.month - 1]} {dt:%Y}",                        # Fevereiro 2023
+    lambda dt: f"{dt:%b-%y}",                                                 # Feb-23
+    lambda dt: f"{dt:%Y-%m-%d}",                                              # 2023-02-01
+    lambda dt: f"{dt:%m/%Y}",                                                 # 02/2023
+    lambda dt: f"  {dt:%Y-%m} ",                                              # com espaços
+    lambda dt: dt,                                                            # data do Excel
+]
+
+# Visualizações do dashboard: (nome, método do app, dado de entrada)
+VIEWS = [
+    ("Visão Geral", "build_summary_view", "agg"),
+    ("Desempenho por Origem", "build_origin_performance_view", "agg"),
+    ("Conversão por Canal", "build_conversion_by_channel_view", "agg"),
+    ("Evolução Mensal", "build_monthly_trend_view", "agg"),
+    ("Top Canais", "build_top_channels_view", "agg"),
+    ("Eficiência de Vendas", "build_sales_efficiency_view", "agg"),
+    ("Correlação Leads-Vendas", "build_correlation_view", "corr"),
+    ("Dispersão Leads x Vendas", "build_scatter_plots_view", "agg"),
+]
+
+# Largura (px) usada para rasterizar as visualizações, como no dashboard
+VIEW_WIDTH_PX = 1200
+
+# Executado em um interpretador novo para medir a abertura do app: importação do
+# módulo, janela criada e desenhada (quando há display) e pré-carga das bibliotecas
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter() - start
+window = None
+try:
+    root = main.ctk.CTk()
+    app = main.LeadAnalyzerApp(root)
+    root.update()
+    window = time.perf_counter() - start
+    root.destroy()
+except Exception:
+    pass  # Sem display: só a importação é medida
+warmup_start = time.perf_counter()
+main.warm_up_imports()
+print(json.dumps({"import": imported, "window": window, "warmup": time.perf_counter() - warmup_start}))
+"""
+
+
+def generate_workbook(path, sheets=4, origins=60, periods=24, rows=5000, seed=42):
+    """Grava uma planilha sintética determinística e devolve seu caminho"""
+    rng = np.random.default_rng(seed)
+    months = [datetime(2022 + m // 12, m % 12 + 1, 1) for m in range(periods)]
+    origin_names = [f"Canal {i:03d}" for i in range(origins)]
+    # Origens com peso desigual, como nas bases reais
+    weights = rng.pareto(1.5, origins) + 1
+    weights /= weights.sum()
+
+    with pd.ExcelWriter(path) as writer:
+        for s in range(sheets):
+            city = CITY_NAMES[s] if s < len(CITY_NAMES) else f"Cidade {s + 1}"
+            month_idx = rng.integers(0, periods, rows)
+            style_idx = rng.integers(0, len(PERIOD_STYLES), rows)
+            period_values = [PERIOD_STYLES[st](months[m]) for m, st in zip(month_idx, style_idx)]
+
+            origem = rng.choice(origin_names, rows, p=weights).astype(object)
+            # Linhas de consolidação misturadas aos dados
+            origem[rng.random(rows) < 0.01] = "Total"
+            origem[rng.random(rows) < 0.005] = "Total Geral"
+
+            contatos = rng.poisson(120, rows).astype(float)
+            aproveitados = rng.binomial(contatos.astype(int), 0.4).astype(float)
+            vendas = rng.binomial(aproveitados.astype(int), 0.15).astype(float)
+            contatos[rng.random(rows) < 0.01] = np.nan
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                conversao = np.where(contatos > 0, vendas / contatos * 100, np.nan)
+                aproveitamento = np.where(contatos > 0, aproveitados / contatos * 100, np.nan)
+
+            pd.DataFrame({
+                "Período": period_values,
+                "Origem": origem,
+                "Contatos": contatos,
+                "Aproveitados": aproveitados,
+                "Vendas": vendas,
+                "Conversão %": [f"{v:.1f}%".replace('.', ',') if v == v else "" for v in conversao],
+                "% Aproveitamento": [f"{v:.2f}%" if v == v else "-" for v in aproveitamento],
+            }).to_excel(writer, sheet_name=city, index=False)
+
+        # Aba ignorada na importação
+        pd.DataFrame({"x": [1, 2, 3]}).to_excel(writer, sheet_name="Planilha1", index=False)
+
+    return path
+
+
+def timed(results, stage, repeat, func):
+    """Executa func `repeat` vezes, registra os tempos da etapa e devolve o último resultado"""
+    value = None
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        runs.append(time.perf_counter() - start)
+    results[stage] = {
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "runs": runs,
+    }
+    return value
+
+
+def measure_startup(repeat=3):
+    """Tempo de abertura do app, cada medição em um processo novo"""
+    app_dir = os.path.dirname(os.path.abspath(main.__file__))
+    samples = {"startup.process": [], "startup.import": [], "startup.window": [], "startup.warmup": []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=app_dir,
+                                   capture_output=True, text=True, check=True)
+        samples["startup.process"].append(time.perf_counter() - start)
+        measured = json.loads(completed.stdout.strip().splitlines()[-1])
+        for key, value in measured.items():
+            if value is not None:
+                samples[f"startup.{key}"].append(value)
+
+    return {
+        stage: {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+        for stage, runs in samples.items() if runs
+    }
+
+
+def prepare_copy(raw):
+    """Prepara e compacta uma cópia das abas lidas; devolve (abas, relatório de memória)"""
+    data = {city: df.copy() for city, df in raw.items()}
+    return data, main.prepare_workbook(data)
+
+
+def run_benchmark(workbook, repeat=3, workers=main.INGEST_WORKERS, memory=None):
+    """Mede as etapas do pipeline sobre a planilha e devolve {etapa: tempos}.
+    Se `memory` for um dicionário, recebe a memória de cada aba (MB) antes e depois
+    da compactação."""
+    stages = {}
+
+    timed(stages, "load.read_sheets", repeat, lambda: main.read_sheets(workbook, workers=workers))
+    timed(stages, "load.read_sheets_streaming", repeat, lambda: main.read_sheets_streaming(workbook))
+
+    # Cache em diretório temporário: gravação uma vez, leitura medida
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = main.SheetCache(cache_dir=cache_dir)
+        file_hash = cache.file_hash(workbook)
+        cache.store_workbook(file_hash, main.read_sheets(workbook, workers=workers))
+        timed(stages, "load.cache_hit", repeat, lambda: cache.load_workbook(file_hash))
+
+    raw = main.read_sheets(workbook, workers=workers)
+    data, report = timed(stages, "load.prepare", repeat, lambda: prepare_copy(raw))
+    if memory is not None:
+        memory.update({sheet: {"before": before / (1024 * 1024), "after": after / (1024 * 1024)}
+                       for sheet, (before, after) in report.items()})
+    dataset = timed(stages, "load.index", repeat, lambda: main.LeadDataset(data))
+
+    city = next(iter(data))
+    windows = main.period_windows(dataset.consolidated.periods, None)
+    start_dt, end_dt = windows[0] if windows else (None, None)
+    origins = tuple(sorted(dataset.consolidated.df['origem'].dropna().astype(str).unique()))
+    selections = {
+        "total": main.FilterState("Total", start_dt, end_dt, ()),
+        "city": main.FilterState(city, start_dt, end_dt, ()),
+        "city_origins": main.FilterState(city, start_dt, end_dt, origins[::2]),
+    }
+
+    for name, state in selections.items():
+        timed(stages, f"filter.{name}", repeat, lambda: dataset.frame(state))
+        timed(stages, f"aggregate.{name}", repeat, lambda: dataset.aggregate(state))
+
+    # As visualizações são métodos do app, mas não usam a janela: basta uma
+    # instância criada sem __init__ (sem Tk)
+    app = main.LeadAnalyzerApp.__new__(main.LeadAnalyzerApp)
+    state = selections["total"]
+    inputs = {"agg": dataset.aggregate(state), "corr": dataset.correlations(state)}
+
+    for view, method, arg in VIEWS:
+        builder = getattr(app, method)
+        result = timed(stages, f"view.{view}.build", repeat, lambda: builder(inputs[arg]))
+        figures = result.get('figures', [])
+        timed(stages, f"view.{view}.draw", repeat,
+              lambda: [main.render_figure_png(fig, VIEW_WIDTH_PX) for fig in figures])
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        pdf_path = os.path.join(out_dir, "relatorio.pdf")
+        timed(stages, "pdf.report", repeat,
+              lambda: main.write_pdf_report(pdf_path, "Total", pd.Timestamp(start_dt), pd.Timestamp(end_dt),
+                                            inputs["agg"], inputs["corr"]))
+
+    return stages
+
+
+def environment():
+    """Versões e máquina, para que resultados de execuções diferentes sejam comparáveis"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "backend": matplotlib.get_backend(),
+    }
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta do LeadAnalyzerOffline")
+    parser.add_argument("--planilha", help="usar esta planilha em vez de gerar uma sintética")
+    parser.add_argument("--abas", type=int, default=4, help="abas (cidades) da planilha sintética")
+    parser.add_argument("--origens", type=int, default=60, help="origens distintas")
+    parser.add_argument("--periodos", type=int, default=24, help="meses distintos")
+    parser.add_argument("--linhas", type=int, default=5000, help="linhas por aba")
+    parser.add_argument("--semente", type=int, default=42, help="semente do gerador")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções de cada etapa")
+    parser.add_argument("--processos", type=int, default=main.INGEST_WORKERS, help="processos na leitura das abas")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    params = {
+        "sheets": args.abas, "origins": args.origens, "periods": args.periodos,
+        "rows_per_sheet": args.linhas, "seed": args.semente,
+        "repeat": args.repeticoes, "workers": args.processos,
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        workbook = args.planilha
+        generate_seconds = None
+        if workbook is None:
+            start = time.perf_counter()
+            workbook = generate_workbook(os.path.join(work_dir, "sintetica.xlsx"), args.abas,
+                                         args.origens, args.periodos, args.linhas, args.semente)
+            generate_seconds = time.perf_counter() - start
+        else:
+            params = {"workbook": os.path.abspath(workbook), "repeat": args.repeticoes, "workers": args.processos}
+
+        # Mensagens do app vão para stderr; stdout fica só com o JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            memory = {}
+            stages = measure_startup(args.repeticoes)
+            stages.update(run_benchmark(workbook, args.repeticoes, args.processos, memory))
+        params["file_mb"] = os.path.getsize(workbook) / (1024 * 1024)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": params,
+        "environment": environment(),
+        "generate_seconds": generate_seconds,
+        "stages": stages,
+        "memory_mb": memory,
+    }
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,1252 +1,3912 @@
 import pandas as pd
 import numpy as np
 import customtkinter as ctk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from PIL import Image as PILImage
 from tkinter import ttk, filedialog, messagebox
 from datetime import datetime
 import re
 import os
-import tempfile
-import seaborn as sns
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+import sys
+import argparse
+import json
+import sqlite3
+import time
+import hashlib
+import threading
+import logging
+import cProfile
+import pstats
+import multiprocessing
+from io import BytesIO, StringIO
+from collections import namedtuple, OrderedDict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
-class LeadAnalyzerApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Sistema de Análise de Leads")
-        self.root.geometry("1400x900")
-        
-        self.data = None
-        self.current_city = "Total"
-        self.all_periods = []
-        self.selected_origins = []
-        
-        # Criar layout principal
-        self.main_frame = ctk.CTkFrame(root)
-        self.main_frame.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        # Painel de controle
-        self.control_panel = ctk.CTkFrame(self.main_frame, width=250)
-        self.control_panel.pack(side="left", fill="y", padx=(0, 10))
-        
-        # Botão para carregar arquivo
-        self.load_button = ctk.CTkButton(self.control_panel, text="Carregar Planilha", command=self.load_file)
-        self.load_button.pack(pady=10, padx=10, fill="x")
-        
-        # Seletor de cidade
-        self.city_label = ctk.CTkLabel(self.control_panel, text="Selecione a Cidade:")
-        self.city_label.pack(pady=(1, 1))
-        
-        self.city_var = ctk.StringVar(value="Total")
-        self.city_selector = ctk.CTkComboBox(
-            self.control_panel, 
-            values=["Total"],
-            variable=self.city_var
-        )
-        self.city_selector.pack(pady=5, padx=10, fill="x")
-        
-        # Adicionar seletores de período inicial e final
-        self.period_label_start = ctk.CTkLabel(self.control_panel, text="Intervalo de Período:")
-        self.period_label_start.pack(pady=(1, 1))
-        
-        self.period_var_start = ctk.StringVar(value="")
-        self.period_selector_start = ctk.CTkComboBox(
-            self.control_panel, 
-            values=[],
-            variable=self.period_var_start
-        )
-        self.period_selector_start.pack(pady=5, padx=10, fill="x")
-        
-        self.period_var_end = ctk.StringVar(value="")
-        self.period_selector_end = ctk.CTkComboBox(
-            self.control_panel, 
-            values=[],
-            variable=self.period_var_end
-        )
-        self.period_selector_end.pack(pady=5, padx=10, fill="x")
-        
-        # Filtro de origem - Layout melhorado
-        self.origin_label = ctk.CTkLabel(self.control_panel, text="Filtrar por Origem:")
-        self.origin_label.pack(pady=(1, 1))
-        
-        # Frame para controles de origem
-        self.origin_control_frame = ctk.CTkFrame(self.control_panel)
-        self.origin_control_frame.pack(fill="x", padx=10, pady=(0, 5))
-        
-        # Botão Selecionar Todas
-        self.select_all_button = ctk.CTkButton(
-            self.origin_control_frame, 
-            text="Todas",
-            width=60,
-            command=self.select_all_origins
-        )
-        self.select_all_button.pack(side="left", padx=(0, 5))
-        
-        # Botão Limpar Seleção
-        self.clear_button = ctk.CTkButton(
-            self.origin_control_frame, 
-            text="Nenhuma",
-            width=60,
-            command=self.clear_all_origins
-        )
-        self.clear_button.pack(side="left", padx=(0, 5))
-        
-        # Campo de pesquisa
-        self.search_origin = ctk.CTkEntry(
-            self.origin_control_frame,
-            placeholder_text="Pesquisar..."
-        )
-        self.search_origin.pack(side="left", fill="x", expand=True, padx=(0, 5))
-        self.search_origin.bind("<KeyRelease>", self.filter_origin_list)
-        
-        # Frame rolável para checkboxes
-        self.origin_frame = ctk.CTkScrollableFrame(self.control_panel, height=150)
-        self.origin_frame.pack(fill="x", padx=10, pady=5)
-        self.origin_checkboxes = {}
+# Abas que não representam cidades e são ignoradas na importação
+ABAS_EXCLUIDAS = ["Salvador", "Planilha1", "Fortaleza", "Deliverysalvador1",
+                  "Deliverysalvador4", "SSA", "Brasília", "J4ASSUNCAO"]
 
-        # Botão para aplicar filtros
-        self.apply_button = ctk.CTkButton(
-            self.control_panel,
-            text="Aplicar Filtros",
-            command=self.apply_filters
-        )
-        self.apply_button.pack(pady=10, padx=10, fill="x")
-        
-        # Seletor de visualização
-        self.view_label = ctk.CTkLabel(self.control_panel, text="Tipo de Visualização:")
-        self.view_label.pack(pady=(1, 1))
-        
-        self.view_var = ctk.StringVar(value="Visão Geral")
-        self.view_selector = ctk.CTkComboBox(
-            self.control_panel, 
-            values=[
-                "Visão Geral",
-                "Desempenho por Origem",
-                "Conversão por Canal",
-                "Evolução Mensal",
-                "Top Canais",
-                "Eficiência de Vendas",
-                "Correlação Leads-Vendas",
-                "Dispersão Leads x Vendas"
-            ],
-            variable=self.view_var,
-            command=self.update_dashboard
-        )
-        self.view_selector.pack(pady=5, padx=10, fill="x")
-        
-        # Botão de exportar
-        self.export_button = ctk.CTkButton(self.control_panel, text="Exportar Relatório PDF", command=self.export_report)
-        self.export_button.pack(pady=20, padx=10, fill="x")
-        
-        # Área de dashboard
-        self.dashboard_frame = ctk.CTkFrame(self.main_frame)
-        self.dashboard_frame.pack(side="right", fill="both", expand=True)
-        
-        # Notebook para múltiplas visualizações
-        self.notebook = ttk.Notebook(self.dashboard_frame)
-        self.notebook.pack(fill="both", expand=True)
-        
-        # Abas do notebook
-        self.tab1 = ctk.CTkFrame(self.notebook)
-        self.tab2 = ctk.CTkFrame(self.notebook)
-        
-        self.notebook.add(self.tab1, text="Dashboard")
-        self.notebook.add(self.tab2, text="Dados Detalhados")
-        
-        # Inicializar widgets vazios
-        self.init_dashboard()
-        
-        self.period_mapping = {}  # Mapeamento período formatado -> original
-        self.origin_vars = {}  # {origem: BooleanVar}
-        self.origin_checkboxes = {}  # {origem: widget}
-        self.all_origins = []  # Lista completa de origens disponíveis
-        self.current_origins = []  # Lista de origens atuais
+# Versão do pipeline de limpeza das abas. Incrementar sempre que clean_column_name,
+# convert_numeric_columns ou convert_percentage mudarem, para invalidar o cache.
+CLEANING_PIPELINE_VERSION = 2
 
-    def init_dashboard(self):
-        # Widgets para a primeira aba
-        self.summary_frame = ctk.CTkScrollableFrame(self.tab1)
-        self.summary_frame.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        # Widgets para a segunda aba
-        self.data_frame = ctk.CTkFrame(self.tab2)
-        self.data_frame.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        # Placeholders
-        self.summary_label = ctk.CTkLabel(self.summary_frame, text="Carregue uma planilha para começar a análise")
-        self.summary_label.pack(pady=50)
-        
-        self.data_label = ctk.CTkLabel(self.data_frame, text="Os dados detalhados serão exibidos aqui")
-        self.data_label.pack(pady=50)
-    
-    def load_file(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Excel files", "*.xlsx *.xls")]
-        )
-        if not file_path:
+# Número de processos usados para ler as abas em paralelo (1 = leitura sequencial)
+INGEST_WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+# Leitura em streaming (openpyxl read-only) para planilhas muito grandes
+STREAMING_MIN_FILE_MB = 50
+STREAM_CHUNK_ROWS = 50000
+STREAM_COLUMNS = ['periodo', 'origem', 'contatos', 'aproveitados', 'vendas']
+STREAM_NUMERIC_COLUMNS = ['contatos', 'aproveitados', 'vendas']
+
+# Cache local das planilhas já processadas
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".lead_analyzer_cache")
+CACHE_MAX_BYTES = 500 * 1024 * 1024  # 500 MB
+CACHE_MAX_AGE_DAYS = 30
+
+# Diagnóstico: tempos das etapas (JSON por linha, com rotação) e perfis do cProfile
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".lead_analyzer_logs")
+TIMING_LOG_FILE = os.path.join(LOG_DIR, "timings.jsonl")
+TIMING_LOG_MAX_BYTES = 5 * 1024 * 1024  # 5 MB por arquivo
+TIMING_LOG_BACKUPS = 3
+TIMING_HISTORY_SIZE = 500  # registros mantidos em memória para o painel
+
+
+class StageTimer:
+    """Mede a duração das etapas do processamento (spans). Os registros mais recentes
+    ficam em memória para o painel de diagnóstico e, com o log ativado, cada um é
+    gravado como uma linha JSON em um arquivo com rotação."""
+
+    def __init__(self, history_size=TIMING_HISTORY_SIZE):
+        self.records = deque(maxlen=history_size)
+        self.lock = threading.Lock()
+        self.logger = None
+        self.log_pid = None  # processos filhos (fork) herdam o logger, mas não gravam
+
+    def enable_log(self, log_file=TIMING_LOG_FILE, max_bytes=TIMING_LOG_MAX_BYTES, backups=TIMING_LOG_BACKUPS):
+        """Passa a gravar os registros no arquivo (só no processo principal)"""
+        try:
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        except OSError as e:
+            print(f"Erro ao abrir log de tempos: {log_file}, erro: {str(e)}")
             return
-            
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('lead_analyzer.timings')
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.handlers = [handler]
+        self.logger = logger
+        self.log_pid = os.getpid()
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """Registra quanto tempo o bloco levou"""
+        start = time.perf_counter()
         try:
-            # Carregar todas as abas do Excel
-            self.data = {}
-            abas_excluidas = ["Salvador", "Planilha1", "Fortaleza", "Deliverysalvador1", 
-                             "Deliverysalvador4", "SSA", "Brasília", "J4ASSUNCAO"]
-            
-            with pd.ExcelFile(file_path) as xls:
-                for sheet_name in xls.sheet_names:
-                    if sheet_name in abas_excluidas:
-                        continue
-                        
-                    df = pd.read_excel(xls, sheet_name)
-                    
-                    # Padronizar nomes de colunas
-                    df.columns = [self.clean_column_name(col) for col in df.columns]
-                    
-                    # Converter colunas numéricas
-                    df = self.convert_numeric_columns(df)
-                    
-                    # Converter porcentagens
-                    for col in df.columns:
-                        if 'conversao' in col.lower() or '%' in col.lower():
-                            df[col] = self.convert_percentage(df[col])
-                    
-                    # Adicionar coluna de cidade
-                    df['cidade'] = sheet_name
-                    
-                    self.data[sheet_name] = df
-            
-            # Coletar e processar todos os períodos únicos
-            unique_period_dates = set()
-            unique_period_strings = {}
-            
-            for sheet_name, df in self.data.items():
-                # Identificar coluna de período
-                periodo_col = None
-                for col in df.columns:
-                    if 'periodo' in col.lower() or 'período' in col.lower():
-                        periodo_col = col
-                        break
-                
-                if periodo_col:
-                    # Processar cada valor de período
-                    for p in df[periodo_col].dropna().unique():
-                        # Converter para objeto datetime
-                        dt = self.parse_period(p)
-                        display_value = self.format_period_display(dt)
-                        unique_period_dates.add(dt)
-                        unique_period_strings[dt] = p
-            
-            # Ordenar os períodos e converter para formato de exibição
-            sorted_periods = sorted(unique_period_dates)
-            self.all_periods = [str(unique_period_strings[dt]) for dt in sorted_periods]
-            self.display_periods = [self.format_period_display(dt) for dt in sorted_periods]  # Lista formatada
-
-            self.period_mapping = {}
-            for i, dt in enumerate(sorted_periods):
-                display_val = self.display_periods[i]
-                original_val = self.all_periods[i]
-                self.period_mapping[display_val] = original_val
-
-            # Atualize os comboboxes com os valores formatados
-            self.period_selector_start.configure(values=self.display_periods)
-            self.period_selector_end.configure(values=self.display_periods)
-            if self.display_periods:
-                self.period_var_start.set(self.display_periods[0])
-                self.period_var_end.set(self.display_periods[-1])
-            
-            # Atualizar seletor de cidades
-            cities = ["Total"] + list(self.data.keys())
-            self.city_selector.configure(values=cities)
-            
-            # Processar dados
-            self.process_data()
-            self.update_origin_checklist()
-            self.update_dashboard()
-            
-        except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            messagebox.showerror("Erro", f"Falha ao carregar arquivo:\n{str(e)}\n\nDetalhes:\n{error_details}")
-    
-    def clean_column_name(self, name):
-        """Padroniza nomes de colunas"""
-        name = str(name).strip().lower()
-        
-        # Preservar o nome da coluna de período
-        if 'período' in name or 'periodo' in name:
-            return 'periodo'
-            
-        # Substituir caracteres especiais, mantendo números
-        name = re.sub(r'[^\w\s]', '_', name)
-        name = re.sub(r'\s+', '_', name)
-        return name
+            yield fields  # o bloco pode completar os campos (ex.: linhas processadas)
+        finally:
+            self.record(stage, time.perf_counter() - start, **fields)
+
+    def record(self, stage, seconds, **fields):
+        entry = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'stage': stage,
+            'ms': round(seconds * 1000, 3),
+            'thread': threading.current_thread().name,
+        }
+        entry.update(fields)
+        with self.lock:
+            self.records.append(entry)
+        if self.logger is not None and os.getpid() == self.log_pid:
+            self.logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def snapshot(self):
+        """Cópia dos registros em memória, do mais antigo ao mais recente"""
+        with self.lock:
+            return list(self.records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+# Instância usada por todo o módulo
+TIMINGS = StageTimer()
+
+
+def clean_column_name(name):
+    """Padroniza nomes de colunas"""
+    name = str(name).strip().lower()
     
-    def apply_filters(self):
-        """Aplica os filtros sem recriar a lista de origens"""
-        self.update_dashboard()
+    # Preservar o nome da coluna de período
+    if 'período' in name or 'periodo' in name:
+        return 'periodo'
+        
+    # Substituir caracteres especiais, mantendo números
+    name = re.sub(r'[^\w\s]', '_', name)
+    name = re.sub(r'\s+', '_', name)
+    return name
 
-    def on_filter_change(self, event=None):
-        """Atualiza a lista de origens quando os filtros mudam"""
-        self.update_origin_checklist()
-        self.update_dashboard()
 
-    def convert_numeric_columns(self, df):
-        """Converte colunas numéricas conhecidas para tipo float"""
-        numeric_columns = ['contatos', 'aproveitados', 'vendas', 'leads', 'conversao']
-        for col in numeric_columns:
-            if col in df.columns:
-                try:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-                except:
-                    pass
-        return df
+def convert_numeric_columns(df):
+    """Converte colunas numéricas conhecidas para tipo float"""
+    numeric_columns = ['contatos', 'aproveitados', 'vendas', 'leads', 'conversao']
+    for col in numeric_columns:
+        if col in df.columns:
+            try:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            except:
+                pass
+    return df
+
+
+def convert_percentage(series):
+    """Converte porcentagens para valores numéricos"""
+    if series.dtype == 'object':
+        # Tentar converter strings com % para float
+        series = series.astype(str).str.replace('%', '').str.replace(',', '.').str.strip()
+        series = pd.to_numeric(series, errors='coerce') / 100
+    return series
+
+
+def clean_sheet(df, sheet_name):
+    """Aplica o pipeline de limpeza a uma aba recém-lida"""
+    # Padronizar nomes de colunas
+    df.columns = [clean_column_name(col) for col in df.columns]
     
-    def convert_percentage(self, series):
-        """Converte porcentagens para valores numéricos"""
-        if series.dtype == 'object':
-            # Tentar converter strings com % para float
-            series = series.astype(str).str.replace('%', '').str.replace(',', '.').str.strip()
-            series = pd.to_numeric(series, errors='coerce') / 100
-        return series
+    # Converter colunas numéricas
+    df = convert_numeric_columns(df)
     
-    def parse_period(self, period_str):
-        """Converte período em formato datetime para ordenação"""
-        try:
-            # Se já for um objeto datetime/Timestamp
-            if isinstance(period_str, (datetime, pd.Timestamp)):
-                return period_str
-            
-            # Converter para string
-            period_str = str(period_str).strip()
-            
-            # Tentar diferentes formatos de data
-            formats = [
-                "%Y-%m-%d",    # 2023-07-01
-                "%Y-%m-%d %H:%M:%S",  # 2023-07-01 00:00:00
-                "%Y-%m",        # 2023-07
-                "%b-%y",        # Jul-23
-                "%b %y",        # Jul 23
-                "%B %Y",        # July 2023
-                "%m/%d/%Y",     # 07/01/2023
-                "%d/%m/%Y",     # 01/07/2023
-                "%d-%m-%Y"      # 01-07-2023
-            ]
-            
-            for fmt in formats:
-                try:
-                    return datetime.strptime(period_str, fmt)
-                except ValueError:
-                    continue
-            
-            # Mapeamento de meses em português
-            month_map_full = {
-                'janeiro': 1, 'fevereiro': 2, 'março': 3, 'abril': 4, 
-                'maio': 5, 'junho': 6, 'julho': 7, 'agosto': 8, 
-                'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12
-            }
-            
-            month_map_abbr = {
-                'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
-                'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12
-            }
-            
-            # Verificar se é apenas o nome do mês
-            if period_str.lower() in month_map_full:
-                year = datetime.now().year
-                return datetime(year, month_map_full[period_str.lower()], 1)
+    # Converter porcentagens
+    for col in df.columns:
+        if 'conversao' in col.lower() or '%' in col.lower():
+            df[col] = convert_percentage(df[col])
+    
+    # Adicionar coluna de cidade (categórica: um código por linha, não uma string)
+    df['cidade'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[sheet_name])
+    return df
+
+
+# Formatos de data tentados, em ordem, por parse_period
+PERIOD_FORMATS = [
+    "%Y-%m-%d",    # 2023-07-01
+    "%Y-%m-%d %H:%M:%S",  # 2023-07-01 00:00:00
+    "%Y-%m",        # 2023-07
+    "%b-%y",        # Jul-23
+    "%b %y",        # Jul 23
+    "%B %Y",        # July 2023
+    "%m/%d/%Y",     # 07/01/2023
+    "%d/%m/%Y",     # 01/07/2023
+    "%d-%m-%Y"      # 01-07-2023
+]
+
+# Mapeamento de meses em português
+MONTH_MAP_FULL = {
+    'janeiro': 1, 'fevereiro': 2, 'março': 3, 'abril': 4, 
+    'maio': 5, 'junho': 6, 'julho': 7, 'agosto': 8, 
+    'setembro': 9, 'outubro': 10, 'novembro': 11, 'dezembro': 12
+}
+
+MONTH_MAP_ABBR = {
+    'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12
+}
+
+MONTH_ABBR_DISPLAY = {number: abbr for abbr, number in MONTH_MAP_ABBR.items()}
+
+# Data padrão para períodos não reconhecidos (ficam no início da ordenação)
+DEFAULT_PERIOD = datetime(1900, 1, 1)
+
+
+def parse_period(period_str):
+    """Converte período em formato datetime para ordenação"""
+    try:
+        # Se já for um objeto datetime/Timestamp
+        if isinstance(period_str, (datetime, pd.Timestamp)):
+            return period_str
+        
+        # Converter para string
+        period_str = str(period_str).strip()
+        
+        # Tentar diferentes formatos de data
+        for fmt in PERIOD_FORMATS:
+            try:
+                return datetime.strptime(period_str, fmt)
+            except ValueError:
+                continue
+        
+        # Verificar se é apenas o nome do mês
+        if period_str.lower() in MONTH_MAP_FULL:
+            year = datetime.now().year
+            return datetime(year, MONTH_MAP_FULL[period_str.lower()], 1)
+        
+        # Tentar padrões como "Jan-23" ou "Janeiro 2023"
+        match = re.match(r'(\D{3,}).*?(\d{2,4})', period_str, re.IGNORECASE)
+        if match:
+            month_str = match.group(1).lower()
+            year_str = match.group(2)
             
-            # Tentar padrões como "Jan-23" ou "Janeiro 2023"
-            match = re.match(r'(\D{3,}).*?(\d{2,4})', period_str, re.IGNORECASE)
-            if match:
-                month_str = match.group(1).lower()
-                year_str = match.group(2)
+            # Verificar mês completo
+            if month_str in MONTH_MAP_FULL:
+                month = MONTH_MAP_FULL[month_str]
+            # Verificar abreviação
+            elif month_str[:3] in MONTH_MAP_ABBR:
+                month = MONTH_MAP_ABBR[month_str[:3]]
+            else:
+                return DEFAULT_PERIOD
                 
-                # Verificar mês completo
-                if month_str in month_map_full:
-                    month = month_map_full[month_str]
-                # Verificar abreviação
-                elif month_str[:3] in month_map_abbr:
-                    month = month_map_abbr[month_str[:3]]
-                else:
-                    return datetime(1900, 1, 1)
-                    
-                year = int(year_str) if len(year_str) == 4 else 2000 + int(year_str)
+            year = int(year_str) if len(year_str) == 4 else 2000 + int(year_str)
+            return datetime(year, month, 1)
+        
+        # Tentar padrão de apenas números (MM/AAAA)
+        parts = re.findall(r'\d+', period_str)
+        if len(parts) >= 2:
+            month = int(parts[0])
+            year = int(parts[1]) if len(parts[1]) == 4 else 2000 + int(parts[1])
+            if 1 <= month <= 12:
                 return datetime(year, month, 1)
-            
-            # Tentar padrão de apenas números (MM/AAAA)
-            parts = re.findall(r'\d+', period_str)
-            if len(parts) >= 2:
-                month = int(parts[0])
-                year = int(parts[1]) if len(parts[1]) == 4 else 2000 + int(parts[1])
-                if 1 <= month <= 12:
-                    return datetime(year, month, 1)
-            
-            return datetime(1900, 1, 1)  # Data padrão para ordenação
-            
-        except Exception as e:
-            print(f"Erro ao analisar período: {period_str}, erro: {str(e)}")
-            return datetime(1900, 1, 1)
-    
-    def format_period_display(self, dt):
-        """Formata período para exibição no formato 'jan/25'"""
-        month_abbr = {
-            1: 'jan', 2: 'fev', 3: 'mar', 4: 'abr', 
-            5: 'mai', 6: 'jun', 7: 'jul', 8: 'ago', 
-            9: 'set', 10: 'out', 11: 'nov', 12: 'dez'
-        }
-        return f"{month_abbr[dt.month]}/{dt.strftime('%y')}"
-    
-    def process_data(self):
-        """Processa dados brutos e prepara para análise"""
-        # Criar DataFrame consolidado
-        self.consolidated_data = pd.concat(self.data.values(), ignore_index=True)
         
-        # Identificar coluna de período
-        periodo_col = None
-        for col in self.consolidated_data.columns:
-            if 'periodo' in col.lower():
-                periodo_col = col
-                break
-                
-        if periodo_col:
-            self.consolidated_data['periodo_dt'] = self.consolidated_data[periodo_col].apply(self.parse_period)
-            # Renomear para o nome padrão
-            self.consolidated_data.rename(columns={periodo_col: 'periodo'}, inplace=True)
-    
-    def select_all_origins(self):
-        """Marca todas as origens"""
-        for origin in self.all_origins:
-            self.origin_vars[origin].set(True)
+        return DEFAULT_PERIOD
+        
+    except Exception as e:
+        print(f"Erro ao analisar período: {period_str}, erro: {str(e)}")
+        return DEFAULT_PERIOD
+
+
+# Memória de períodos já interpretados, compartilhada entre abas e recargas.
+# A chave inclui o tipo para não confundir, por exemplo, 1 e 1.0.
+_PERIOD_MEMO = {}
+
+
+def parse_period_cached(value):
+    """parse_period com memória: cada valor bruto distinto é interpretado uma única vez"""
+    # Todos os NaN compartilham a mesma entrada (nan != nan)
+    if isinstance(value, float) and value != value:
+        value = np.nan
+
+    try:
+        key = (type(value), value)
+        return _PERIOD_MEMO[key]
+    except KeyError:
+        result = _PERIOD_MEMO[key] = parse_period(value)
+        return result
+    except TypeError:
+        # Valor não hashable
+        return parse_period(value)
+
+
+def month_ordinals(values):
+    """Converte datas (datetime64, datetime ou Timestamp) em ordinais de mês:
+    meses desde jan/1970, como em datetime64[M]"""
+    return np.asarray(values, dtype='datetime64[M]').astype(np.int64)
+
+
+def month_starts(ordinals):
+    """Inverso de month_ordinals: o primeiro dia de cada mês, em datetime64[ns]"""
+    return np.asarray(ordinals, dtype=np.int64).astype('datetime64[M]').astype('datetime64[ns]')
+
+
+def smallest_int_dtype(low, high):
+    """Menor tipo inteiro com sinal que comporta todos os valores entre low e high"""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+def normalize_periods(series):
+    """Converte uma coluna de períodos em ordinais de mês (month_ordinals) interpretando
+    só os valores distintos. Os resultados voltam para as linhas pelos códigos do
+    factorize, no menor tipo inteiro que comporta os meses presentes."""
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+
+    # Última posição reservada para valores ausentes (código -1)
+    parsed = np.empty(len(uniques) + 1, dtype='datetime64[M]')
+    for i, value in enumerate(uniques):
+        parsed[i] = np.datetime64(parse_period_cached(value), 'M')
+    parsed[-1] = np.datetime64(parse_period_cached(np.nan), 'M')
+
+    ordinals = parsed.astype(np.int64)
+    ordinals = ordinals.astype(smallest_int_dtype(ordinals.min(), ordinals.max()))
+    return pd.Series(ordinals.take(codes), index=series.index, name='_periodo_mes')
+
+
+def format_period_display(dt):
+    """Formata período para exibição no formato 'jan/25'"""
+    return f"{MONTH_ABBR_DISPLAY[dt.month]}/{dt.strftime('%y')}"
+
+
+# Colunas derivadas por prepare_sheet; ficam fora da tabela detalhada e das exportações.
+# O prefixo "_" sozinho não basta: clean_column_name também gera nomes como "__aproveitamento"
+INTERNAL_COLUMNS = ('_periodo_mes', '_consolidado')
+
+
+def prepare_sheet(df):
+    """Acrescenta as colunas derivadas usadas pelos filtros (calculadas uma vez na carga):
+    _periodo_mes (ordinal do mês do período) e _consolidado (linhas de total)"""
+    if 'periodo' in df.columns:
+        with TIMINGS.span('load.normalize', rows=len(df)):
+            df['_periodo_mes'] = normalize_periods(df['periodo'])
+
+    if 'origem' in df.columns:
+        origens = df['origem'].astype(str).str.lower().str.strip()
+        df['_consolidado'] = (
+            origens.str.contains('total') |
+            origens.str.contains('geral') |
+            origens.str.contains('consolidado')
+        ).to_numpy(dtype=bool)
+    return df
+
+
+# Colunas de contagem guardadas como inteiros compactos
+COUNT_COLUMNS = ['contatos', 'aproveitados', 'vendas', 'leads']
+
+
+def downcast_counts(series):
+    """Converte uma coluna de contagens para o menor inteiro que comporta os valores.
+    Valores ausentes ficam numa máscara (tipo Int8/Int16/... do pandas) em vez de NaN.
+    Colunas com valores fracionários ou não numéricas são devolvidas sem mudança."""
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return series
+
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(values)
+    present = values[~missing]
+    if not np.isfinite(present).all() or (present != np.round(present)).any():
+        return series
+
+    low, high = (present.min(), present.max()) if len(present) else (0, 0)
+    ints = np.where(missing, 0, values).astype(smallest_int_dtype(low, high))
+    if missing.any():
+        return pd.Series(pd.arrays.IntegerArray(ints, missing), index=series.index, name=series.name)
+    return pd.Series(ints, index=series.index, name=series.name)
+
+
+def compact_sheets(data, changed=None):
+    """Guarda as abas já preparadas em tipos compactos: origem e cidade categóricas,
+    com um dicionário comum a todas as abas (a base consolidada mantém as categorias
+    no concat), e contagens no menor inteiro que comporta os valores.
+    Na recarga incremental, `changed` indica as abas recém-lidas; as demais já estão
+    compactas e só são recodificadas se os dicionários mudaram.
+    Devolve {aba: (bytes antes, bytes depois)} das abas compactadas."""
+    origins = set()
+    for df in data.values():
+        if 'origem' in df.columns:
+            origins.update(df['origem'].dropna().unique().tolist())
+    try:
+        origins = sorted(origins)
+    except TypeError:
+        # Tipos mistos: ordenar pela representação em texto
+        origins = sorted(origins, key=str)
+    origin_dtype = pd.CategoricalDtype(origins)
+    city_dtype = pd.CategoricalDtype(list(data.keys()))
+
+    report = {}
+    for code, (name, df) in enumerate(data.items()):
+        if changed is not None and name not in changed:
+            if df['cidade'].dtype != city_dtype:
+                df['cidade'] = pd.Categorical.from_codes(np.full(len(df), code), dtype=city_dtype)
+            if 'origem' in df.columns and df['origem'].dtype != origin_dtype:
+                df['origem'] = df['origem'].astype(origin_dtype)
+            continue
+
+        with TIMINGS.span('load.compact', sheet=name) as span:
+            before = int(df.memory_usage(deep=True).sum())
+
+            df['cidade'] = pd.Categorical.from_codes(np.full(len(df), code), dtype=city_dtype)
+            if 'origem' in df.columns:
+                df['origem'] = df['origem'].astype(origin_dtype)
+            for col in COUNT_COLUMNS:
+                if col in df.columns:
+                    df[col] = downcast_counts(df[col])
+
+            after = int(df.memory_usage(deep=True).sum())
+            span['mb_before'] = round(before / (1024 * 1024), 2)
+            span['mb_after'] = round(after / (1024 * 1024), 2)
+        report[name] = (before, after)
+
+    if not report:
+        return report
+    before = sum(b for b, _ in report.values())
+    after = sum(a for _, a in report.values())
+    print(f"Abas compactadas: {before / (1024 * 1024):,.1f} MB -> {after / (1024 * 1024):,.1f} MB")
+    return report
+
+
+def prepare_workbook(data):
+    """Prepara (prepare_sheet) e compacta (compact_sheets) todas as abas lidas.
+    Devolve o relatório de memória por aba de compact_sheets."""
+    for df in data.values():
+        prepare_sheet(df)
+    return compact_sheets(data)
+
+
+def format_memory_report(report):
+    """Texto com a memória de cada aba antes e depois da compactação"""
+    mb = 1024 * 1024
+    lines = ["Memória por aba          Antes (MB)   Depois (MB)   Economia"]
+    rows = list(report.items())
+    if len(rows) > 1:
+        rows.append(("Total", (sum(b for b, _ in report.values()), sum(a for _, a in report.values()))))
+    for name, (before, after) in rows:
+        saving = 1 - after / before if before else 0.0
+        lines.append(f"{str(name)[:20]:<20} {before / mb:>14,.2f} {after / mb:>13,.2f} {saving:>10.0%}")
+    return "\n".join(lines)
+
+
+def read_clean_sheet(file_path, sheet_name):
+    """Lê e limpa uma única aba. Executado nos processos de leitura paralela;
+    devolve (DataFrame, segundos gastos) para o registro de tempos"""
+    start = time.perf_counter()
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    return clean_sheet(df, sheet_name), time.perf_counter() - start
+
+
+def read_sheets(file_path, workers=INGEST_WORKERS, only=None):
+    """Lê todas as abas de cidade de um arquivo (ou só as abas em `only`), em paralelo
+    quando workers > 1. O dicionário retornado preserva a ordem original das abas."""
+    with pd.ExcelFile(file_path) as xls:
+        sheet_names = [name for name in xls.sheet_names
+                       if name not in ABAS_EXCLUIDAS and (only is None or name in only)]
+
+        workers = min(workers or 1, len(sheet_names))
+        if workers <= 1:
+            data = {}
+            for name in sheet_names:
+                with TIMINGS.span('load.sheet', sheet=name) as span:
+                    data[name] = clean_sheet(pd.read_excel(xls, name), name)
+                    span['rows'] = len(data[name])
+            return data
+
+    # Cada processo abre o arquivo por conta própria; map() devolve na ordem de envio
+    data = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(read_clean_sheet, [file_path] * len(sheet_names), sheet_names)
+        for name, (df, seconds) in zip(sheet_names, results):
+            TIMINGS.record('load.sheet', seconds, sheet=name, rows=len(df), parallel=True)
+            data[name] = df
+    return data
+
+
+def read_workbook(file_path, sheet_cache=None, workers=INGEST_WORKERS, streaming_min_file_mb=STREAMING_MIN_FILE_MB):
+    """Lê e limpa todas as abas de cidade, reaproveitando o cache quando possível"""
+    start = time.perf_counter()
+    file_hash = None
+    if sheet_cache is not None:
+        try:
+            file_hash = sheet_cache.file_hash(file_path)
+            cached = sheet_cache.load_workbook(file_hash)
+            if cached is not None:
+                TIMINGS.record('load.read', time.perf_counter() - start,
+                               file=os.path.basename(file_path), mode='cache')
+                return cached
+        except Exception as e:
+            print(f"Erro ao ler cache: {file_path}, erro: {str(e)}")
+
+    streaming = os.path.getsize(file_path) >= streaming_min_file_mb * 1024 * 1024
+    if streaming:
+        data = read_sheets_streaming(file_path)
+    else:
+        data = read_sheets(file_path, workers=workers)
+
+    rss = peak_rss_mb()
+    TIMINGS.record('load.read', time.perf_counter() - start, file=os.path.basename(file_path),
+                   mode='streaming' if streaming else 'pandas', peak_rss_mb=rss)
+    print(f"Planilha lida em {time.perf_counter() - start:.1f}s "
+          f"({'streaming' if streaming else 'pandas'}, pico de memória "
+          f"{f'{rss:,.0f} MB' if rss is not None else 'N/A'})")
+
+    if file_hash is not None:
+        try:
+            sheet_cache.store_workbook(file_hash, data)
+            sheet_cache.evict()
+        except Exception as e:
+            print(f"Erro ao gravar cache: {file_path}, erro: {str(e)}")
+
+    return data
+
+
+# Extensões aceitas no modo "Carregar Pasta"
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls')
+
+
+def folder_workbooks(folder):
+    """Planilhas de uma pasta, da mais antiga para a mais recente (data de modificação,
+    depois nome). Arquivos temporários do Excel (~$) ficam de fora."""
+    paths = [
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$')
+    ]
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), os.path.basename(path)))
+
+
+def read_workbook_file(file_path, sheet_cache=None, streaming_min_file_mb=STREAMING_MIN_FILE_MB):
+    """Lê um arquivo inteiro com as abas em sequência. Executado nos processos de leitura
+    de pastas (o paralelismo é entre arquivos); devolve (abas, segundos gastos)."""
+    start = time.perf_counter()
+    data = read_workbook(file_path, sheet_cache, workers=1, streaming_min_file_mb=streaming_min_file_mb)
+    return data, time.perf_counter() - start
+
+
+def merge_workbooks(workbooks):
+    """Junta as abas de vários arquivos por cidade. `workbooks` é uma lista de {aba: DataFrame}
+    do arquivo mais antigo para o mais recente. Regra de duplicidade: para cada
+    (cidade, origem, período), ficam só as linhas do arquivo mais recente que o contém.
+    O período é comparado pelo mês (normalize_periods), então "Jan-23" e "2023-01-01"
+    são o mesmo período. Devolve ({cidade: DataFrame}, linhas descartadas)."""
+    frames = {}
+    for rank, data in enumerate(workbooks):
+        for city, df in data.items():
+            frames.setdefault(city, []).append((rank, df))
+
+    merged = {}
+    dropped = 0
+    for city, parts in frames.items():
+        if len(parts) == 1:
+            merged[city] = parts[0][1]
+            continue
+
+        df = pd.concat([part for _, part in parts], ignore_index=True)
+        ranks = pd.Series(np.repeat([rank for rank, _ in parts], [len(part) for _, part in parts]))
+
+        keys = []
+        if 'origem' in df.columns:
+            keys.append(df['origem'])
+        if 'periodo' in df.columns:
+            keys.append(normalize_periods(df['periodo']))
+        if keys:
+            # Arquivo mais recente em que cada chave aparece
+            latest = ranks.groupby(keys, dropna=False, sort=False).transform('max')
+            keep = (ranks == latest).to_numpy()
+            dropped += int((~keep).sum())
+            df = df[keep].reset_index(drop=True)
+        merged[city] = df
+    return merged, dropped
+
+
+def read_folder(folder, sheet_cache=None, workers=INGEST_WORKERS, streaming_min_file_mb=STREAMING_MIN_FILE_MB):
+    """Lê todas as planilhas de uma pasta e junta as abas por cidade (merge_workbooks).
+    Arquivos já no cache são carregados direto; os demais são lidos em paralelo,
+    um arquivo por processo. Acrescentar o arquivo de um novo mês lê só esse arquivo."""
+    start = time.perf_counter()
+    files = folder_workbooks(folder)
+    if not files:
+        raise ValueError(f"Nenhuma planilha .xlsx/.xls encontrada em {folder}")
+
+    workbooks = {}
+    pending = []
+    for path in files:
+        cached = None
+        if sheet_cache is not None:
+            try:
+                cached = sheet_cache.load_workbook(sheet_cache.file_hash(path))
+            except Exception as e:
+                print(f"Erro ao ler cache: {path}, erro: {str(e)}")
+        if cached is not None:
+            TIMINGS.record('load.file', 0.0, file=os.path.basename(path), mode='cache')
+            workbooks[path] = cached
+        else:
+            pending.append(path)
+
+    file_workers = min(workers or 1, len(pending))
+    if file_workers <= 1:
+        # Um arquivo só (ou sem paralelismo): as abas dele ainda podem ser lidas em paralelo
+        for path in pending:
+            with TIMINGS.span('load.file', file=os.path.basename(path)):
+                workbooks[path] = read_workbook(path, sheet_cache, workers=workers,
+                                                streaming_min_file_mb=streaming_min_file_mb)
+    else:
+        with ProcessPoolExecutor(max_workers=file_workers) as executor:
+            results = executor.map(read_workbook_file, pending, [sheet_cache] * len(pending),
+                                   [streaming_min_file_mb] * len(pending))
+            for path, (data, seconds) in zip(pending, results):
+                TIMINGS.record('load.file', seconds, file=os.path.basename(path), parallel=True)
+                workbooks[path] = data
+
+    with TIMINGS.span('load.merge', files=len(files)) as span:
+        data, dropped = merge_workbooks([workbooks[path] for path in files])
+        span['dropped'] = dropped
+
+    TIMINGS.record('load.read', time.perf_counter() - start, folder=os.path.basename(folder),
+                   files=len(files), read=len(pending))
+    print(f"Pasta lida em {time.perf_counter() - start:.1f}s: {len(files)} arquivos "
+          f"({len(pending)} lidos, {len(files) - len(pending)} do cache), "
+          f"{dropped} linhas substituídas por arquivos mais recentes")
+    return data
+
+
+def sheet_fingerprints(file_path):
+    """Impressão digital do conteúdo de cada aba de cidade, sem interpretar as células.
+    Num .xlsx (zip), junta o CRC e o tamanho do XML da aba, lidos do diretório do zip,
+    com o CRC da tabela de textos compartilhados: editar números muda só a aba editada,
+    editar textos muda todas. Em outros formatos, todas as abas recebem o hash do arquivo."""
+    import posixpath
+    import zipfile
+    import xml.etree.ElementTree as ET
+
+    main_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+    rel_id = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+    if not zipfile.is_zipfile(file_path):
+        digest = SheetCache.file_hash(file_path)
+        with pd.ExcelFile(file_path) as xls:
+            return {name: digest for name in xls.sheet_names if name not in ABAS_EXCLUIDAS}
+
+    with zipfile.ZipFile(file_path) as archive:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+        names = set(archive.namelist())
+        shared = archive.getinfo('xl/sharedStrings.xml').CRC if 'xl/sharedStrings.xml' in names else 0
+
+        fingerprints = {}
+        for sheet in workbook.iter(f'{main_ns}sheet'):
+            name = sheet.get('name')
+            if name in ABAS_EXCLUIDAS:
+                continue
+            target = targets.get(sheet.get(rel_id), '')
+            path = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+            if path in names:
+                info = archive.getinfo(path)
+                fingerprints[name] = f"{info.CRC:08x}-{info.file_size}-{shared:08x}"
+            else:
+                fingerprints[name] = None  # Aba sem XML conhecido: sempre relida
+        return fingerprints
+
+
+def folder_fingerprints(folder):
+    """Impressões digitais por cidade de uma pasta: as das abas com esse nome em cada
+    arquivo, na ordem em que read_folder os junta"""
+    parts = {}
+    for path in folder_workbooks(folder):
+        for name, fingerprint in sheet_fingerprints(path).items():
+            parts.setdefault(name, []).append(f"{os.path.basename(path)}:{fingerprint}")
+    return {name: "|".join(values) for name, values in parts.items()}
+
+
+def source_fingerprints(source):
+    """Impressões digitais da origem dos dados: ('arquivo', caminho) ou ('pasta', caminho)"""
+    kind, path = source
+    return folder_fingerprints(path) if kind == 'pasta' else sheet_fingerprints(path)
+
+
+def source_signature(source):
+    """Assinatura barata (nomes, datas de modificação e tamanhos) usada pelo monitor
+    de alterações para decidir quando vale calcular as impressões digitais"""
+    kind, path = source
+    paths = folder_workbooks(path) if kind == 'pasta' else [path]
+    signature = []
+    for file_path in paths:
+        stat = os.stat(file_path)
+        signature.append((os.path.basename(file_path), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def reload_sheets(source, fingerprints, sheet_cache=None, workers=INGEST_WORKERS,
+                  streaming_min_file_mb=STREAMING_MIN_FILE_MB):
+    """Compara as impressões digitais atuais da origem com as da última carga e relê só
+    as abas novas ou alteradas. Devolve (impressões digitais atuais, {aba: DataFrame limpo}
+    das abas relidas, abas que deixaram de existir)."""
+    kind, path = source
+    current = source_fingerprints(source)
+    changed = [name for name, fingerprint in current.items()
+               if fingerprint is None or fingerprints.get(name) != fingerprint]
+    removed = [name for name in fingerprints if name not in current]
+    if not changed:
+        return current, {}, removed
+
+    if kind == 'pasta':
+        # Arquivos sem mudança vêm do cache; só as cidades alteradas são aproveitadas
+        data = read_folder(path, sheet_cache, workers, streaming_min_file_mb)
+        fresh = {name: data[name] for name in changed if name in data}
+    elif os.path.getsize(path) >= streaming_min_file_mb * 1024 * 1024:
+        fresh = read_sheets_streaming(path, only=changed)
+    else:
+        fresh = read_sheets(path, workers=workers, only=changed)
+    return current, fresh, removed
+
+
+def _chunk_to_arrays(chunk):
+    """Converte as listas de um bloco em arrays tipados"""
+    arrays = {}
+    for col, values in chunk.items():
+        if col in STREAM_NUMERIC_COLUMNS:
+            arrays[col] = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        else:
+            arrays[col] = np.array([np.nan if v is None else v for v in values], dtype=object)
+    return arrays
+
+
+def read_sheet_streaming(worksheet, sheet_name, chunk_rows=STREAM_CHUNK_ROWS):
+    """Lê uma aba linha a linha (iter_rows), montando apenas as colunas de análise
+    em blocos de tamanho limitado, sem carregar a aba inteira em memória"""
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame(columns=['cidade'])
+
+    # Posição de cada coluna de interesse (primeira ocorrência)
+    positions = {}
+    for i, name in enumerate(header):
+        if name is None:
+            continue
+        col = clean_column_name(name)
+        if col in STREAM_COLUMNS and col not in positions:
+            positions[col] = i
+
+    chunks = {col: [] for col in positions}
+    current = {col: [] for col in positions}
+    count = 0
+
+    for row in rows:
+        values = {col: (row[i] if i < len(row) else None) for col, i in positions.items()}
+        if all(v is None for v in values.values()):
+            continue
+
+        for col, v in values.items():
+            current[col].append(v)
+        count += 1
+
+        if count >= chunk_rows:
+            for col, arr in _chunk_to_arrays(current).items():
+                chunks[col].append(arr)
+            current = {col: [] for col in positions}
+            count = 0
+
+    if count:
+        for col, arr in _chunk_to_arrays(current).items():
+            chunks[col].append(arr)
+
+    # Manter a ordem padrão das colunas
+    df = pd.DataFrame({
+        col: np.concatenate(chunks[col]) if chunks[col] else np.array([], dtype=object)
+        for col in STREAM_COLUMNS if col in chunks
+    })
+    df['cidade'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[sheet_name])
+    return df
+
+
+def read_sheets_streaming(file_path, chunk_rows=STREAM_CHUNK_ROWS, only=None):
+    """Lê todas as abas de cidade (ou só as abas em `only`) em modo streaming (somente leitura)"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        data = {}
+        for name in workbook.sheetnames:
+            if name in ABAS_EXCLUIDAS or (only is not None and name not in only):
+                continue
+            with TIMINGS.span('load.sheet', sheet=name, streaming=True) as span:
+                data[name] = read_sheet_streaming(workbook[name], name, chunk_rows)
+                span['rows'] = len(data[name])
+        return data
+    finally:
+        workbook.close()
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo atual, em MB (None se indisponível)"""
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        # No Windows o pico fica em peak_wset; em outros sistemas cai no resource
+        if hasattr(info, 'peak_wset'):
+            return info.peak_wset / (1024 * 1024)
+    except ImportError:
+        pass
+
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta em KB, macOS em bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+
+def _measure_ingestion_worker(file_path, mode):
+    """Lê o arquivo no modo indicado e devolve tempo, linhas e pico de memória"""
+    start = time.perf_counter()
+    if mode == 'streaming':
+        data = read_sheets_streaming(file_path)
+    else:
+        data = read_sheets(file_path, workers=1)
+    return {
+        'modo': mode,
+        'segundos': time.perf_counter() - start,
+        'linhas': sum(len(df) for df in data.values()),
+        'pico_rss_mb': peak_rss_mb(),
+    }
+
+
+def measure_ingestion(file_path, modes=('pandas', 'streaming')):
+    """Compara os modos de leitura, cada um em um processo novo (spawn) para que o
+    pico de memória de um não contamine o outro"""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for mode in modes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results.append(executor.submit(_measure_ingestion_worker, file_path, mode).result())
+    return results
+
+
+# Métricas somadas no cubo de agregação
+CUBE_METRICS = ['contatos', 'aproveitados', 'vendas']
+
+# Seleção de filtros: cidade ("Total" para todas), intervalo de períodos
+# (datetime64 ou None) e tupla de origens selecionadas (vazia = sem filtro)
+FilterState = namedtuple('FilterState', ['city', 'start_dt', 'end_dt', 'origins'])
+
+
+def row_ids_by_value(values, rows):
+    """Agrupa as posições rows pelo valor em values: {valor: posições em ordem crescente}.
+    Valores ausentes ficam de fora."""
+    codes, uniques = pd.factorize(values[rows])
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    grouped = rows[order]
+    return {value: grouped[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)}
+
+
+def union_row_ids(index, keys):
+    """União ordenada das listas de posições das chaves indicadas"""
+    lists = [index[key] for key in keys if key in index]
+    if not lists:
+        return np.array([], dtype=np.intp)
+    return np.sort(np.concatenate(lists))
+
+
+class RowIndex:
+    """Índices de linhas de uma aba, montados na carga: posições por origem (sem as
+    linhas de consolidação), posições ordenadas por período e a máscara de
+    consolidação. Filtrar vira interseção de listas de posições, com custo
+    proporcional às linhas selecionadas e não ao tamanho da aba."""
+
+    def __init__(self, df):
+        self.row_count = len(df)
+
+        self.period_order = self.sorted_periods = None
+        if '_periodo_mes' in df.columns:
+            periods = df['_periodo_mes'].to_numpy()
+            self.period_order = np.argsort(periods, kind='stable')
+            self.sorted_periods = periods[self.period_order]
+
+        self.origin_rows = None
+        self.consolidation_mask = self.valid_rows = None
+        if 'origem' in df.columns:
+            self.consolidation_mask = df['_consolidado'].to_numpy()
+            self.valid_rows = np.flatnonzero(~self.consolidation_mask)
+            self.origin_rows = row_ids_by_value(df['origem'].to_numpy(), self.valid_rows)
+
+    def period_rows(self, start_dt, end_dt):
+        """Posições (em ordem) das linhas com período dentro do intervalo (meses inclusivos)"""
+        lo = np.searchsorted(self.sorted_periods, month_ordinals(start_dt), side='left')
+        hi = np.searchsorted(self.sorted_periods, month_ordinals(end_dt), side='right')
+        return np.sort(self.period_order[lo:hi])
+
+    def filter_rows(self, state):
+        """Posições das linhas que atendem a um FilterState (a cidade é a da aba)"""
+        rows = None
+        if self.origin_rows is not None:
+            # Sem origens selecionadas, só as linhas de consolidação ficam de fora
+            rows = union_row_ids(self.origin_rows, state.origins) if state.origins else self.valid_rows
+
+        if self.sorted_periods is not None and state.start_dt is not None and state.end_dt is not None:
+            periods = self.period_rows(state.start_dt, state.end_dt)
+            rows = periods if rows is None else np.intersect1d(rows, periods, assume_unique=True)
+
+        if rows is None:
+            return np.arange(self.row_count)
+        return rows
+
+
+class CityPeriodIndex:
+    """Tabela ordenada por (cidade, _periodo_mes). Cada cidade ocupa uma faixa contínua
+    de linhas e, dentro dela, os períodos estão em ordem, então os filtros de cidade
+    e de período viram buscas binárias em vez de varreduras."""
+
+    def _build_index(self, df, cities):
+        sort_columns = ['cidade', '_periodo_mes'] if '_periodo_mes' in df.columns else ['cidade']
+        self.df = df.sort_values(sort_columns, kind='stable', na_position='last', ignore_index=True)
+
+        # Faixa [início, fim) de cada cidade
+        city_codes = self.df['cidade'].cat.codes.to_numpy()
+        starts = np.searchsorted(city_codes, np.arange(len(cities)), side='left')
+        stops = np.searchsorted(city_codes, np.arange(len(cities)), side='right')
+        self.city_slices = {city: (int(a), int(b)) for city, a, b in zip(cities, starts, stops)}
+
+        # Ordinais de mês (month_ordinals) de cada linha
+        self.periods = self.df['_periodo_mes'].to_numpy() if '_periodo_mes' in self.df.columns else None
+
+        # Posições por origem, já sem as linhas de consolidação
+        self.origin_rows = None
+        self.consolidation_mask = None
+        if 'origem' in self.df.columns:
+            if '_consolidado' in self.df.columns:
+                self.consolidation_mask = self.df['_consolidado'].to_numpy()
+                valid_rows = np.flatnonzero(~self.consolidation_mask)
+            else:
+                valid_rows = np.arange(len(self.df))
+            self.origin_rows = row_ids_by_value(self.df['origem'].to_numpy(), valid_rows)
+
+    def city_period_rows(self, cities=None, start_dt=None, end_dt=None):
+        """Posições das linhas das cidades indicadas (todas se None) dentro do intervalo de períodos"""
+        if cities is None:
+            cities = self.city_slices.keys()
+
+        ranges = []
+        for city in cities:
+            a, b = self.city_slices.get(city, (0, 0))
+            if self.periods is not None and start_dt is not None and end_dt is not None:
+                city_periods = self.periods[a:b]
+                lo = a + int(np.searchsorted(city_periods, month_ordinals(start_dt), side='left'))
+                hi = a + int(np.searchsorted(city_periods, month_ordinals(end_dt), side='right'))
+                a, b = lo, hi
+            if b > a:
+                ranges.append(np.arange(a, b))
+
+        if not ranges:
+            return np.array([], dtype=np.intp)
+        return np.concatenate(ranges)
+
+    def filter_rows(self, state):
+        """Posições das linhas que atendem a um FilterState, sem linhas de consolidação"""
+        cities = None if state.city == "Total" else [state.city]
+        rows = self.city_period_rows(cities, state.start_dt, state.end_dt)
+        if self.origin_rows is not None:
+            if state.origins:
+                selected = union_row_ids(self.origin_rows, state.origins)
+                rows = np.intersect1d(rows, selected, assume_unique=True)
+            elif self.consolidation_mask is not None:
+                rows = rows[~self.consolidation_mask[rows]]
+        return rows
+
+
+class ConsolidatedStore(CityPeriodIndex):
+    """Dados de todas as cidades em um único DataFrame, com cidade e origem categóricas
+    (as abas compactadas já chegam com o mesmo dicionário, e o concat o preserva)"""
+
+    def __init__(self, frames):
+        cities = list(frames.keys())
+        df = pd.concat(frames.values(), ignore_index=True)
+        df['cidade'] = pd.Categorical(df['cidade'], categories=cities)
+        if 'origem' in df.columns:
+            df['origem'] = df['origem'].astype('category')
+            # Abas sem coluna de origem deixam NaN no marcador após o concat
+            df['_consolidado'] = df['_consolidado'].fillna(False).astype(bool)
+
+        self._build_index(df, cities)
+
+
+class Aggregates:
+    """Resultado agregado de uma seleção de filtros: somas por origem, por período e totais"""
+
+    def __init__(self, by_origin, by_period, totals, columns, cell_count):
+        self.by_origin = by_origin    # colunas: origem + métricas
+        self.by_period = by_period    # índice periodo_dt (início do mês); None se não houver períodos
+        self.totals = totals          # {métrica: soma}
+        self.columns = columns        # colunas disponíveis nos dados brutos
+        self.cell_count = cell_count  # células do cubo que atenderam aos filtros
+
+    @property
+    def empty(self):
+        return self.cell_count == 0
+
+
+class LeadCube(CityPeriodIndex):
+    """Somas de contatos/aproveitados/vendas por (cidade, origem, _periodo_mes), calculadas
+    uma vez na carga. As visualizações reagregam as células do cubo, cujo número não
+    depende da quantidade de linhas brutas. As células são montadas por cidade; numa
+    recarga incremental, as das cidades fora de `changed` vêm do cubo anterior."""
+
+    def __init__(self, store, previous=None, changed=()):
+        df = store.df
+        self.metrics = [m for m in CUBE_METRICS if m in df.columns]
+        keys = [k for k in ['origem', '_periodo_mes'] if k in df.columns]
+
+        self.city_cells = {}
+        parts = []
+        for code, (city, (a, b)) in enumerate(store.city_slices.items()):
+            cells = None
+            if previous is not None and city not in changed:
+                cells = previous.city_cells.get(city)
+            if cells is None:
+                cells = self._city_cells(df.iloc[a:b], keys)
+            elif 'origem' in keys and cells['origem'].dtype != df['origem'].dtype:
+                # Dicionário de origens mudou: só recodificar
+                cells = cells.assign(origem=cells['origem'].astype(df['origem'].dtype))
+            self.city_cells[city] = cells
+            parts.append(cells.assign(cidade=pd.Categorical.from_codes(np.full(len(cells), code),
+                                                                       dtype=df['cidade'].dtype)))
+
+        cube = pd.concat(parts, ignore_index=True)[['cidade'] + keys + self.metrics]
+        self._build_index(cube, list(store.city_slices.keys()))
+
+    def _city_cells(self, rows, keys):
+        """Células (origem, _periodo_mes) de uma cidade, sem as linhas de consolidação"""
+        base = rows[keys + self.metrics]
+        if '_consolidado' in rows.columns:
+            base = base[~rows['_consolidado'].to_numpy()]
+
+        if keys:
+            cells = base.groupby(keys, observed=True, dropna=False, sort=False)[self.metrics].sum().reset_index()
+        else:
+            cells = base[self.metrics].sum().to_frame().T
+        # As somas voltam a float: as visualizações dividem e formatam esses valores
+        cells[self.metrics] = cells[self.metrics].astype(np.float64)
+        return cells
+
+    def aggregate(self, state, columns):
+        """Reagrega as células do cubo que atendem ao FilterState"""
+        return aggregate_cells(self.df.take(self.filter_rows(state)), self.metrics, columns)
+
+
+def aggregate_cells(cells, metrics, columns):
+    """Aggregates a partir de células (origem, _periodo_mes) já filtradas"""
+    totals = {m: cells[m].sum() for m in metrics}
+
+    by_origin = None
+    if 'origem' in cells.columns:
+        by_origin = cells.groupby('origem', observed=True)[metrics].sum().reset_index()
+        by_origin['origem'] = by_origin['origem'].astype(str)
+
+    by_period = None
+    if '_periodo_mes' in cells.columns:
+        by_period = cells.groupby('_periodo_mes')[metrics].sum().sort_index()
+        by_period.index = pd.DatetimeIndex(month_starts(by_period.index.to_numpy()), name='periodo_dt')
+
+    return Aggregates(by_origin, by_period, totals, list(columns), len(cells))
+
+
+def correlation_by_group(df, by=('origem',), x='contatos', y='vendas', method='pearson', min_periods=3):
+    """Correlação entre x e y por grupo (origem, ou cidade e origem) em uma única
+    passagem agrupada: n, Σx, Σy, Σxy, Σx² e Σy² por grupo. Só entram linhas com x e y
+    positivos, e grupos com menos de min_periods linhas ficam de fora.
+    method='spearman' aplica o mesmo cálculo aos postos (rank) dentro de cada grupo."""
+    by = list(by)
+    if df is None or any(col not in df.columns for col in by + [x, y]):
+        return pd.DataFrame()
+
+    # Contagens ausentes (máscara dos inteiros compactos) não entram
+    valid = ((df[x] > 0) & (df[y] > 0)).fillna(False).to_numpy(dtype=bool)
+    data = df.loc[valid, by + [x, y]]
+    if data.empty:
+        return pd.DataFrame()
+
+    groups = data.groupby(by, observed=True, sort=False)
+    if method == 'spearman':
+        xs = groups[x].rank().to_numpy(dtype=float)
+        ys = groups[y].rank().to_numpy(dtype=float)
+    else:
+        xs = data[x].to_numpy(dtype=float)
+        ys = data[y].to_numpy(dtype=float)
+
+    # Centralizar pela média geral reduz o cancelamento numérico nas somas
+    xs = xs - xs.mean()
+    ys = ys - ys.mean()
+    terms = pd.DataFrame({'x': xs, 'y': ys, 'xy': xs * ys, 'xx': xs * xs, 'yy': ys * ys}, index=data.index)
+    sums = terms.groupby([data[col] for col in by], observed=True, sort=False).agg(['sum', 'count'])
+
+    return correlation_from_sums(
+        sums.index.to_frame(index=False), sums[('x', 'count')].to_numpy(),
+        sums[('x', 'sum')].to_numpy(), sums[('y', 'sum')].to_numpy(), sums[('xy', 'sum')].to_numpy(),
+        sums[('xx', 'sum')].to_numpy(), sums[('yy', 'sum')].to_numpy(), min_periods
+    )
+
+
+def correlation_from_sums(keys, n, sx, sy, sxy, sxx, syy, min_periods=3):
+    """Correlação por grupo a partir de n, Σx, Σy, Σxy, Σx² e Σy² (de valores já
+    centralizados). keys traz as colunas de grupo, uma linha por grupo."""
+    n = np.asarray(n, dtype=float)
+    sx, sy, sxy, sxx, syy = (np.asarray(v, dtype=float) for v in (sx, sy, sxy, sxx, syy))
+
+    cov = sxy - sx * sy / n
+    var_x = sxx - sx * sx / n
+    var_y = syy - sy * sy / n
+
+    # Variância nula (valores constantes) não tem correlação definida
+    defined = (var_x > 1e-12 * sxx) & (var_y > 1e-12 * syy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.where(defined, cov / np.sqrt(var_x * var_y), np.nan)
+
+    result = keys.copy()
+    for col in result.columns:
+        result[col] = result[col].astype(object)
+    result['correlacao'] = np.clip(corr, -1.0, 1.0)
+    result['n_periodos'] = n.astype(int)
+
+    result = result[result['n_periodos'] >= min_periods]
+    return result.sort_values('correlacao', ascending=False, ignore_index=True)
+
+
+class LeadDataset:
+    """Abas já preparadas (prepare_sheet) e as estruturas de consulta derivadas delas:
+    base consolidada, cubo de agregação e índices de linha de cada cidade"""
+
+    def __init__(self, data, previous=None, changed=()):
+        """Com `previous` (recarga incremental), reaproveita o cubo e os índices de
+        linha das abas fora de `changed`"""
+        self.data = data
+        with TIMINGS.span('load.index', sheets=len(data), changed=len(changed)):
+            self.consolidated = ConsolidatedStore(data)
+            self.cube = LeadCube(self.consolidated, previous.cube if previous else None, changed)
+            self.row_indexes = {
+                city: previous.row_indexes[city]
+                if previous is not None and city not in changed and city in previous.row_indexes
+                else RowIndex(df)
+                for city, df in data.items()
+            }
+
+    def rows(self, state):
+        """Retorna (DataFrame da cidade, posições das linhas que atendem ao FilterState)"""
+        with TIMINGS.span('filter', city=state.city, origins=len(state.origins)) as span:
+            # "Total": consulta a base consolidada por faixas de cidade/período
+            if state.city == "Total":
+                df, rows = self.consolidated.df, self.consolidated.filter_rows(state)
+            elif state.city not in self.data:
+                df, rows = pd.DataFrame(), np.array([], dtype=np.intp)
+            else:
+                # Demais cidades: interseção dos índices de linha montados na carga
+                df, rows = self.data[state.city], self.row_indexes[state.city].filter_rows(state)
+            span['rows'] = len(rows)
+        return df, rows
+
+    def frame(self, state):
+        """Linhas que atendem ao FilterState (o próprio DataFrame se nada for filtrado)"""
+        df, rows = self.rows(state)
+        if len(rows) == len(df):
+            return df
+        return df.take(rows)
+
+    def aggregate(self, state):
+        """Agregados do FilterState, derivados do cubo"""
+        if state.city == "Total":
+            columns = self.consolidated.df.columns
+        elif state.city in self.data:
+            columns = self.data[state.city].columns
+        else:
+            columns = []
+        with TIMINGS.span('aggregate', city=state.city) as span:
+            agg = self.cube.aggregate(state, columns)
+            span['cells'] = agg.cell_count
+        return agg
+
+    @property
+    def cities(self):
+        """Cidades (abas) na ordem da carga"""
+        return list(self.data)
+
+    @property
+    def periods(self):
+        """Ordinais de mês de todas as linhas (None se não houver coluna de período)"""
+        return self.consolidated.periods
+
+    def origin_names(self, state):
+        """Origens distintas das linhas do FilterState (None se não houver coluna de origem)"""
+        df, rows = self.rows(state)
+        if 'origem' not in df.columns:
+            return None
+        return [str(origin) for origin in df['origem'].take(rows).dropna().unique()]
+
+    def correlations(self, state, by=('origem',), method='pearson'):
+        """Correlação leads x vendas por grupo nas linhas do FilterState (correlation_by_group)"""
+        return correlation_by_group(self.frame(state), by=by, method=method)
+
+
+# Banco SQLite opcional: linhas normalizadas em disco, reabertas sem reler as planilhas
+SQLITE_SCHEMA_VERSION = 1
+SQLITE_EXTENSIONS = ('.sqlite', '.db')
+
+# Colunas de LeadDataset guardadas como chaves da tabela linhas (as demais mantêm o nome)
+SQLITE_KEY_COLUMNS = {'cidade': 'cidade', 'origem': 'origem', '_periodo_mes': 'periodo_mes',
+                      '_consolidado': 'consolidado'}
+
+
+def sqlite_name(name):
+    """Identificador SQL entre aspas (os nomes de coluna vêm das planilhas)"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sqlite_type(series):
+    """Afinidade SQLite de uma coluna: INTEGER ou REAL para números, TEXT para o resto"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(series):
+        return 'REAL'
+    return 'TEXT'
+
+
+def store_path_for(source):
+    """Banco SQLite de uma origem de dados: ao lado da planilha ou dentro da pasta"""
+    kind, path = source
+    if kind == 'pasta':
+        return os.path.join(path, 'leads.sqlite')
+    return os.path.splitext(path)[0] + '.sqlite'
+
+
+def _store_frame(df, city_id, origins, value_columns, types):
+    """Colunas de uma aba na ordem da tabela linhas; o que a aba não tem fica nulo"""
+    n = len(df)
+    missing = pd.arrays.IntegerArray(np.zeros(n, dtype=np.int64), np.ones(n, dtype=bool))
+
+    frame = {'cidade': np.full(n, city_id, dtype=np.int64), 'origem': missing}
+    if 'origem' in df.columns:
+        codes = pd.Categorical(df['origem'], categories=origins).codes.astype(np.int64)
+        frame['origem'] = pd.arrays.IntegerArray(codes, codes < 0)
+    frame['periodo_mes'] = df['_periodo_mes'].to_numpy() if '_periodo_mes' in df.columns else missing
+    frame['consolidado'] = df['_consolidado'].to_numpy() if '_consolidado' in df.columns else np.zeros(n, dtype=bool)
+
+    for i, col in enumerate(value_columns):
+        if col not in df.columns:
+            values = missing
+        elif types[col] == 'TEXT':
+            values = df[col].astype(str).where(df[col].notna()).array
+        else:
+            values = df[col].array
+        frame[i] = values
+    return pd.DataFrame(frame)
+
+
+def write_store(path, dataset, sheet_periods):
+    """Grava as linhas de um LeadDataset em um banco SQLite, substituindo o anterior.
+    Cidade e origem viram ids (tabelas cidades e origens), o período vira o ordinal de
+    mês e o índice (cidade, periodo_mes, origem) atende aos filtros. O banco é montado
+    em um arquivo temporário, que só no fim toma o lugar do anterior."""
+    df = dataset.consolidated.df
+    columns = list(df.columns)
+    value_columns = [col for col in columns if col not in SQLITE_KEY_COLUMNS]
+    types = {col: sqlite_type(df[col]) for col in value_columns}
+    origins = list(df['origem'].cat.categories) if 'origem' in df.columns else []
+
+    temp_path = path + '.tmp'
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    conn = sqlite3.connect(temp_path)
+    try:
+        with TIMINGS.span('store.write', file=os.path.basename(path), rows=len(df)):
+            definitions = ''.join(f', {sqlite_name(col)} {types[col]}' for col in value_columns)
+            conn.executescript(f"""
+                CREATE TABLE meta (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+                CREATE TABLE cidades (id INTEGER PRIMARY KEY, nome TEXT NOT NULL, colunas TEXT NOT NULL);
+                CREATE TABLE origens (id INTEGER PRIMARY KEY, nome TEXT NOT NULL);
+                CREATE TABLE periodos (cidade INTEGER NOT NULL, data TEXT NOT NULL, valor TEXT NOT NULL);
+                CREATE TABLE linhas (cidade INTEGER NOT NULL, origem INTEGER, periodo_mes INTEGER,
+                                     consolidado INTEGER NOT NULL{definitions});
+            """)
+            conn.executemany('INSERT INTO meta VALUES (?, ?)',
+                             [('versao', str(SQLITE_SCHEMA_VERSION)), ('colunas', json.dumps(columns))])
+            conn.executemany('INSERT INTO origens VALUES (?, ?)', [(i, str(o)) for i, o in enumerate(origins)])
+
+            insert = f"INSERT INTO linhas VALUES ({', '.join('?' * (4 + len(value_columns)))})"
+            for city_id, (city, city_df) in enumerate(dataset.data.items()):
+                conn.execute('INSERT INTO cidades VALUES (?, ?, ?)', (city_id, city, json.dumps(list(city_df.columns))))
+                conn.executemany('INSERT INTO periodos VALUES (?, ?, ?)', [
+                    (city_id, dt.isoformat(), str(value)) for dt, value in sheet_periods.get(city, {}).items()
+                ])
+                # Linhas na ordem da aba: é a ordem devolvida nas consultas de uma cidade
+                conn.executemany(insert, excel_rows(_store_frame(city_df, city_id, origins, value_columns, types)))
+
+            conn.execute('CREATE INDEX linhas_filtro ON linhas (cidade, periodo_mes, origem)')
+            # Estatísticas para o planejador (permite usar o índice mesmo sem filtro de cidade)
+            conn.execute('ANALYZE')
+            conn.commit()
+    finally:
+        conn.close()
+    os.replace(temp_path, path)
+
+
+class LeadStore:
+    """Banco gravado por write_store, com a mesma interface de consulta de LeadDataset
+    (rows, frame, aggregate). Os filtros viram WHERE sobre o índice (cidade, periodo_mes,
+    origem) e as somas por origem e período, GROUP BY: só o resultado sai do banco.
+    Enviado a outro processo, reabre o arquivo pelo caminho."""
+
+    def __init__(self, path):
+        self.path = path
+        # O dashboard consulta em segundo plano; a lista de origens, na thread da interface
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        try:
+            meta = dict(self.conn.execute('SELECT chave, valor FROM meta'))
+        except sqlite3.DatabaseError:
+            self.conn.close()
+            raise ValueError(f"{os.path.basename(path)} não é um banco gravado pelo sistema")
+        if meta.get('versao') != str(SQLITE_SCHEMA_VERSION):
+            self.conn.close()
+            raise ValueError(f"{os.path.basename(path)} foi gravado por outra versão; grave o banco de novo")
+
+        self.columns = json.loads(meta['colunas'])
+        self.city_columns = {city: json.loads(columns) for city, columns in
+                             self.conn.execute('SELECT nome, colunas FROM cidades ORDER BY id')}
+        self.city_ids = {city: i for i, city in enumerate(self.city_columns)}
+        origins = [origin for (origin,) in self.conn.execute('SELECT nome FROM origens ORDER BY id')]
+        self.origin_ids = {origin: i for i, origin in enumerate(origins)}
+        self.city_dtype = pd.CategoricalDtype(list(self.city_columns))
+        self.origin_dtype = pd.CategoricalDtype(origins)
+        self.metrics = [m for m in CUBE_METRICS if m in self.columns]
+        self.keys = [k for k in ['origem', '_periodo_mes'] if k in self.columns]
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _columns(self, city):
+        """Colunas dos dados brutos da seleção: as da aba, ou todas em "Total" """
+        if city == "Total":
+            return self.columns
+        return self.city_columns.get(city, [])
+
+    def _where(self, state):
+        """Cláusula WHERE (e parâmetros) de um FilterState, sem as linhas de consolidação"""
+        columns = self._columns(state.city)
+        conditions, params = ['consolidado = 0'], []
+        if state.city != "Total":
+            conditions.append('cidade = ?')
+            params.append(self.city_ids.get(state.city, -1))
+        if '_periodo_mes' in columns and state.start_dt is not None and state.end_dt is not None:
+            conditions.append('periodo_mes BETWEEN ? AND ?')
+            params += [int(month_ordinals(state.start_dt)), int(month_ordinals(state.end_dt))]
+        if 'origem' in columns and state.origins:
+            # Ids das origens como um único parâmetro JSON, sem o limite de variáveis do SQLite
+            conditions.append('origem IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps([self.origin_ids[o] for o in state.origins if o in self.origin_ids]))
+        return ' AND '.join(conditions), params
+
+    @property
+    def cities(self):
+        """Cidades (abas) na ordem da carga"""
+        return list(self.city_columns)
+
+    @property
+    def periods(self):
+        """Ordinais de mês distintos (None se não houver coluna de período)"""
+        if '_periodo_mes' not in self.columns:
+            return None
+        months = self._query('SELECT DISTINCT periodo_mes FROM linhas WHERE periodo_mes IS NOT NULL')
+        return np.array([month for (month,) in months], dtype=np.int64)
+
+    def sheet_periods(self):
+        """Períodos de cada aba, como collect_periods: {datetime: valor original}"""
+        cities = self.cities
+        periods = {city: {} for city in cities}
+        for city_id, date, value in self._query('SELECT cidade, data, valor FROM periodos'):
+            periods[cities[city_id]][datetime.fromisoformat(date)] = value
+        return periods
+
+    def rows(self, state):
+        """Retorna (linhas do FilterState, todas as posições): o filtro já foi feito no banco"""
+        df = self.frame(state)
+        return df, np.arange(len(df))
+
+    def _order(self, state):
+        """Ordem das linhas: a da aba numa cidade; em "Total", a do índice (sem ordenar no banco)"""
+        return 'rowid' if state.city != "Total" else 'cidade, periodo_mes, origem, rowid'
+
+    def frame(self, state, columns=None):
+        """Linhas que atendem ao FilterState (só as colunas indicadas, se houver), com
+        cidade e origem categóricas como na carga. Traz todas as linhas para a memória:
+        o dashboard usa aggregate, correlations e page."""
+        if columns is None:
+            columns = self._columns(state.city)
+        if not columns:
+            return pd.DataFrame()
+        with TIMINGS.span('filter', city=state.city, origins=len(state.origins), source='sqlite') as span:
+            df = self._fetch(state, columns, self._order(state))
+            span['rows'] = len(df)
+        return df
+
+    def detail_columns(self, state):
+        """Colunas exibidas nos dados detalhados (sem as derivadas na carga)"""
+        return [col for col in self._columns(state.city) if col not in INTERNAL_COLUMNS]
+
+    def count(self, state):
+        """Quantidade de linhas do FilterState"""
+        where, params = self._where(state)
+        return self._query(f'SELECT COUNT(*) FROM linhas WHERE {where}', params)[0][0]
+
+    def page(self, state, offset, limit, sort=None):
+        """Uma página (LIMIT/OFFSET) das linhas do FilterState, nas colunas de detail_columns.
+        sort é (coluna, decrescente) ou None; valores ausentes ficam no fim."""
+        order = self._order(state)
+        if sort is not None:
+            column, descending = sort
+            if column in ('cidade', 'origem'):
+                # Ordenar pelo nome, não pelo id
+                table = 'cidades' if column == 'cidade' else 'origens'
+                expression = f'(SELECT nome FROM {table} WHERE id = linhas.{column})'
+            else:
+                expression = SQLITE_KEY_COLUMNS.get(column, sqlite_name(column))
+            order = f"{expression} IS NULL, {expression}{' DESC' if descending else ''}, rowid"
+        return self._fetch(state, self.detail_columns(state), order, limit, offset)
+
+    def _fetch(self, state, columns, order, limit=None, offset=0):
+        """SELECT das colunas (nomes de LeadDataset) nas linhas do FilterState"""
+        where, params = self._where(state)
+        select = ', '.join(f'{SQLITE_KEY_COLUMNS.get(col, sqlite_name(col))} AS {sqlite_name(col)}' for col in columns)
+        sql = f'SELECT {select} FROM linhas WHERE {where} ORDER BY {order}'
+        if limit is not None:
+            sql += ' LIMIT ? OFFSET ?'
+            params = params + [int(limit), int(offset)]
+        with self.lock:
+            df = pd.read_sql_query(sql, self.conn, params=params)
+
+        if 'cidade' in df.columns:
+            df['cidade'] = pd.Categorical.from_codes(df['cidade'].to_numpy(dtype=np.int64), dtype=self.city_dtype)
+        if 'origem' in df.columns:
+            codes = pd.to_numeric(df['origem']).fillna(-1).to_numpy(dtype=np.int64)
+            df['origem'] = pd.Categorical.from_codes(codes, dtype=self.origin_dtype)
+        if '_consolidado' in df.columns:
+            df['_consolidado'] = df['_consolidado'].astype(bool)
+        for col in COUNT_COLUMNS:
+            if col in df.columns:
+                df[col] = downcast_counts(df[col])
+        return df
+
+    def aggregate(self, state):
+        """Agregados do FilterState: as células (cidade, origem, mês) vêm de um GROUP BY"""
+        where, params = self._where(state)
+        groups = ', '.join(['cidade'] + [SQLITE_KEY_COLUMNS[k] for k in self.keys])
+        sums = ''.join(f', TOTAL({sqlite_name(m)})' for m in self.metrics)
+
+        with TIMINGS.span('aggregate', city=state.city, source='sqlite') as span:
+            records = self._query(f'SELECT {groups}{sums} FROM linhas WHERE {where} GROUP BY {groups}', params)
+            cells = pd.DataFrame.from_records(records, columns=['cidade'] + self.keys + self.metrics)
+            if 'origem' in cells.columns:
+                codes = pd.to_numeric(cells['origem']).fillna(-1).to_numpy(dtype=np.int64)
+                cells['origem'] = pd.Categorical.from_codes(codes, dtype=self.origin_dtype)
+            cells[self.metrics] = cells[self.metrics].astype(np.float64)
+            agg = aggregate_cells(cells, self.metrics, self._columns(state.city))
+            span['cells'] = agg.cell_count
+        return agg
+
+    def origin_names(self, state):
+        """Origens distintas das linhas do FilterState (None se não houver coluna de origem)"""
+        if 'origem' not in self._columns(state.city):
+            return None
+        where, params = self._where(state)
+        ids = self._query(f'SELECT DISTINCT origem FROM linhas WHERE {where} AND origem IS NOT NULL', params)
+        origins = self.origin_dtype.categories
+        return [str(origins[i]) for (i,) in ids]
+
+    def correlations(self, state, by=('origem',), method='pearson', x='contatos', y='vendas', min_periods=3):
+        """Correlação leads x vendas por grupo, como correlation_by_group. Em Pearson, as
+        somas n, Σx, Σy, Σxy, Σx² e Σy² (centralizadas pela média geral) vêm de um GROUP BY;
+        em Spearman, os postos exigem as linhas, e só as colunas usadas saem do banco."""
+        by = list(by)
+        if any(col not in self._columns(state.city) for col in by + [x, y]):
+            return pd.DataFrame()
+        if method != 'pearson':
+            return correlation_by_group(self.frame(state, by + [x, y]), by=by, x=x, y=y,
+                                        method=method, min_periods=min_periods)
+
+        where, params = self._where(state)
+        qx, qy = sqlite_name(x), sqlite_name(y)
+        where += f' AND {qx} > 0 AND {qy} > 0'
+        where += ''.join(f' AND {SQLITE_KEY_COLUMNS[col]} IS NOT NULL' for col in by)
+        groups = ', '.join(SQLITE_KEY_COLUMNS[col] for col in by)
+
+        with TIMINGS.span('correlation', city=state.city, source='sqlite') as span:
+            mean_x, mean_y = self._query(f'SELECT AVG({qx}), AVG({qy}) FROM linhas WHERE {where}', params)[0]
+            if mean_x is None:
+                return pd.DataFrame()
+            dx, dy = f'({qx} - {float(mean_x)!r})', f'({qy} - {float(mean_y)!r})'
+            records = self._query(
+                f'SELECT {groups}, COUNT(*), TOTAL({dx}), TOTAL({dy}), TOTAL({dx} * {dy}), '
+                f'TOTAL({dx} * {dx}), TOTAL({dy} * {dy}) FROM linhas WHERE {where} GROUP BY {groups}',
+                params
+            )
+            span['groups'] = len(records)
+
+        sums = pd.DataFrame.from_records(records, columns=by + ['n', 'x', 'y', 'xy', 'xx', 'yy'])
+        names = {'cidade': self.city_dtype.categories, 'origem': self.origin_dtype.categories}
+        keys = pd.DataFrame({col: names[col][sums[col].to_numpy(dtype=np.int64)] for col in by})
+        return correlation_from_sums(keys, sums['n'], sums['x'], sums['y'], sums['xy'], sums['xx'], sums['yy'],
+                                     min_periods)
+
+
+# Quantidade de seleções de filtro com agregados mantidos em memória
+AGGREGATE_CACHE_SIZE = 32
+
+
+def filter_state_key(state):
+    """Hash canônico de um FilterState (a ordem das origens selecionadas não importa)"""
+    canonical = json.dumps([
+        state.city,
+        None if state.start_dt is None else str(state.start_dt),
+        None if state.end_dt is None else str(state.end_dt),
+        sorted(str(origin) for origin in state.origins),
+    ], ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class AggregateCache:
+    """Cache LRU de Aggregates por seleção de filtros, compartilhado entre o dashboard
+    e a exportação em PDF. Deve ser limpo sempre que os dados forem recarregados;
+    numa recarga incremental, basta invalidar as cidades alteradas."""
+
+    def __init__(self, max_entries=AGGREGATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        # Acessado tanto pela interface quanto pelo cálculo em segundo plano
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, agg, city=None):
+        with self.lock:
+            self.entries[key] = (agg, city)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, cities):
+        """Descarta as entradas das cidades indicadas e as de "Total" (e as sem cidade)"""
+        cities = set(cities) | {"Total", None}
+        with self.lock:
+            for key in [key for key, (_, city) in self.entries.items() if city in cities]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Quantidade de visualizações renderizadas mantidas para troca instantânea
+VIEW_CACHE_SIZE = 8
+
+
+class ViewCache:
+    """Cache LRU de visualizações já montadas, indexado por (visualização, hash dos
+    filtros, tamanho da janela). Ao sair do cache, o frame é destruído."""
+
+    def __init__(self, max_entries=VIEW_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # chave -> (frame, cidade)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, frame, city=None):
+        self.entries[key] = (frame, city)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            _, (old_frame, _) = self.entries.popitem(last=False)
+            old_frame.destroy()
+
+    def frames(self):
+        return [frame for frame, _ in self.entries.values()]
+
+    def invalidate(self, cities):
+        """Destrói as visualizações das cidades indicadas e as de "Total" (e as sem cidade)"""
+        cities = set(cities) | {"Total", None}
+        for key in [key for key, (_, city) in self.entries.items() if city in cities]:
+            frame, _ = self.entries.pop(key)
+            frame.destroy()
+
+    def clear(self):
+        while self.entries:
+            _, (frame, _) = self.entries.popitem(last=False)
+            frame.destroy()
+
+
+# Intervalo (ms) com que a interface verifica se o cálculo do dashboard terminou
+DASHBOARD_POLL_MS = 50
+
+
+class JobCancelled(Exception):
+    """Cálculo do dashboard substituído por uma seleção mais recente"""
+
+
+class DashboardJob:
+    """Cálculo de uma visualização executado fora da thread da interface"""
+
+    def __init__(self, view, state, view_key, filter_key, width, profile=False):
+        self.view = view
+        self.state = state
+        self.view_key = view_key
+        self.filter_key = filter_key
+        self.width = width  # largura em pixels da imagem renderizada
+        self.profile = profile  # executar sob o cProfile
+        self.result = None
+        self.error = None
+        self.done = False
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        """Interrompe o cálculo se ele foi cancelado"""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def finish(self, result):
+        self.result = result
+        self.done = True
+
+    def fail(self, error):
+        self.error = error
+        self.done = True
+
+
+# Funções listadas no resumo de um perfil do cProfile
+PROFILE_TOP_FUNCTIONS = 30
+
+
+def save_profile(profiler, label):
+    """Grava o perfil em LOG_DIR (arquivo .prof, legível com pstats) e devolve
+    (caminho, resumo em texto das funções com maior tempo acumulado)"""
+    path = None
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', label)
+        path = os.path.join(LOG_DIR, f"perfil_{datetime.now():%Y%m%d_%H%M%S}_{name}.prof")
+        profiler.dump_stats(path)
+    except OSError as e:
+        print(f"Erro ao gravar perfil: {path}, erro: {str(e)}")
+        path = None
+
+    summary = StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    return path, summary.getvalue()
+
+
+# Bibliotecas de gráficos e PDF: importadas só quando usadas, para a janela abrir
+# rápido, e pré-carregadas em segundo plano logo depois que ela aparece
+WARMUP_MODULES = [
+    'matplotlib.figure',
+    'matplotlib.backends.backend_agg',
+    'matplotlib.ticker',
+    'seaborn',
+    'reportlab.platypus',
+]
+WARMUP_DELAY_MS = 300  # espera para a janela ser desenhada antes do pré-carregamento
+
+
+def warm_up_imports(modules=WARMUP_MODULES):
+    """Importa as bibliotecas pesadas (chamado em uma thread após a janela abrir)"""
+    import importlib
+
+    with TIMINGS.span('startup.warmup', modules=len(modules)):
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"Erro ao pré-carregar {name}: {str(e)}")
+
+
+def new_figure(figsize):
+    """Cria uma figura fora do pyplot, renderizada pelo Agg (segura fora da thread principal)"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_figure_png(fig, width_px):
+    """Renderiza a figura em PNG com a largura indicada, em pixels"""
+    buffer = BytesIO()
+    dpi = max(width_px / fig.get_figwidth(), 50)
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+
+def report_summary_figure(agg):
+    """Cria figuras para a visão geral"""
+    from matplotlib.ticker import FuncFormatter
+
+    if agg.empty:
+        return None
+
+    fig = new_figure((12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Gráfico 1: Distribuição de origens
+    if 'origem' in agg.columns and 'contatos' in agg.columns:
+        origin_counts = agg.by_origin.set_index('origem')['contatos']
+
+        if len(origin_counts) > 5:
+            top_origins = origin_counts.nlargest(5)
+            other = origin_counts.sum() - top_origins.sum()
+            top_origins = pd.concat([top_origins, pd.Series({'Outros': other})])
+        else:
+            top_origins = origin_counts
+
+        top_origins.plot.pie(autopct='%1.1f%%', ax=ax1, startangle=90, ylabel='')
+        ax1.set_title("Distribuição por Origem (Top 5)")
+
+    # Gráfico 2: Top 5 Canais por Conversão
+    if 'origem' in agg.columns and 'contatos' in agg.columns and 'vendas' in agg.columns:
+        channel_efficiency = agg.by_origin.set_index('origem')[['contatos', 'vendas']]
+        channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
+        channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
+
+        if not channel_efficiency.empty:
+            top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao')
+            top_conversion = top_conversion.sort_values('taxa_conversao', ascending=True)
+
+            bars = ax2.barh(top_conversion.index, top_conversion['taxa_conversao'], color='skyblue')
+            ax2.set_title("Top 5 Canais - Conversão Total")
+            ax2.set_xlabel("Taxa de Conversão")
+            ax2.grid(axis='x', linestyle='--', alpha=0.7)
+            ax2.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+
+            for bar in bars:
+                width = bar.get_width()
+                ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
+                        f'{width:.1%}', ha='left', va='center')
+
+    fig.tight_layout()
+    return fig
+
+
+def report_conversion_by_channel_figure(agg):
+    """Cria figura para conversão por canal"""
+    from matplotlib.ticker import FuncFormatter
+
+    if 'origem' not in agg.columns or agg.empty:
+        return None
+
+    grouped = agg.by_origin.copy()
+
+    grouped['taxa_conversao'] = grouped['vendas'] / grouped['contatos']
+    grouped['conversao_ap'] = grouped['vendas'] / grouped['aproveitados']
+    grouped = grouped[grouped['contatos'] >= 100]
+
+    if grouped.empty:
+        return None
+
+    fig = new_figure((12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Gráfico 1: Conversão total
+    grouped_sorted = grouped.sort_values('taxa_conversao', ascending=False)
+    bars1 = ax1.bar(grouped_sorted['origem'], grouped_sorted['taxa_conversao'], color='skyblue')
+    ax1.set_title("Conversão Total por Origem")
+    ax1.set_ylabel("Taxa de Conversão")
+    ax1.tick_params(axis='x', rotation=90, labelsize=8)
+    ax1.grid(axis='y', linestyle='--', alpha=0.7)
+    ax1.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
+
+    for bar in bars1:
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height + 0.01,
+                f'{height:.1%}', ha='center', va='bottom', fontsize=6)
+
+    # Gráfico 2: Conversão de leads
+    grouped_sorted = grouped.sort_values('conversao_ap', ascending=False)
+    bars2 = ax2.bar(grouped_sorted['origem'], grouped_sorted['conversao_ap'], color='lightgreen')
+    ax2.set_title("Conversão de Leads por Origem")
+    ax2.set_ylabel("Taxa de Conversão")
+    ax2.tick_params(axis='x', rotation=90, labelsize=8)
+    ax2.grid(axis='y', linestyle='--', alpha=0.7)
+    ax2.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
+
+    for bar in bars2:
+        height = bar.get_height()
+        ax2.text(bar.get_x() + bar.get_width()/2., height + 0.01,
+                f'{height:.1%}', ha='center', va='bottom', fontsize=6)
+
+    fig.tight_layout()
+    return fig
+
+
+def report_monthly_trend_figure(agg):
+    """Cria figura para evolução mensal"""
+    from matplotlib.ticker import FuncFormatter
+
+    if agg.by_period is None or agg.empty:
+        return None
+
+    monthly = agg.by_period.copy()
+
+    monthly['taxa_conversao'] = monthly['vendas'] / monthly['contatos']
+    monthly['conversao_ap'] = monthly['vendas'] / monthly['aproveitados']
+    monthly['periodo_formatado'] = monthly.index.map(format_period_display)
+
+    fig = new_figure((10, 8))
+    ax1, ax2 = fig.subplots(2, 1)
+
+    # Gráfico 1: Volume
+    ax1.plot(monthly['periodo_formatado'], monthly['contatos'], marker='o', label='Contatos')
+    ax1.plot(monthly['periodo_formatado'], monthly['aproveitados'], marker='o', label='Aproveitados')
+    ax1.plot(monthly['periodo_formatado'], monthly['vendas'], marker='o', label='Vendas')
+    ax1.set_title("Evolução Mensal - Volume")
+    ax1.set_ylabel("Quantidade")
+    ax1.grid(True, linestyle='--', alpha=0.7)
+    ax1.legend()
+    ax1.set_xticks(range(len(monthly)))
+    ax1.set_xticklabels(monthly['periodo_formatado'], rotation=45, ha='right')
+
+    # Gráfico 2: Taxas
+    ax2.plot(monthly['periodo_formatado'], monthly['taxa_conversao'], marker='o', label='Conversão Total')
+    ax2.plot(monthly['periodo_formatado'], monthly['conversao_ap'], marker='o', label='Conversão de Aproveitados')
+    ax2.set_title("Evolução Mensal - Taxas de Conversão")
+    ax2.set_ylabel("Taxa")
+    ax2.grid(True, linestyle='--', alpha=0.7)
+    ax2.legend()
+    ax2.set_xticks(range(len(monthly)))
+    ax2.set_xticklabels(monthly['periodo_formatado'], rotation=45, ha='right')
+    ax2.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
+
+    fig.tight_layout()
+    return fig
+
+
+def report_top_channels_figure(agg):
+    """Cria figura para top canais"""
+    from matplotlib.ticker import FuncFormatter
+
+    if 'origem' not in agg.columns or agg.empty:
+        return None
+
+    channel_efficiency = agg.by_origin.copy()
+
+    channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
+    channel_efficiency['conversao_ap'] = channel_efficiency['vendas'] / channel_efficiency['aproveitados']
+    channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
+
+    if channel_efficiency.empty:
+        return None
+
+    fig = new_figure((12, 5))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Top 5 por conversão total
+    top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao').sort_values('taxa_conversao', ascending=True)
+    bars1 = ax1.barh(top_conversion['origem'], top_conversion['taxa_conversao'], color='skyblue')
+    ax1.set_title("Top 5 Canais - Conversão Total")
+    ax1.set_xlabel("Taxa de Conversão")
+    ax1.grid(axis='x', linestyle='--', alpha=0.7)
+    ax1.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+
+    for bar in bars1:
+        width = bar.get_width()
+        ax1.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
+                f'{width:.1%}', ha='left', va='center')
+
+    # Top 5 por conversão de leads
+    top_lead_conversion = channel_efficiency.nlargest(5, 'conversao_ap').sort_values('conversao_ap', ascending=True)
+    bars2 = ax2.barh(top_lead_conversion['origem'], top_lead_conversion['conversao_ap'], color='lightgreen')
+    ax2.set_title("Top 5 Canais - Conversão de Leads")
+    ax2.set_xlabel("Taxa de Conversão")
+    ax2.grid(axis='x', linestyle='--', alpha=0.7)
+    ax2.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+
+    for bar in bars2:
+        width = bar.get_width()
+        ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
+                f'{width:.1%}', ha='left', va='center')
+
+    fig.tight_layout()
+    return fig
+
+
+def report_sales_efficiency_figure(agg):
+    """Cria figura para eficiência de vendas"""
+    if 'contatos' not in agg.columns or 'vendas' not in agg.columns or agg.empty:
+        return None
+
+    grouped = agg.by_origin.copy()
+
+    grouped['eficiencia'] = (grouped['vendas'] / grouped['contatos']) * 100
+    filtered = grouped[grouped['vendas'] >= 10]
+
+    if filtered.empty:
+        return None
+
+    top_15 = filtered.nlargest(15, 'eficiencia').sort_values('eficiencia', ascending=True)
+
+    fig = new_figure((10, 6))
+    ax = fig.subplots()
+    bars = ax.barh(top_15['origem'], top_15['eficiencia'], color='skyblue')
+    ax.set_title("Eficiência de Vendas (Top 15)")
+    ax.set_xlabel("Eficiência (%)")
+    ax.grid(axis='x', linestyle='--', alpha=0.7)
+
+    for bar in bars:
+        width = bar.get_width()
+        ax.text(width + 0.5, bar.get_y() + bar.get_height()/2, 
+                f'{width:.1f}%', ha='left', va='center')
+
+    fig.tight_layout()
+    return fig
+
+
+def report_correlation_figure(df_corr):
+    """Cria figura para correlação"""
+    if df_corr.empty:
+        return None
+
+    top_15 = df_corr.head(15).sort_values('correlacao', ascending=False)
+    bottom_15 = df_corr.tail(15).sort_values('correlacao', ascending=True)
+
+    fig = new_figure((14, 7))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Melhores correlações
+    bars1 = ax1.barh(top_15['origem'], top_15['correlacao'], color='#2ecc71')
+    ax1.set_title('TOP 15 - Melhores Correlações')
+    ax1.set_xlabel("Coeficiente de Correlação")
+    ax1.set_xlim(-1.1, 1.1)
+    ax1.grid(axis='x', linestyle='--', alpha=0.7)
+
+    for bar in bars1:
+        width = bar.get_width()
+        ax1.text(width + 0.02 if width > 0 else width - 0.1, 
+                bar.get_y() + bar.get_height()/2, 
+                f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
+
+    # Piores correlações
+    bars2 = ax2.barh(bottom_15['origem'], bottom_15['correlacao'], color='#e74c3c')
+    ax2.set_title('TOP 15 - Piores Correlações')
+    ax2.set_xlabel("Coeficiente de Correlação")
+    ax2.set_xlim(-1.1, 1.1)
+    ax2.grid(axis='x', linestyle='--', alpha=0.7)
+
+    for bar in bars2:
+        width = bar.get_width()
+        ax2.text(width + 0.02 if width > 0 else width - 0.1, 
+                bar.get_y() + bar.get_height()/2, 
+                f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
+
+    fig.tight_layout()
+    return fig
+
+
+def report_scatter_figure(agg):
+    """Cria figura para dispersão"""
+    import seaborn as sns
+
+    required_columns = ['contatos', 'aproveitados', 'vendas', 'origem']
+    if any(col not in agg.columns for col in required_columns) or agg.empty:
+        return None
+
+    df_agg = agg.by_origin.copy()
+
+    df_agg = df_agg[
+        (df_agg['contatos'] > 0) & 
+        (df_agg['vendas'] > 0) & 
+        (df_agg['aproveitados'] > 0)
+    ]
+
+    if df_agg.empty:
+        return None
+
+    top_origins = df_agg.nlargest(15, 'contatos')['origem']
+    df_filtered = df_agg[df_agg['origem'].isin(top_origins)]
+
+    fig = new_figure((14, 6))
+    ax1, ax2 = fig.subplots(1, 2)
+
+    # Gráfico 1: Leads vs Vendas
+    sns.scatterplot(
+        data=df_filtered,
+        x='contatos',
+        y='vendas',
+        hue='origem',
+        size='vendas',
+        sizes=(50, 300),
+        ax=ax1
+    )
+    ax1.set_title('Leads vs Vendas por Canal')
+    ax1.set_xlabel("Total de Leads")
+    ax1.set_ylabel("Total de Vendas")
+    ax1.grid(True, linestyle='--', alpha=0.7)
+
+    # Remover a legenda do primeiro gráfico
+    if ax1.get_legend() is not None:
+        ax1.get_legend().remove()
+
+    try:
+        sns.regplot(data=df_filtered, x='contatos', y='vendas', 
+                    scatter=False, ax=ax1, color='gray', line_kws={'alpha': 0.5})
+    except:
+        pass
+
+    # Gráfico 2: Leads Aproveitados vs Vendas
+    sns.scatterplot(
+        data=df_filtered,
+        x='aproveitados',
+        y='vendas',
+        hue='origem',
+        size='vendas',
+        sizes=(50, 300),
+        ax=ax2
+    )
+    ax2.set_title('Leads Aproveitados vs Vendas')
+    ax2.set_xlabel("Leads Aproveitados")
+    ax2.set_ylabel("Total de Vendas")
+    ax2.grid(True, linestyle='--', alpha=0.7)
+
+    try:
+        sns.regplot(data=df_filtered, x='aproveitados', y='vendas', 
+                    scatter=False, ax=ax2, color='gray', line_kws={'alpha': 0.5})
+    except:
+        pass
+
+    # Ajustar layout da legenda (apenas para o segundo gráfico)
+    ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    fig.tight_layout()
+    return fig
+
+
+# Gráficos do relatório PDF, na ordem das seções
+REPORT_FIGURES = {
+    'Visão Geral': report_summary_figure,
+    'Conversão por Canal': report_conversion_by_channel_figure,
+    'Evolução Mensal': report_monthly_trend_figure,
+    'Top Canais': report_top_channels_figure,
+    'Eficiência de Vendas': report_sales_efficiency_figure,
+    'Correlação Leads-Vendas': report_correlation_figure,
+    'Dispersão Leads x Vendas': report_scatter_figure,
+}
+
+# Número de processos que renderizam os gráficos do relatório (1 = sequencial)
+REPORT_WORKERS = max(1, min(len(REPORT_FIGURES), os.cpu_count() or 1))
+
+
+def render_report_figure(name, data):
+    """Gera um gráfico do relatório e devolve (PNG em bytes ou None, segundos gastos)"""
+    start = time.perf_counter()
+    fig = REPORT_FIGURES[name](data)
+    png = None
+    if fig is not None:
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        png = buffer.getvalue()
+    return png, time.perf_counter() - start
+
+
+def render_report_figures(jobs, workers=REPORT_WORKERS):
+    """Renderiza os gráficos {nome: dados} em paralelo, um processo por gráfico.
+    Devolve {nome: (PNG, segundos)} na ordem recebida."""
+    workers = min(workers or 1, len(jobs))
+    if workers <= 1:
+        return {name: render_report_figure(name, data) for name, data in jobs.items()}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(render_report_figure, list(jobs.keys()), list(jobs.values()))
+        return dict(zip(jobs.keys(), results))
+
+
+# Colunas da tabela de desempenho por origem: (título, coluna, formato numérico)
+ORIGIN_PERFORMANCE_COLUMNS = [
+    ("Origem", 'origem', None),
+    ("Contatos", 'contatos', ',.0f'),
+    ("Aproveitados", 'aproveitados', ',.0f'),
+    ("Vendas", 'vendas', ',.0f'),
+    ("% Aproveit.", '%_aproveitamento', '.1%'),
+    ("Conv. Total", 'taxa_conversao', '.1%'),
+    ("Conv. Leads", 'conversao_ap', '.1%'),
+    ("Lead/Venda", 'lead_por_venda', ',.1f'),
+]
+
+
+def format_cell(value):
+    """Texto de uma célula de tabela (vazio para valores ausentes)"""
+    return "" if pd.isna(value) else str(value)
+
+
+def format_cells(values):
+    """Formatador padrão das tabelas: format_cell aplicado a um array de valores"""
+    return [format_cell(v) for v in values]
+
+
+def number_formatter(spec, missing="N/A"):
+    """Formatador de um array numérico: `spec` nos valores finitos e `missing` em
+    NaN/infinito"""
+    def format_values(values):
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        return [format(v, spec) if ok else missing for v, ok in zip(values.tolist(), finite.tolist())]
+    return format_values
+
+
+def origin_performance_frame(agg):
+    """Métricas numéricas por origem, em ordem decrescente de vendas, para a tabela de
+    desempenho. Razões sem denominador ficam NaN. None se não houver dados de origem."""
+    if 'origem' not in agg.columns or agg.empty:
+        return None
+
+    grouped = agg.by_origin.copy()
+
+    grouped['%_aproveitamento'] = grouped['aproveitados'] / grouped['contatos']
+    grouped['taxa_conversao'] = grouped['vendas'] / grouped['contatos']
+    grouped['conversao_ap'] = grouped['vendas'] / grouped['aproveitados']
+    grouped['lead_por_venda'] = grouped['contatos'] / grouped['vendas']
+    grouped.replace([np.inf, -np.inf], np.nan, inplace=True)
+    return grouped.sort_values('vendas', ascending=False).reset_index(drop=True)
+
+
+def origin_performance_table(agg):
+    """Tabela de desempenho por origem já formatada (cabeçalho + linhas), para o PDF"""
+    grouped = origin_performance_frame(agg)
+    if grouped is None:
+        return None
+
+    columns = []
+    for _, col, spec in ORIGIN_PERFORMANCE_COLUMNS:
+        values = grouped[col].to_numpy()
+        columns.append(list(values) if spec is None else number_formatter(spec)(values))
+
+    table_data = [[title for title, _, _ in ORIGIN_PERFORMANCE_COLUMNS]]
+    table_data.extend(list(row) for row in zip(*columns))
+    return table_data
+
+
+# Exportação para Excel
+EXCEL_MAX_ROWS = 1048576  # linhas por aba no Excel, cabeçalho incluído
+EXCEL_CHUNK_ROWS = 20000  # linhas convertidas para valores Python de cada vez
+EXCEL_COUNT_FORMAT = '#,##0'
+EXCEL_PERCENT_FORMAT = '0.0%'
+
+# Formato Excel equivalente a cada formato numérico das tabelas
+EXCEL_NUMBER_FORMATS = {',.0f': EXCEL_COUNT_FORMAT, '.1%': EXCEL_PERCENT_FORMAT, ',.1f': '#,##0.0'}
+
+
+def excel_sheet_name(name, used):
+    """Nome de aba válido no Excel (até 31 caracteres, sem []:*?/\\) e ainda não usado.
+    `used` guarda os nomes já escolhidos (em minúsculas, como o Excel os compara)."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', str(name)).strip("'")[:31] or "Dados"
+    candidate, n = base, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def excel_rows(df, rows=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    """Percorre as linhas de df (ou só as posições rows) em blocos, como tuplas de
+    valores Python; valores ausentes viram None (célula vazia)"""
+    total = len(df) if rows is None else len(rows)
+    for start in range(0, total, chunk_rows):
+        if rows is None:
+            chunk = df.iloc[start:start + chunk_rows]
+        else:
+            chunk = df.take(rows[start:start + chunk_rows])
+
+        columns = [chunk[col].to_numpy(dtype=object, na_value=None).tolist() for col in chunk.columns]
+        yield from zip(*columns)
+
+
+def write_excel(file_path, sheets):
+    """Grava tabelas em um .xlsx com o openpyxl em modo write_only: cada linha vai para
+    o arquivo assim que é montada, então a memória não cresce com o tamanho da exportação.
+    `sheets` é uma sequência de (nome da aba, DataFrame, {coluna: formato Excel}, posições
+    das linhas ou None). As colunas com formato são gravadas como números com esse formato.
+    Abas acima do limite de linhas do Excel continuam em abas numeradas.
+    Devolve o total de linhas gravadas."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    used = set()
+    written = 0
+
+    def new_sheet(name, df, formats):
+        worksheet = workbook.create_sheet(excel_sheet_name(name, used))
+        worksheet.freeze_panes = "A2"
+        header = []
+        for col in df.columns:
+            cell = WriteOnlyCell(worksheet, value=str(col))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        worksheet.append(header)
+
+        # Uma célula com estilo por coluna formatada, reaproveitada a cada linha
+        # (o openpyxl serializa a linha no append)
+        styled = []
+        for j, col in enumerate(df.columns):
+            if col in formats:
+                cell = WriteOnlyCell(worksheet)
+                cell.number_format = formats[col]
+                styled.append((j, cell))
+        return worksheet, styled
 
-    def clear_all_origins(self):
-        """Desmarca todas as origens"""
-        for origin in self.all_origins:
-            self.origin_vars[origin].set(False)
-    
-    def filter_origin_list(self, event=None):
-        """Filtra a lista de origens visíveis"""
-        self.refresh_origin_list()
+    for name, df, formats, rows in sheets:
+        with TIMINGS.span('export.sheet', sheet=str(name)) as span:
+            worksheet, styled = new_sheet(name, df, formats)
+            count = 0
+            for row in excel_rows(df, rows):
+                if count and count % (EXCEL_MAX_ROWS - 1) == 0:
+                    worksheet, styled = new_sheet(name, df, formats)
+                values = list(row)
+                for j, cell in styled:
+                    if values[j] is not None:
+                        cell.value = values[j]
+                        values[j] = cell
+                worksheet.append(values)
+                count += 1
+            span['rows'] = count
+        written += count
 
-    def update_origin_checklist(self):
-        """Atualiza a lista de origens mantendo o estado das seleções"""
-        df = self.get_current_data()
-        
-        if df is None or 'origem' not in df.columns:
-            self.all_origins = []
-            self.refresh_origin_list()
-            return
-            
-        # Obter novas origens únicas
-        new_origins = sorted(df['origem'].astype(str).unique().tolist())
-        new_origins = [o for o in new_origins if o.lower() not in ['total', 'geral', 'consolidado']]
-        
-        # Verificar se houve mudança na lista de origens
-        if set(new_origins) == set(self.all_origins):
-            return
-            
-        self.all_origins = new_origins
-        
-        # Criar novas variáveis para novas origens
-        for origin in self.all_origins:
-            if origin not in self.origin_vars:
-                self.origin_vars[origin] = ctk.BooleanVar(value=True)
-        
-        # Remover variáveis de origens que não existem mais
-        for origin in list(self.origin_vars.keys()):
-            if origin not in self.all_origins:
-                del self.origin_vars[origin]
-        
-        self.refresh_origin_list()
-    
-    def get_selected_origins(self):
-        """Retorna as origens selecionadas"""
-        return [origin for origin in self.all_origins if self.origin_vars[origin].get()]
+    workbook.save(file_path)
+    return written
 
-    def refresh_origin_list(self):
-        """Atualiza a exibição das checkboxes"""
-        # Limpar frame atual
-        for widget in self.origin_frame.winfo_children():
-            widget.destroy()
-        
-        self.origin_checkboxes = {}
-        
-        search_term = self.search_origin.get().strip().lower()
-        
-        for origin in self.all_origins:
-            # Filtrar por termo de pesquisa
-            if search_term and search_term not in origin.lower():
-                continue
-                
-            var = self.origin_vars[origin]
-            cb = ctk.CTkCheckBox(
-                self.origin_frame,
-                text=origin,
-                variable=var
-            )
-            cb.pack(anchor="w", padx=5, pady=2)
-            self.origin_checkboxes[origin] = cb
 
-    def get_current_data(self):
-        """Obtém dados filtrados para seleção atual"""
-        if self.data is None:
-            return None
+def raw_data_formats(df):
+    """Formatos Excel das colunas de dados brutos: contagens inteiras com separador de
+    milhar e colunas de conversão/porcentagem (já convertidas para fração) como %"""
+    formats = {}
+    for col in df.columns:
+        name = str(col).lower()
+        if col in COUNT_COLUMNS and pd.api.types.is_integer_dtype(df[col]):
+            formats[col] = EXCEL_COUNT_FORMAT
+        elif ('conversao' in name or '%' in name) and pd.api.types.is_float_dtype(df[col]):
+            formats[col] = EXCEL_PERCENT_FORMAT
+    return formats
 
-        city = self.city_var.get()
-        period_start = self.period_mapping.get(self.period_var_start.get(), "")
-        period_end = self.period_mapping.get(self.period_var_end.get(), "")
 
-        if city in self.data:
-            df = self.data[city].copy()
-        else:
-            return pd.DataFrame()
+def data_export_sheets(df, rows=None, by_city=False):
+    """Abas de uma exportação de dados brutos: as linhas selecionadas de df (sem as
+    colunas derivadas na carga), em uma aba só ou em uma por cidade"""
+    columns = [col for col in df.columns if col not in INTERNAL_COLUMNS]
+    data = df[columns]
+    formats = raw_data_formats(data)
+    if rows is None:
+        rows = np.arange(len(df))
 
-        # Filtrar por intervalo de períodos
-        if period_start and period_end and 'periodo' in df.columns:
-            # Converter períodos selecionados para datetime
-            start_dt = self.parse_period(period_start)
-            end_dt = self.parse_period(period_end)
+    if not by_city or 'cidade' not in df.columns:
+        return [("Dados", data, formats, rows)]
 
-            # Criar coluna de data se necessário
-            if 'periodo_dt' not in df.columns:
-                df['periodo_dt'] = df['periodo'].apply(self.parse_period)
+    # Posições de cada cidade, na ordem das categorias (a ordem das abas da planilha)
+    city_codes = df['cidade'].cat.codes.to_numpy()[rows]
+    return [
+        (city, data, formats, rows[city_codes == code])
+        for code, city in enumerate(df['cidade'].cat.categories)
+        if (city_codes == code).any()
+    ]
 
-            # Filtrar por intervalo
-            df = df[(df['periodo_dt'] >= start_dt) & (df['periodo_dt'] <= end_dt)]
 
-        # Filtrar por origem
-        selected_origins = self.get_selected_origins()
-        if selected_origins and 'origem' in df.columns:
-            df = df[df['origem'].isin(selected_origins)]
+def write_pdf_report(file_path, city, start_dt, end_dt, agg, df_corr, workers=REPORT_WORKERS):
+    """Gera o relatório PDF de uma seleção (cidade e intervalo de períodos) a partir
+    dos agregados e da tabela de correlações. Devolve o tempo gasto por seção."""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
 
-        # Filtrar por origem (sempre excluindo totais)
-        if 'origem' in df.columns:
-            # Filtrar origens selecionadas
-            selected_origins = self.get_selected_origins()
-            if selected_origins:
-                df = df[df['origem'].isin(selected_origins)]
-            
-            # Sempre excluir origens de consolidação
-            origens = df['origem'].astype(str).str.lower().str.strip()
-            mask = ~(
-                origens.str.contains('total') |
-                origens.str.contains('geral') |
-                origens.str.contains('consolidado')
-            )
-            df = df[mask]
-        
-        return df
-    
-    def export_origin_performance_excel(self, df):
-        """Exporta a tabela de desempenho por origem para Excel"""
-        import pandas as pd
-        from tkinter import filedialog, messagebox
+    # Configurações do documento
+    doc = SimpleDocTemplate(
+        file_path,
+        pagesize=letter,
+        rightMargin=40,
+        leftMargin=40,
+        topMargin=40,
+        bottomMargin=40
+    )
 
-        table_data = self.get_origin_performance_data(df)
-        if not table_data or len(table_data) < 2:
-            messagebox.showwarning("Exportar", "Nenhum dado disponível para exportação")
-            return
+    styles = getSampleStyleSheet()
 
-        # Converter para DataFrame
-        headers = table_data[0]
-        rows = table_data[1:]
-        df_export = pd.DataFrame(rows, columns=headers)
+    # Definir estilos personalizados
+    styles.add(ParagraphStyle(
+        name='TitleStyle',
+        fontSize=18,
+        alignment=TA_CENTER,
+        spaceAfter=12
+    ))
 
-        # Solicitar local para salvar
-        file_path = filedialog.asksaveasfilename(
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx")]
-        )
-        if not file_path:
-            return
+    styles.add(ParagraphStyle(
+        name='SubtitleStyle',
+        fontSize=12,
+        alignment=TA_CENTER,
+        textColor=colors.grey,
+        spaceAfter=20
+    ))
 
-        try:
-            df_export.to_excel(file_path, index=False)
-            messagebox.showinfo("Exportar", f"Tabela exportada com sucesso!\n{file_path}")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao exportar tabela:\n{str(e)}")
+    styles.add(ParagraphStyle(
+        name='SectionStyle',
+        fontSize=14,
+        spaceBefore=20,
+        spaceAfter=10
+    ))
 
-    def update_dashboard(self, event=None):
-        if self.data is None:
-            return
-            
-        # Atualizar lista de origens
-        # self.update_origin_checklist()
-        
-        current_view = self.view_var.get()
-        
-        # Limpar frames anteriores
-        for widget in self.summary_frame.winfo_children():
-            widget.destroy()
-        for widget in self.data_frame.winfo_children():
-            widget.destroy()
-        
-        # Obter dados atuais
-        df = self.get_current_data()
-        if df is None or df.empty:
-            ctk.CTkLabel(self.summary_frame, text="Nenhum dado disponível para a seleção atual").pack(pady=50)
-            return
-        
-        # Gerar visualização selecionada
-        if current_view == "Visão Geral":
-            self.show_summary(df)
-        elif current_view == "Desempenho por Origem":
-            self.show_origin_performance(df)
-        elif current_view == "Conversão por Canal":
-            self.show_conversion_by_channel(df)
-        elif current_view == "Evolução Mensal":
-            self.show_monthly_trend(df)
-        elif current_view == "Top Canais":
-            self.show_top_channels(df)
-        elif current_view == "Eficiência de Vendas":
-            self.show_sales_efficiency(df)
-        elif current_view == "Correlação Leads-Vendas":
-            self.show_correlation(df)
-        elif current_view == "Dispersão Leads x Vendas":
-            self.show_scatter_plots(df)
-        
-        # Mostrar dados detalhados na segunda aba
-        self.show_detailed_data(df)
-    
-    def show_summary(self, df):
-        """Exibe métricas de resumo principais"""
-        frame = self.summary_frame
-        
-        # Verificar se as colunas necessárias existem
-        required_columns = ['contatos', 'aproveitados', 'vendas']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        
-        if missing_columns:
-            ctk.CTkLabel(frame, text=f"Colunas obrigatórias ausentes: {', '.join(missing_columns)}").pack()
-            return
-        
-        # Criar cards com métricas principais
-        metrics_frame = ctk.CTkFrame(frame)
-        metrics_frame.pack(fill="x", pady=10, padx=10)
-        
-        # Calcular métricas
-        total_contacts = df['contatos'].sum()
-        total_leads = df['aproveitados'].sum()
-        total_sales = df['vendas'].sum()
-        
-        conversion_rate = total_sales / total_contacts if total_contacts > 0 else 0
-        lead_conversion_rate = total_sales / total_leads if total_leads > 0 else 0
-        lead_per_sale = total_contacts / total_sales if total_sales > 0 else 0
-        
-        # Métricas para mostrar
-        metrics = [
-            ("Total de Contatos", total_contacts, "{:,.0f}"),
-            ("Leads Aproveitados", total_leads, "{:,.0f}"),
-            ("Vendas Fechadas", total_sales, "{:,.0f}"),
-            ("Taxa de Conversão", conversion_rate, "{:.1%}"),
-            ("Conversão de Leads", lead_conversion_rate, "{:.1%}"),
-            ("Lead por Venda", lead_per_sale, "{:,.1f}")
-        ]
-        
-        # Exibir cards de métricas
-        for i, (title, value, fmt) in enumerate(metrics):
-            card = ctk.CTkFrame(metrics_frame, width=180, height=100)
-            card.grid(row=0, column=i, padx=10, pady=10)
-            
-            ctk.CTkLabel(card, text=title, font=("Helvetica", 12, "bold")).pack(pady=(10, 5))
-            ctk.CTkLabel(card, text=fmt.format(value), font=("Arial", 14)).pack(pady=(0, 10))
-        
-        # Gráficos
-        charts_frame = ctk.CTkFrame(frame)
-        charts_frame.pack(fill="both", expand=True, pady=10)
-        
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        
-        # Gráfico 1: Distribuição de origens (Top 5 + Outros)
-        if 'origem' in df.columns and 'contatos' in df.columns:
-            origin_counts = df.groupby('origem')['contatos'].sum()
-            
-            # Agrupar origens menores em "Outros"
-            if len(origin_counts) > 5:
-                top_origins = origin_counts.nlargest(5)
-                other = origin_counts.sum() - top_origins.sum()
-                top_origins = pd.concat([top_origins, pd.Series({'Outros': other})])
-            else:
-                top_origins = origin_counts
-            
-            # MODIFICAÇÃO 1: Remover o rótulo do eixo Y
-            top_origins.plot.pie(autopct='%1.1f%%', ax=ax1, startangle=90, ylabel='')
-            ax1.set_title("Distribuição por Origem (Top 5)")
-            # Remover completamente o label do eixo Y
-            ax1.set_ylabel('')
-        else:
-            ax1.set_title("Dados de origem não disponíveis")
-        
-        # Gráfico 2: Top 5 Canais por Conversão Total
-        if 'origem' in df.columns and 'contatos' in df.columns and 'vendas' in df.columns:
-            # Calcular eficiência dos canais
-            channel_efficiency = df.groupby('origem').agg({
-                'contatos': 'sum',
-                'vendas': 'sum'
-            })
-            
-            # Calcular taxa de conversão
-            channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
-            
-            # Filtrar canais com volume significativo
-            channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
-            
-            if not channel_efficiency.empty:
-                # Pegar top 5
-                top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao')
-                top_conversion = top_conversion.sort_values('taxa_conversao', ascending=True)
-                
-                # Criar gráfico de barras
-                bars = ax2.barh(top_conversion.index, top_conversion['taxa_conversao'], color='skyblue')
-                ax2.set_title("Top 5 Canais - Conversão Total")
-                ax2.set_xlabel("Taxa de Conversão")
-                ax2.grid(axis='x', linestyle='--', alpha=0.7)
-                
-                # Formatar eixo X como porcentagem
-                ax2.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
-                
-                # Adicionar valores nas barras
-                for bar in bars:
-                    width = bar.get_width()
-                    ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
-                            f'{width:.1%}', ha='left', va='center')
-            else:
-                ax2.set_title("Sem canais com dados suficientes")
-        else:
-            ax2.set_title("Dados incompletos")
-        
-        plt.tight_layout()
-        
-        canvas = FigureCanvasTkAgg(fig, master=charts_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def show_origin_performance(self, df):
-        """Mostra desempenho por origem de leads"""
-        frame = self.summary_frame
+    styles.add(ParagraphStyle(
+        name='BodyStyle',
+        fontSize=10,
+        alignment=TA_JUSTIFY,
+        leading=14
+    ))
 
-        # Usar a mesma preparação de dados do PDF
-        table_data = self.get_origin_performance_data(df)
-        if not table_data:
-            ctk.CTkLabel(frame, text="Dados de origem não disponíveis").pack()
-            return
+    styles.add(ParagraphStyle(
+        name='MetricStyle',
+        fontSize=14,
+        textColor=colors.darkblue,
+        spaceAfter=5
+    ))
 
-        # Botão de exportação para Excel
-        export_btn = ctk.CTkButton(
-            frame, text="Exportar Excel",
-            command=lambda: self.export_origin_performance_excel(df)
-        )
-        export_btn.pack(pady=(0, 10))
+    styles.add(ParagraphStyle(
+        name='FooterStyle',
+        fontSize=8,
+        textColor=colors.grey,
+        alignment=TA_CENTER
+    ))
 
-        # Criar frame para tabela
-        table_frame = ctk.CTkScrollableFrame(frame)
-        table_frame.pack(fill="both", expand=True, pady=10, padx=10)
-
-        # Cabeçalho
-        headers = table_data[0]
-        for j, header in enumerate(headers):
-            label = ctk.CTkLabel(table_frame, text=header, font=("Arial", 10, "bold"))
-            label.grid(row=0, column=j, padx=2, pady=2, sticky="nsew")
-
-        # Dados
-        for i, row in enumerate(table_data[1:]):
-            for j, value in enumerate(row):
-                ctk.CTkLabel(table_frame, text=value).grid(
-                    row=i+1, column=j, padx=2, pady=2, sticky="nsew")
-
-        # Tornar colunas expansíveis
-        for j in range(len(headers)):
-            table_frame.grid_columnconfigure(j, weight=1)
-    
-    def show_conversion_by_channel(self, df):
-        """Mostra análise de conversão por canal"""
-        frame = self.summary_frame
-        
-        if 'origem' not in df.columns:
-            ctk.CTkLabel(frame, text="Dados de origem não disponíveis").pack()
-            return
-        
-        # Criar gráfico de comparação de conversões
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        
-        # Agrupar por origem
-        grouped = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum',
-            'aproveitados': 'sum'
-        }).reset_index()
-        
-        # Calcular taxas
-        grouped['taxa_conversao'] = grouped['vendas'] / grouped['contatos']
-        grouped['conversao_ap'] = grouped['vendas'] / grouped['aproveitados']
-        
-        # Filtrar origens com pelo menos 100 contatos
-        grouped = grouped[grouped['contatos'] >= 100]
-        
-        # Gráfico 1: Conversão total
-        if not grouped.empty:
-            grouped_sorted = grouped.sort_values('taxa_conversao', ascending=False)
-            bars1 = ax1.bar(grouped_sorted['origem'], grouped_sorted['taxa_conversao'], color='skyblue')
-            ax1.set_title("Conversão Total por Origem")
-            ax1.set_ylabel("Taxa de Conversão")
-            ax1.tick_params(axis='x', rotation=90, labelsize=8)
-            ax1.grid(axis='y', linestyle='--', alpha=0.7)
-            
-            # Formatar eixo Y como porcentagem
-            ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
-            
-            # Adicionar valores nas barras como porcentagem
-            for bar in bars1:
-                height = bar.get_height()
-                ax1.text(bar.get_x() + bar.get_width()/2., height + 0.01,
-                        f'{height:.1%}', ha='center', va='bottom', fontsize=6)
-            
-            # Gráfico 2: Conversão de leads
-            grouped_sorted = grouped.sort_values('conversao_ap', ascending=False)
-            bars2 = ax2.bar(grouped_sorted['origem'], grouped_sorted['conversao_ap'], color='lightgreen')
-            ax2.set_title("Conversão de Leads por Origem")
-            ax2.set_ylabel("Taxa de Conversão")
-            ax2.tick_params(axis='x', rotation=90, labelsize=8)
-            ax2.grid(axis='y', linestyle='--', alpha=0.7)
-            
-            # Formatar eixo Y como porcentagem
-            ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
-            
-            # Adicionar valores nas barras como porcentagem
-            for bar in bars2:
-                height = bar.get_height()
-                ax2.text(bar.get_x() + bar.get_width()/2., height + 0.01,
-                        f'{height:.1%}', ha='center', va='bottom', fontsize=6)
-        
-        plt.tight_layout()
-        
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
-        
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def show_monthly_trend(self, df):
-        """Mostra evolução mensal das métricas principais"""
-        frame = self.summary_frame
-        
-        if 'periodo_dt' not in df.columns:
-            ctk.CTkLabel(frame, text="Dados temporais não disponíveis").pack()
+    # Gráficos renderizados em paralelo direto para a memória; cada um leva só os agregados
+    report_start = time.perf_counter()
+    figure_data = {name: agg for name in REPORT_FIGURES}
+    figure_data['Correlação Leads-Vendas'] = df_corr
+    figures = render_report_figures(figure_data, workers)
+    timings = {name: seconds for name, (_, seconds) in figures.items()}
+    timings['Gráficos'] = time.perf_counter() - report_start
+    for name, (_, seconds) in figures.items():
+        TIMINGS.record('pdf.figure', seconds, section=name)
+    TIMINGS.record('pdf.figures', timings['Gráficos'], workers=workers)
+
+    elements = []
+
+    # Cabeçalho
+    elements.append(Paragraph("Relatório Completo de Performance de Leads", styles['TitleStyle']))
+
+    # Formatar período
+    formatted_start = format_period_display(start_dt)
+    formatted_end = format_period_display(end_dt)
+
+    elements.append(Paragraph(f"{city} | {formatted_start} - {formatted_end}", styles['SubtitleStyle']))
+    elements.append(Spacer(1, 12))
+
+    # Seção: Visão Geral
+    elements.append(Paragraph("1. Visão Geral", styles['SectionStyle']))
+
+    # Calcular métricas
+    total_contacts = agg.totals.get('contatos', 0)
+    total_leads = agg.totals.get('aproveitados', 0)
+    total_sales = agg.totals.get('vendas', 0)
+
+    conversion_rate = total_sales / total_contacts if total_contacts > 0 else 0
+    lead_conversion_rate = total_sales / total_leads if total_leads > 0 else 0
+
+    # Criar tabela de métricas
+    metrics_data = [
+        ["Métrica", "Valor", "Insight"],
+        ["Total de Contatos", f"{total_contacts:,.0f}", "Volume total de oportunidades geradas"],
+        ["Leads Aproveitados", f"{total_leads:,.0f}", f"({total_leads/total_contacts:.1%} dos contatos)" if total_contacts > 0 else ""],
+        ["Vendas Fechadas", f"{total_sales:,.0f}", f"({conversion_rate:.1%} de conversão geral)" if total_contacts > 0 else ""],
+        ["Conversão de Leads", f"{lead_conversion_rate:.1%}" if total_leads > 0 else "N/A", "Eficiência no aproveitamento de oportunidades"]
+    ]
+
+    metrics_table = Table(metrics_data)
+    metrics_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2c3e50")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ]))
+    elements.append(metrics_table)
+    elements.append(Spacer(1, 20))
+
+    # Gráficos da Visão Geral
+    png = figures['Visão Geral'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=300))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Desempenho por Origem
+    elements.append(PageBreak())
+    elements.append(Paragraph("2. Desempenho por Origem", styles['SectionStyle']))
+
+    # Tabela de desempenho
+    table_data = origin_performance_table(agg)
+    if table_data:
+        origin_table = Table(table_data)
+        origin_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2c3e50")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ]))
+        elements.append(origin_table)
+        elements.append(Spacer(1, 20))
+
+    # Seção: Conversão por Canal
+    elements.append(PageBreak())
+    elements.append(Paragraph("3. Conversão por Canal", styles['SectionStyle']))
+
+    png = figures['Conversão por Canal'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=300))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Evolução Mensal
+    elements.append(PageBreak())
+    elements.append(Paragraph("4. Evolução Mensal", styles['SectionStyle']))
+    elements.append(Paragraph("Análise: Acompanhe a evolução dos principais indicadores ao longo do tempo. Tendências de crescimento em contatos e vendas indicam eficácia nas estratégias. Quedas consistentes podem sinalizar problemas operacionais ou de mercado.", styles['BodyStyle']))
+
+    png = figures['Evolução Mensal'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=400))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Top Canais
+    elements.append(PageBreak())
+    elements.append(Paragraph("5. Top Canais", styles['SectionStyle']))
+    elements.append(Paragraph("Análise: Identifique os canais com melhor desempenho. Canais com alta conversão representam oportunidades de investimento. Canais com baixa conversão podem precisar de otimização ou realocação de recursos.", styles['BodyStyle']))
+
+    png = figures['Top Canais'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=300))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Eficiência de Vendas
+    elements.append(PageBreak())
+    elements.append(Paragraph("6. Eficiência de Vendas", styles['SectionStyle']))
+    elements.append(Paragraph("Análise: Mede a porcentagem de vendas por lead. Quanto maior o valor, melhor será para investir", styles['BodyStyle']))
+
+    png = figures['Eficiência de Vendas'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=350))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Correlação Leads-Vendas
+    elements.append(PageBreak())
+    elements.append(Paragraph("7. Correlação Leads-Vendas", styles['SectionStyle']))
+    elements.append(Paragraph("Análise: Correlação mede a relação entre leads e vendas. Valores próximos a 1 indicam que o aumento de leads acompanha o aumento de vendas. Valores próximos a -1 indicam relação inversa. Valores próximos a 0 indicam pouca relação entre as variáveis.", styles['BodyStyle']))
+    elements.append(Paragraph("Interpretação: Correlação > 0.7 = Forte relação positiva | 0.3-0.7 = Relação moderada | < 0.3 = Fraca relação", styles['BodyStyle']))
+
+    png = figures['Correlação Leads-Vendas'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=350))
+        elements.append(Spacer(1, 20))
+
+    # Seção: Dispersão Leads x Vendas
+    elements.append(PageBreak())
+    elements.append(Paragraph("8. Dispersão Leads x Vendas", styles['SectionStyle']))
+    elements.append(Paragraph("Análise: Mostra a relação entre volume de leads e vendas geradas. Canais no canto superior direito (muitos leads e vendas) são os mais eficientes. Canais com muitos leads e poucas vendas precisam de otimização.", styles['BodyStyle']))
+
+    png = figures['Dispersão Leads x Vendas'][0]
+    if png:
+        elements.append(Image(BytesIO(png), width=500, height=300))
+        elements.append(Spacer(1, 20))
+
+    # Rodapé
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph(f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['FooterStyle']))
+    elements.append(Paragraph("Sistema de Análise de Leads | Dados Confidenciais", styles['FooterStyle']))
+
+    # Construir PDF
+    build_start = time.perf_counter()
+    doc.build(elements)
+    timings['Montagem do PDF'] = time.perf_counter() - build_start
+    timings['Total'] = time.perf_counter() - report_start
+    TIMINGS.record('pdf.build', timings['Montagem do PDF'], city=city)
+    TIMINGS.record('pdf', timings['Total'], city=city, file=os.path.basename(file_path))
+    return timings
+
+
+class SheetCache:
+    """Cache colunar em disco das abas já limpas, indexado pelo hash do arquivo"""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+
+    @staticmethod
+    def file_hash(file_path):
+        """Calcula o hash SHA-256 do conteúdo do arquivo"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _manifest_path(self, file_hash):
+        return os.path.join(self.cache_dir, f"{file_hash}_v{CLEANING_PIPELINE_VERSION}.json")
+
+    def _entry_path(self, file_hash, sheet_name):
+        """Caminho base (sem extensão) da entrada de uma aba"""
+        sheet_key = hashlib.sha1(str(sheet_name).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{file_hash}_{sheet_key}_v{CLEANING_PIPELINE_VERSION}")
+
+    def load_sheet(self, file_hash, sheet_name):
+        """Lê uma aba do cache (Parquet ou pickle). Retorna None se não existir"""
+        base = self._entry_path(file_hash, sheet_name)
+        for ext, reader in ((".parquet", pd.read_parquet), (".pkl", pd.read_pickle)):
+            path = base + ext
+            if os.path.exists(path):
+                df = reader(path)
+                os.utime(path)  # Marca como usado recentemente
+                return df
+        return None
+
+    def store_sheet(self, file_hash, sheet_name, df):
+        """Grava uma aba em Parquet; usa pickle se o pyarrow não estiver disponível
+        ou se a aba tiver colunas com tipos mistos"""
+        base = self._entry_path(file_hash, sheet_name)
+        try:
+            df.to_parquet(base + ".parquet", index=False)
             return
-        
-        # Agrupar por período
-        monthly = df.groupby('periodo_dt').agg({
-            'contatos': 'sum',
-            'aproveitados': 'sum',
-            'vendas': 'sum'
-        }).sort_index()
-        
-        # Calcular métricas
-        monthly['taxa_conversao'] = monthly['vendas'] / monthly['contatos']
-        monthly['conversao_ap'] = monthly['vendas'] / monthly['aproveitados']
-        
-        # Formatar datas para exibição
-        monthly['periodo_formatado'] = monthly.index.map(self.format_period_display)
-        
-        # Criar gráfico
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
-        
-        # Gráfico 1: Volume
-        monthly[['contatos', 'aproveitados', 'vendas']].plot(ax=ax1, marker='o')
-        ax1.set_title("Evolução Mensal - Volume")
-        ax1.set_ylabel("Quantidade")
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        ax1.legend(['Contatos', 'Aproveitados', 'Vendas'])
-        ax1.set_xlabel('')
-        
-        # Gráfico 2: Taxas
-        monthly[['taxa_conversao', 'conversao_ap']].plot(ax=ax2, marker='o')
-        ax2.set_title("Evolução Mensal - Taxas de Conversão")
-        ax2.set_ylabel("Taxa")
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        ax2.legend(['Conversão Total', 'Conversão de Aproveitados'])
-        ax2.set_xlabel('')
+        except Exception:
+            if os.path.exists(base + ".parquet"):
+                os.remove(base + ".parquet")
+        df.to_pickle(base + ".pkl")
 
-        # Formatar eixos Y como porcentagem
-        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
+    def load_workbook(self, file_hash):
+        """Retorna {aba: DataFrame} de um arquivo já processado, ou None se faltar alguma aba"""
+        manifest_path = self._manifest_path(file_hash)
+        if not os.path.exists(manifest_path):
+            return None
 
-        plt.tight_layout()
-        
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
-        
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def show_top_channels(self, df):
-        """Mostra os canais mais eficientes"""
-        frame = self.summary_frame
-        
-        if 'origem' not in df.columns:
-            ctk.CTkLabel(frame, text="Dados de origem não disponíveis").pack()
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            sheet_names = json.load(f)["sheets"]
+
+        data = {}
+        for sheet_name in sheet_names:
+            df = self.load_sheet(file_hash, sheet_name)
+            if df is None:
+                return None
+            data[sheet_name] = df
+        os.utime(manifest_path)
+        return data
+
+    def store_workbook(self, file_hash, data):
+        """Grava todas as abas e o manifesto com a ordem original das abas"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for sheet_name, df in data.items():
+            self.store_sheet(file_hash, sheet_name, df)
+
+        # Manifesto gravado por último: só é válido se todas as abas foram salvas
+        with open(self._manifest_path(file_hash), "w", encoding="utf-8") as f:
+            json.dump({"version": CLEANING_PIPELINE_VERSION, "sheets": list(data.keys())}, f)
+
+    def evict(self):
+        """Remove entradas antigas e, se necessário, as menos usadas até caber no limite"""
+        if not os.path.isdir(self.cache_dir):
             return
-        
-        # Calcular eficiência dos canais
-        channel_efficiency = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum',
-            'aproveitados': 'sum'
-        }).reset_index()
-        
-        # Calcular métricas
-        channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
-        channel_efficiency['conversao_ap'] = channel_efficiency['vendas'] / channel_efficiency['aproveitados']
-        channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
-        
-        # Criar gráficos
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
-        
-        # Top 5 por conversão total
-        if not channel_efficiency.empty:
-            top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao').sort_values('taxa_conversao', ascending=True)
-            bars1 = ax1.barh(top_conversion['origem'], top_conversion['taxa_conversao'], color='skyblue')
-            ax1.set_title("Top 5 Canais - Conversão Total")
-            ax1.set_xlabel("Taxa de Conversão")
-            ax1.grid(axis='x', linestyle='--', alpha=0.7)
-            
-            # Formatar eixo X como porcentagem
-            ax1.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
-            
-            # Adicionar valores nas barras
-            for bar in bars1:
-                width = bar.get_width()
-                ax1.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
-                        f'{width:.1%}', ha='left', va='center')
-            
-            # Top 5 por conversão de leads
-            top_lead_conversion = channel_efficiency.nlargest(5, 'conversao_ap').sort_values('conversao_ap', ascending=True)
-            bars2 = ax2.barh(top_lead_conversion['origem'], top_lead_conversion['conversao_ap'], color='lightgreen')
-            ax2.set_title("Top 5 Canais - Conversão de Leads")
-            ax2.set_xlabel("Taxa de Conversão")
-            ax2.grid(axis='x', linestyle='--', alpha=0.7)
-            
-            # Formatar eixo X como porcentagem
-            ax2.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
-            
-            # Adicionar valores nas barras
-            for bar in bars2:
-                width = bar.get_width()
-                ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
-                        f'{width:.1%}', ha='left', va='center')
-        
-        plt.tight_layout()
-        
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
-        
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def show_sales_efficiency(self, df):
-        """Mostra eficiência de vendas"""
-        frame = self.summary_frame
-        
-        # Verificar se as colunas necessárias existem
-        if 'contatos' not in df.columns or 'vendas' not in df.columns:
-            ctk.CTkLabel(frame, text="Dados de eficiência não disponíveis").pack()
+
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        now = time.time()
+        max_age = self.max_age_days * 86400
+        total_size = sum(size for _, size, _ in entries)
+
+        # Mais antigas primeiro
+        for mtime, size, path in sorted(entries):
+            if now - mtime > max_age or total_size > self.max_bytes:
+                try:
+                    os.remove(path)
+                    total_size -= size
+                except OSError:
+                    pass
+
+
+# Lista de origens: linhas de checkbox reaproveitadas e atraso da pesquisa (ms)
+ORIGIN_POOL_ROWS = 5
+ORIGIN_SEARCH_DEBOUNCE_MS = 200
+ORIGIN_NGRAM = 3
+
+# Intervalo (ms) entre as verificações do monitor de alterações da planilha
+WATCH_INTERVAL_MS = 2000
+
+# Altura (px) da tabela de desempenho por origem
+ORIGIN_TABLE_HEIGHT = 480
+
+
+class OriginSearchIndex:
+    """Índice de n-gramas (até ORIGIN_NGRAM caracteres) sobre os nomes das origens
+    em minúsculas. Uma busca intersecta as listas dos n-gramas do termo e só
+    confirma com 'in' os poucos candidatos restantes."""
+
+    def __init__(self, origins, n=ORIGIN_NGRAM):
+        self.origins = list(origins)
+        self.names = [origin.lower() for origin in self.origins]
+        self.n = n
+        self.postings = {}  # n-grama -> posições (em ordem) das origens que o contêm
+
+        for pos, name in enumerate(self.names):
+            grams = {name[i:i + size] for size in range(1, n + 1)
+                     for i in range(len(name) - size + 1)}
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(pos)
+
+    def search(self, term):
+        """Retorna as origens que contêm o termo, na ordem original"""
+        term = term.strip().lower()
+        if not term:
+            return self.origins
+
+        if len(term) <= self.n:
+            return [self.origins[pos] for pos in self.postings.get(term, [])]
+
+        # Menor lista primeiro; a interseção encolhe rapidamente
+        grams = {term[i:i + self.n] for i in range(len(term) - self.n + 1)}
+        lists = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for positions in lists[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                return []
+
+        return [self.origins[pos] for pos in sorted(candidates) if term in self.names[pos]]
+
+
+class VirtualTable:
+    """Tabela virtualizada sobre um ttk.Treeview: apenas as linhas visíveis existem
+    como itens do Tk e são reaproveitadas na rolagem. Os dados ficam em arrays por
+    coluna; a ordenação pelo cabeçalho usa índices de argsort guardados em cache.
+    Cada formatador recebe o array das linhas visíveis e devolve os textos delas."""
+
+    def __init__(self, master, headers, columns, formatters=None, widths=None):
+        self.headers = list(headers)
+        self.columns = [np.asarray(col) for col in columns]
+        self.formatters = formatters or [format_cells] * len(self.headers)
+        self.row_count = len(self.columns[0]) if self.columns else 0
+        self.order = np.arange(self.row_count)
+        self.sort_cache = {}  # coluna -> (posições em ordem crescente, qtd. não nulos)
+        self.sort_state = None  # (coluna, decrescente)
+        self.offset = 0
+        self.items = []
+
+        self.scrollbar = ctk.CTkScrollbar(master, command=self._on_scroll)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree = ttk.Treeview(master, columns=self.headers, show="headings", height=1)
+        for j, header in enumerate(self.headers):
+            self.tree.column(header, anchor="w", width=widths[j] if widths else 100)
+            self.tree.heading(header, text=header, anchor="w", command=lambda j=j: self.sort_by(j))
+        self.tree.pack(fill="both", expand=True)
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.offset - 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.offset + 3))
+
+    def _on_wheel(self, event):
+        """Roda do mouse: no Windows o delta vem em múltiplos de 120 (3 linhas por passo);
+        no macOS, ±1..±3 (uma linha por unidade)"""
+        if sys.platform == 'win32':
+            step = 3 * max(1, abs(event.delta) // 120)
+        else:
+            step = max(1, abs(event.delta))
+        self.scroll_to(self.offset - step if event.delta > 0 else self.offset + step)
+
+    def _visible_capacity(self, height):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, height // row_height - 1)  # Descontar o cabeçalho
+
+    def _on_resize(self, event):
+        capacity = self._visible_capacity(event.height)
+        if capacity == len(self.items):
             return
+
+        # Ajustar o conjunto de itens reaproveitáveis ao novo tamanho
+        while len(self.items) < capacity:
+            self.items.append(self.tree.insert("", "end", values=()))
+        while len(self.items) > capacity:
+            self.tree.delete(self.items.pop())
+        self.scroll_to(self.offset)
+
+    def _on_scroll(self, action, value, unit=None):
+        capacity = max(len(self.items), 1)
+        if action == "moveto":
+            self.scroll_to(int(float(value) * self.row_count))
+        elif action == "scroll":
+            step = capacity if unit == "pages" else 1
+            self.scroll_to(self.offset + int(value) * step)
+
+    def scroll_to(self, offset):
+        """Exibe as linhas a partir da posição indicada"""
+        capacity = len(self.items)
+        self.offset = max(0, min(offset, self.row_count - capacity))
+        cells, visible = self._window_cells(capacity)
+        for i, item in enumerate(self.items):
+            if i < visible:
+                self.tree.item(item, values=[cells[j][i] for j in range(len(cells))])
+            else:
+                self.tree.item(item, values=())
+
+        if self.row_count:
+            self.scrollbar.set(self.offset / self.row_count,
+                               min((self.offset + capacity) / self.row_count, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _window_cells(self, capacity):
+        """Textos das linhas visíveis a partir de self.offset, por coluna, e quantas são"""
+        window = self.order[self.offset:self.offset + capacity]
+        # Formatar apenas as células visíveis
+        return [fmt(col[window]) for col, fmt in zip(self.columns, self.formatters)], len(window)
+
+    def _show_sort(self, column, descending):
+        """Seta de ordenação no cabeçalho da coluna ordenada"""
+        for j, header in enumerate(self.headers):
+            arrow = (" ▼" if descending else " ▲") if j == column else ""
+            self.tree.heading(header, text=header + arrow)
+
+    def sort_by(self, column):
+        """Ordena pela coluna clicada; um novo clique inverte a direção"""
+        if column not in self.sort_cache:
+            values = pd.Series(self.columns[column])
+            try:
+                ordered = values.sort_values(kind="stable", na_position="last")
+            except TypeError:
+                # Tipos mistos: ordenar pela representação em texto
+                ordered = values.astype(str).sort_values(kind="stable")
+            self.sort_cache[column] = (ordered.index.to_numpy(), int(ordered.notna().sum()))
+
+        descending = self.sort_state == (column, False)
+        ascending_order, valid = self.sort_cache[column]
+        if descending:
+            # Valores ausentes continuam no fim da lista
+            self.order = np.concatenate([ascending_order[:valid][::-1], ascending_order[valid:]])
+        else:
+            self.order = ascending_order
+        self.sort_state = (column, descending)
+        self._show_sort(column, descending)
+        self.scroll_to(0)
+
+
+class PagedTable(VirtualTable):
+    """VirtualTable sem os dados em memória: cada rolagem pede só a página visível a
+    fetch(offset, limit, sort), que devolve um DataFrame com as colunas na ordem dos
+    cabeçalhos. A ordenação também fica com fetch; sort é (coluna, decrescente) ou None."""
+
+    def __init__(self, master, headers, row_count, fetch, formatters=None, widths=None):
+        super().__init__(master, headers, [], formatters, widths)
+        self.row_count = row_count
+        self.fetch = fetch
+
+    def _window_cells(self, capacity):
+        if capacity == 0 or self.row_count == 0:
+            return [], 0
+        page = self.fetch(self.offset, capacity, self.sort_state)
+        return [fmt(page.iloc[:, j].to_numpy()) for j, fmt in enumerate(self.formatters)], len(page)
+
+    def sort_by(self, column):
+        descending = self.sort_state == (column, False)
+        self.sort_state = (column, descending)
+        self._show_sort(column, descending)
+        self.scroll_to(0)
+
+
+class LeadAnalyzerApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Sistema de Análise de Leads")
+        self.root.geometry("1400x900")
         
-        # Agrupar dados por origem e calcular totais
-        grouped = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum'
-        }).reset_index()
+        self.data = None
+        self.dataset = None  # LeadDataset (planilhas em memória) ou LeadStore (banco SQLite)
+        self.current_city = "Total"
+        self.all_periods = []
+        self.selected_origins = []
+        self.sheet_cache = SheetCache()
+        self.aggregate_cache = AggregateCache()
+        self.view_cache = ViewCache()
+        self.view_frame = None
+        self.detail_key = None
+        self.dashboard_job = None
+        self.ingest_workers = INGEST_WORKERS
+        self.streaming_min_file_mb = STREAMING_MIN_FILE_MB
+        self.profile_next_refresh = False
+        self.last_profile = None  # Resumo do último perfil do cProfile
+        self.memory_report = None  # Memória por aba antes/depois da compactação
+        self.data_source = None  # ('arquivo' | 'pasta', caminho) da última carga
+        self.sheet_fingerprints = {}  # Impressão digital de cada aba na última carga
+        self.sheet_periods = {}  # Períodos de cada aba: {datetime: valor original}
+        self.watch_job = None
+        self.watch_signature = None
+        TIMINGS.enable_log()
         
-        # Calcular eficiência como porcentagem
-        grouped['eficiencia'] = (grouped['vendas'] / grouped['contatos']) * 100
+        # Criar layout principal
+        self.main_frame = ctk.CTkFrame(root)
+        self.main_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        # Filtrar origens com pelo menos 10 vendas
-        filtered = grouped[grouped['vendas'] >= 10]
+        # Painel de controle
+        self.control_panel = ctk.CTkFrame(self.main_frame, width=250)
+        self.control_panel.pack(side="left", fill="y", padx=(0, 10))
         
-        if filtered.empty:
-            ctk.CTkLabel(frame, text="Nenhuma origem com dados suficientes (mínimo 10 vendas)").pack()
-            return
+        # Botão para carregar arquivo
+        self.load_button = ctk.CTkButton(self.control_panel, text="Carregar Planilha", command=self.load_file)
+        self.load_button.pack(pady=(10, 5), padx=10, fill="x")
+        self.load_folder_button = ctk.CTkButton(self.control_panel, text="Carregar Pasta", command=self.load_folder)
+        self.load_folder_button.pack(pady=(0, 5), padx=10, fill="x")
+        self.open_store_button = ctk.CTkButton(self.control_panel, text="Abrir Banco", command=self.open_store)
+        self.open_store_button.pack(pady=(0, 5), padx=10, fill="x")
+        self.store_var = ctk.BooleanVar(value=False)
+        self.store_check = ctk.CTkCheckBox(
+            self.control_panel,
+            text="Gravar banco SQLite",
+            variable=self.store_var
+        )
+        self.store_check.pack(pady=(0, 5), padx=10, anchor="w")
+        self.reload_button = ctk.CTkButton(self.control_panel, text="Recarregar", command=self.reload_data)
+        self.reload_button.pack(pady=(0, 5), padx=10, fill="x")
+        self.watch_var = ctk.BooleanVar(value=False)
+        self.watch_check = ctk.CTkCheckBox(
+            self.control_panel,
+            text="Recarregar ao salvar",
+            variable=self.watch_var,
+            command=self.toggle_watch
+        )
+        self.watch_check.pack(pady=(0, 10), padx=10, anchor="w")
         
-        # Selecionar top 15
-        top_15 = filtered.nlargest(15, 'eficiencia').sort_values('eficiencia', ascending=True)
+        # Seletor de cidade
+        self.city_label = ctk.CTkLabel(self.control_panel, text="Selecione a Cidade:")
+        self.city_label.pack(pady=(1, 1))
         
-        # Criar gráfico
-        fig, ax = plt.subplots(figsize=(10, 6))
+        self.city_var = ctk.StringVar(value="Total")
+        self.city_selector = ctk.CTkComboBox(
+            self.control_panel, 
+            values=["Total"],
+            variable=self.city_var
+        )
+        self.city_selector.pack(pady=5, padx=10, fill="x")
         
-        # Criar gráfico de barras horizontais
-        bars = ax.barh(top_15['origem'], top_15['eficiencia'], color='skyblue')
-        ax.set_title("Eficiência de Vendas (Vendas por Lead - Top 15)")
-        ax.set_xlabel("Eficiência (%)")
-        ax.grid(axis='x', linestyle='--', alpha=0.7)
+        # Adicionar seletores de período inicial e final
+        self.period_label_start = ctk.CTkLabel(self.control_panel, text="Intervalo de Período:")
+        self.period_label_start.pack(pady=(1, 1))
         
-        # Adicionar valores nas barras
-        for bar in bars:
-            width = bar.get_width()
-            ax.text(width + 0.5, bar.get_y() + bar.get_height()/2, 
-                    f'{width:.1f}%', ha='left', va='center')
+        self.period_var_start = ctk.StringVar(value="")
+        self.period_selector_start = ctk.CTkComboBox(
+            self.control_panel, 
+            values=[],
+            variable=self.period_var_start
+        )
+        self.period_selector_start.pack(pady=5, padx=10, fill="x")
         
-        plt.tight_layout()
+        self.period_var_end = ctk.StringVar(value="")
+        self.period_selector_end = ctk.CTkComboBox(
+            self.control_panel, 
+            values=[],
+            variable=self.period_var_end
+        )
+        self.period_selector_end.pack(pady=5, padx=10, fill="x")
         
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
+        # Filtro de origem - Layout melhorado
+        self.origin_label = ctk.CTkLabel(self.control_panel, text="Filtrar por Origem:")
+        self.origin_label.pack(pady=(1, 1))
         
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def calculate_correlations(self, df):
-        """Calcula correlação entre Leads e Vendas para cada origem"""
-        correlations = []
+        # Frame para controles de origem
+        self.origin_control_frame = ctk.CTkFrame(self.control_panel)
+        self.origin_control_frame.pack(fill="x", padx=10, pady=(0, 5))
         
-        for origem in df['origem'].unique():
-            df_origem = df[df['origem'] == origem]
-            
-            # Garantir que temos dados suficientes
-            if len(df_origem) >= 3 and 'contatos' in df_origem.columns and 'vendas' in df_origem.columns:
-                # Remover zeros para evitar problemas
-                df_clean = df_origem[(df_origem['contatos'] > 0) & (df_origem['vendas'] > 0)]
-                
-                if len(df_clean) >= 3:
-                    try:
-                        corr = df_clean['contatos'].corr(df_clean['vendas'])
-                        correlations.append({
-                            'origem': origem,
-                            'correlacao': corr,
-                            'n_periodos': len(df_clean)
-                        })
-                    except:
-                        continue
-        
-        # Criar DataFrame e ordenar
-        if correlations:
-            df_corr = pd.DataFrame(correlations)
-            return df_corr.sort_values('correlacao', ascending=False)
-        return pd.DataFrame()
-    
-    def show_correlation(self, df):
-        """Mostra análise de correlação entre leads e vendas"""
-        frame = self.summary_frame
+        # Botão Selecionar Todas
+        self.select_all_button = ctk.CTkButton(
+            self.origin_control_frame, 
+            text="Todas",
+            width=60,
+            command=self.select_all_origins
+        )
+        self.select_all_button.pack(side="left", padx=(0, 5))
         
-        df_corr = self.calculate_correlations(df)
+        # Botão Limpar Seleção
+        self.clear_button = ctk.CTkButton(
+            self.origin_control_frame, 
+            text="Nenhuma",
+            width=60,
+            command=self.clear_all_origins
+        )
+        self.clear_button.pack(side="left", padx=(0, 5))
         
-        if df_corr.empty:
-            ctk.CTkLabel(frame, text="Dados insuficientes para calcular correlações (mínimo 3 períodos por origem)").pack()
-            return
+        # Campo de pesquisa
+        self.search_origin = ctk.CTkEntry(
+            self.origin_control_frame,
+            placeholder_text="Pesquisar..."
+        )
+        self.search_origin.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.search_origin.bind("<KeyRelease>", self.filter_origin_list)
         
-        # Separar em melhores e piores
-        top_15 = df_corr.head(15).sort_values('correlacao', ascending=False)
-        bottom_15 = df_corr.tail(15).sort_values('correlacao', ascending=True)
+        # Lista virtual de checkboxes: um conjunto fixo de linhas reaproveitadas
+        self.origin_frame = ctk.CTkFrame(self.control_panel, height=150)
+        self.origin_frame.pack(fill="x", padx=10, pady=5)
+        self.origin_frame.pack_propagate(False)
+        self.origin_scrollbar = ctk.CTkScrollbar(self.origin_frame, command=self.scroll_origin_list)
+        self.origin_scrollbar.pack(side="right", fill="y")
+        self.origin_checkboxes = []
+        for _ in range(ORIGIN_POOL_ROWS):
+            cb = ctk.CTkCheckBox(self.origin_frame, text="")
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                cb.bind(sequence, self.on_origin_wheel)
+            self.origin_checkboxes.append(cb)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.origin_frame.bind(sequence, self.on_origin_wheel)
+        self.origin_search_index = OriginSearchIndex([])
+        self.origin_matches = []  # Origens que passam na pesquisa atual
+        self.origin_offset = 0
+        self.origin_search_job = None
+
+        # Botão para aplicar filtros
+        self.apply_button = ctk.CTkButton(
+            self.control_panel,
+            text="Aplicar Filtros",
+            command=self.apply_filters
+        )
+        self.apply_button.pack(pady=10, padx=10, fill="x")
         
-        # Criar gráficos
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
+        # Seletor de visualização
+        self.view_label = ctk.CTkLabel(self.control_panel, text="Tipo de Visualização:")
+        self.view_label.pack(pady=(1, 1))
         
-        # Gráfico 1: Melhores correlações
-        bars1 = ax1.barh(top_15['origem'], top_15['correlacao'], color='#2ecc71')
-        ax1.set_title('TOP 15 - Melhores Correlações (Leads x Vendas)')
-        ax1.set_xlabel("Coeficiente de Correlação")
-        ax1.set_xlim(-1.1, 1.1)
-        ax1.grid(axis='x', linestyle='--', alpha=0.7)
+        self.view_var = ctk.StringVar(value="Visão Geral")
+        self.view_selector = ctk.CTkComboBox(
+            self.control_panel, 
+            values=[
+                "Visão Geral",
+                "Desempenho por Origem",
+                "Conversão por Canal",
+                "Evolução Mensal",
+                "Top Canais",
+                "Eficiência de Vendas",
+                "Correlação Leads-Vendas",
+                "Dispersão Leads x Vendas"
+            ],
+            variable=self.view_var,
+            command=self.update_dashboard
+        )
+        self.view_selector.pack(pady=5, padx=10, fill="x")
         
-        # Adicionar valores nas barras
-        for bar in bars1:
-            width = bar.get_width()
-            ax1.text(width + 0.02 if width > 0 else width - 0.1, 
-                    bar.get_y() + bar.get_height()/2, 
-                    f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
+        # Botão de exportar
+        self.export_button = ctk.CTkButton(self.control_panel, text="Exportar Relatório PDF", command=self.export_report)
+        self.export_button.pack(pady=(20, 5), padx=10, fill="x")
+
+        # Exportação das linhas filtradas para Excel
+        self.export_data_button = ctk.CTkButton(self.control_panel, text="Exportar Dados (Excel)",
+                                                command=self.export_filtered_data)
+        self.export_data_button.pack(pady=5, padx=10, fill="x")
+        self.export_by_city_var = ctk.BooleanVar(value=False)
+        self.export_by_city_check = ctk.CTkCheckBox(
+            self.control_panel,
+            text="Uma aba por cidade",
+            variable=self.export_by_city_var
+        )
+        self.export_by_city_check.pack(pady=(0, 20), padx=10, anchor="w")
         
-        # Gráfico 2: Piores correlações
-        bars2 = ax2.barh(bottom_15['origem'], bottom_15['correlacao'], color='#e74c3c')
-        ax2.set_title('TOP 15 - Piores Correlações (Leads x Vendas)')
-        ax2.set_xlabel("Coeficiente de Correlação")
-        ax2.set_xlim(-1.1, 1.1)
-        ax2.grid(axis='x', linestyle='--', alpha=0.7)
+        # Painel de diagnóstico (tempos das etapas), desligado por padrão
+        self.diagnostics_var = ctk.BooleanVar(value=False)
+        self.diagnostics_check = ctk.CTkCheckBox(
+            self.control_panel,
+            text="Mostrar diagnóstico",
+            variable=self.diagnostics_var,
+            command=self.toggle_diagnostics
+        )
+        self.diagnostics_check.pack(pady=(0, 10), padx=10, anchor="w")
         
-        # Adicionar valores nas barras
-        for bar in bars2:
-            width = bar.get_width()
-            ax2.text(width + 0.02 if width > 0 else width - 0.1, 
-                    bar.get_y() + bar.get_height()/2, 
-                    f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
+        # Indicador de processamento do dashboard (exibido só durante o cálculo)
+        self.progress_bar = ctk.CTkProgressBar(self.control_panel, mode="indeterminate")
         
-        plt.tight_layout()
+        # Área de dashboard
+        self.dashboard_frame = ctk.CTkFrame(self.main_frame)
+        self.dashboard_frame.pack(side="right", fill="both", expand=True)
         
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
+        # Notebook para múltiplas visualizações
+        self.notebook = ttk.Notebook(self.dashboard_frame)
+        self.notebook.pack(fill="both", expand=True)
         
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
-    
-    def show_scatter_plots(self, df):
-        """Mostra gráficos de dispersão entre leads e vendas"""
-        frame = self.summary_frame
+        # Abas do notebook
+        self.tab1 = ctk.CTkFrame(self.notebook)
+        self.tab2 = ctk.CTkFrame(self.notebook)
+        self.tab3 = ctk.CTkFrame(self.notebook)  # Diagnóstico, adicionada sob demanda
         
-        required_columns = ['contatos', 'aproveitados', 'vendas', 'origem']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        self.notebook.add(self.tab1, text="Dashboard")
+        self.notebook.add(self.tab2, text="Dados Detalhados")
         
-        if missing_columns:
-            ctk.CTkLabel(frame, text=f"Colunas obrigatórias ausentes: {', '.join(missing_columns)}").pack()
-            return
+        # Inicializar widgets vazios
+        self.init_dashboard()
         
-        # Agregar dados por origem (somar todos os períodos)
-        df_agg = df.groupby('origem', as_index=False).agg({
-            'contatos': 'sum',
-            'aproveitados': 'sum',
-            'vendas': 'sum'
-        })
+        # Gráficos e PDF: carregar as bibliotecas depois que a janela estiver visível
+        self.root.after(WARMUP_DELAY_MS, lambda: threading.Thread(
+            target=warm_up_imports, name="warmup", daemon=True).start())
         
-        # Filtrar origens com dados válidos
-        df_agg = df_agg[
-            (df_agg['contatos'] > 0) & 
-            (df_agg['vendas'] > 0) & 
-            (df_agg['aproveitados'] > 0)
-        ]
+        self.period_mapping = {}  # Mapeamento período formatado -> original
+        self.origin_vars = {}  # {origem: BooleanVar}
+        self.all_origins = []  # Lista completa de origens disponíveis
+        self.current_origins = []  # Lista de origens atuais
+
+    def init_dashboard(self):
+        # Widgets para a primeira aba
+        self.summary_frame = ctk.CTkScrollableFrame(self.tab1)
+        self.summary_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        if df_agg.empty:
-            ctk.CTkLabel(frame, text="Sem dados válidos para análise").pack()
-            return
+        # Widgets para a segunda aba
+        self.data_frame = ctk.CTkFrame(self.tab2)
+        self.data_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        # Limitar a 15 canais para melhor visualização
-        top_origins = df_agg.nlargest(15, 'contatos')['origem']
-        df_filtered = df_agg[df_agg['origem'].isin(top_origins)]
+        # Placeholders
+        self.summary_label = ctk.CTkLabel(self.summary_frame, text="Carregue uma planilha para começar a análise")
+        self.summary_label.pack(pady=50)
         
-        # Criar gráficos
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+        self.data_label = ctk.CTkLabel(self.data_frame, text="Os dados detalhados serão exibidos aqui")
+        self.data_label.pack(pady=50)
         
-        # Gráfico 1: Leads vs Vendas
-        sns.scatterplot(
-            data=df_filtered,
-            x='contatos',
-            y='vendas',
-            hue='origem',
-            size='vendas',
-            sizes=(50, 300),
-            ax=ax1
+        # Widgets da aba de diagnóstico
+        diagnostics_controls = ctk.CTkFrame(self.tab3)
+        diagnostics_controls.pack(fill="x", padx=10, pady=(10, 0))
+        ctk.CTkButton(diagnostics_controls, text="Atualizar", width=90,
+                      command=self.refresh_diagnostics).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(diagnostics_controls, text="Limpar", width=90,
+                      command=self.clear_diagnostics).pack(side="left", padx=(0, 5))
+        ctk.CTkButton(diagnostics_controls, text="Perfilar próxima atualização",
+                      command=self.profile_dashboard).pack(side="left", padx=(0, 5))
+        ctk.CTkLabel(diagnostics_controls, text=f"Log: {TIMING_LOG_FILE}").pack(side="left", padx=10)
+        
+        self.diagnostics_table_frame = ctk.CTkFrame(self.tab3)
+        self.diagnostics_table_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        self.diagnostics_text = ctk.CTkTextbox(self.tab3, height=220, font=("Courier", 11))
+        self.diagnostics_text.pack(fill="x", padx=10, pady=(0, 10))
+    
+    def load_file(self):
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Excel files", "*.xlsx *.xls")]
         )
-        ax1.set_title('Relação Leads vs Vendas por Canal')
-        ax1.set_xlabel("Total de Leads")
-        ax1.set_ylabel("Total de Vendas")
-        ax1.grid(True, linestyle='--', alpha=0.7)
-        
-        # Adicionar linha de tendência
+        if not file_path:
+            return
+
+        # Carregar todas as abas do Excel (ou do cache, se o arquivo não mudou)
+        self.load_data(lambda: self.read_workbook(file_path), ('arquivo', file_path),
+                       file=os.path.basename(file_path))
+
+    def load_folder(self):
+        """Carrega todas as planilhas de uma pasta, juntando as abas por cidade"""
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+
+        self.load_data(lambda: self.read_folder(folder), ('pasta', folder), folder=os.path.basename(folder))
+
+    def load_data(self, read, source, **fields):
+        """Carrega as abas devolvidas por read() e atualiza filtros e dashboard"""
         try:
-            sns.regplot(data=df_filtered, x='contatos', y='vendas', 
-                        scatter=False, ax=ax1, color='gray', line_kws={'alpha': 0.5})
-        except:
-            pass
-        
-        # Gráfico 2: Leads Aproveitados vs Vendas
-        sns.scatterplot(
-            data=df_filtered,
-            x='aproveitados',
-            y='vendas',
-            hue='origem',
-            size='vendas',
-            sizes=(50, 300),
-            ax=ax2
+            with TIMINGS.span('load', **fields):
+                # Impressões digitais antes da leitura: uma edição feita durante a
+                # carga aparece no próximo recarregamento
+                fingerprints = source_fingerprints(source)
+                self.data = read()
+                self.memory_report = prepare_workbook(self.data)
+            self.data_source = source
+            self.sheet_fingerprints = fingerprints
+            self.watch_signature = source_signature(source)
+
+            # Coletar e processar todos os períodos únicos
+            self.sheet_periods = {sheet_name: self.collect_periods(df) for sheet_name, df in self.data.items()}
+            self.update_period_selectors()
+            
+            # Processar dados
+            self.process_data()
+            self.update_city_selector()
+            if self.store_var.get():
+                self.save_store()
+            self.update_origin_checklist()
+            self.update_dashboard()
+            
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            messagebox.showerror("Erro", f"Falha ao carregar arquivo:\n{str(e)}\n\nDetalhes:\n{error_details}")
+
+    def open_store(self):
+        """Abre um banco SQLite gravado antes: as consultas vão ao banco, sem reler planilhas"""
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Banco SQLite", " ".join(f"*{ext}" for ext in SQLITE_EXTENSIONS))]
         )
-        ax2.set_title('Relação Leads Aproveitados vs Vendas por Canal')
-        ax2.set_xlabel("Leads Aproveitados")
-        ax2.set_ylabel("Total de Vendas")
-        ax2.grid(True, linestyle='--', alpha=0.7)
-        
-        # Adicionar linha de tendência
+        if not file_path:
+            return
+
         try:
-            sns.regplot(data=df_filtered, x='aproveitados', y='vendas', 
-                        scatter=False, ax=ax2, color='gray', line_kws={'alpha': 0.5})
-        except:
-            pass
-        
-        # Ajustar layout da legenda
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-        
-        plt.tight_layout()
-        
-        chart_frame = ctk.CTkFrame(frame)
-        chart_frame.pack(fill="both", expand=True, pady=10)
-        
-        canvas = FigureCanvasTkAgg(fig, master=chart_frame)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill="both", expand=True)
+            with TIMINGS.span('load', store=os.path.basename(file_path)):
+                store = LeadStore(file_path)
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao abrir banco:\n{str(e)}")
+            return
+
+        # O banco não acompanha a planilha: sem recarga nem monitor de alterações
+        self.data = None
+        self.memory_report = None
+        self.data_source = None
+        self.sheet_fingerprints = {}
+        self.watch_signature = None
+        self.consolidated = self.consolidated_data = self.cube = None
+        self.set_dataset(store)
+
+        self.sheet_periods = store.sheet_periods()
+        self.update_period_selectors()
+        self.update_city_selector()
+        self.update_origin_checklist()
+        self.update_dashboard()
+
+    def save_store(self):
+        """Grava os dados carregados no banco SQLite ao lado da planilha (ou dentro da pasta)"""
+        file_path = store_path_for(self.data_source)
+        try:
+            write_store(file_path, self.dataset, self.sheet_periods)
+            print(f"Banco SQLite gravado em {file_path}")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao gravar banco SQLite:\n{str(e)}")
+
+    def collect_periods(self, df):
+        """Períodos distintos de uma aba: {datetime: valor original}"""
+        periods = {}
+
+        # Identificar coluna de período
+        periodo_col = None
+        for col in df.columns:
+            if 'periodo' in col.lower() or 'período' in col.lower():
+                periodo_col = col
+                break
+
+        if periodo_col:
+            # Processar cada valor de período
+            for p in df[periodo_col].dropna().unique():
+                # Converter para objeto datetime
+                periods[self.parse_period(p)] = p
+        return periods
+
+    def update_period_selectors(self, keep_selection=False):
+        """Monta a lista de períodos a partir dos períodos de cada aba. Com keep_selection,
+        mantém o intervalo escolhido se os períodos dele ainda existirem."""
+        unique_period_strings = {}
+        for periods in self.sheet_periods.values():
+            unique_period_strings.update(periods)
+
+        # Ordenar os períodos e converter para formato de exibição
+        sorted_periods = sorted(unique_period_strings)
+        self.all_periods = [str(unique_period_strings[dt]) for dt in sorted_periods]
+        self.display_periods = [self.format_period_display(dt) for dt in sorted_periods]  # Lista formatada
+
+        self.period_mapping = {}
+        for i, dt in enumerate(sorted_periods):
+            display_val = self.display_periods[i]
+            original_val = self.all_periods[i]
+            self.period_mapping[display_val] = original_val
+
+        # Atualize os comboboxes com os valores formatados
+        self.period_selector_start.configure(values=self.display_periods)
+        self.period_selector_end.configure(values=self.display_periods)
+        if not self.display_periods:
+            return
+        if not keep_selection or self.period_var_start.get() not in self.period_mapping:
+            self.period_var_start.set(self.display_periods[0])
+        if not keep_selection or self.period_var_end.get() not in self.period_mapping:
+            self.period_var_end.set(self.display_periods[-1])
+
+    def update_city_selector(self):
+        """Atualiza o seletor de cidades; a cidade escolhida continua se ainda existir"""
+        cities = ["Total"] + self.dataset.cities
+        self.city_selector.configure(values=cities)
+        if self.city_var.get() not in cities:
+            self.city_var.set("Total")
+
+    def reload_data(self, show_messages=True):
+        """Relê só as abas alteradas desde a última carga, mantendo os filtros escolhidos.
+        Devolve True se algo mudou."""
+        if self.data is None or self.data_source is None:
+            if show_messages:
+                messagebox.showwarning("Recarregar", "Carregue uma planilha ou pasta primeiro")
+            return False
+
+        try:
+            with TIMINGS.span('reload', source=os.path.basename(self.data_source[1])) as span:
+                self.watch_signature = source_signature(self.data_source)
+                fingerprints, fresh, removed = reload_sheets(
+                    self.data_source, self.sheet_fingerprints, self.sheet_cache,
+                    self.ingest_workers, self.streaming_min_file_mb
+                )
+                span['changed'] = len(fresh)
+                span['removed'] = len(removed)
+                if fresh or removed:
+                    self.apply_reload(fingerprints, fresh, removed)
+                self.sheet_fingerprints = fingerprints
+        except Exception as e:
+            if show_messages:
+                messagebox.showerror("Erro", f"Falha ao recarregar:\n{str(e)}")
+            else:
+                print(f"Erro ao recarregar: {self.data_source[1]}, erro: {str(e)}")
+            return False
+
+        self.refresh_diagnostics()
+        if not (fresh or removed):
+            if show_messages:
+                messagebox.showinfo("Recarregar", "Nenhuma aba foi alterada desde a última carga")
+            return False
+        print(f"Recarregadas {len(fresh)} abas ({', '.join(fresh) or '-'}); removidas: {', '.join(removed) or '-'}")
+        return True
+
+    def apply_reload(self, fingerprints, fresh, removed):
+        """Troca as abas relidas e atualiza só o que depende delas: períodos, origens,
+        índices e cubo das cidades alteradas, e os caches de "Total" e dessas cidades"""
+        self.cancel_dashboard_job()
+        changed = set(fresh)
+
+        # Ordem das abas conforme a origem atual
+        data = {}
+        for sheet_name in fingerprints:
+            if sheet_name in fresh:
+                data[sheet_name] = prepare_sheet(fresh[sheet_name])
+            elif sheet_name in self.data:
+                data[sheet_name] = self.data[sheet_name]
+        report = compact_sheets(data, changed)
+        previous = self.memory_report or {}
+        self.memory_report = {name: report.get(name, previous.get(name))
+                              for name in data if name in report or name in previous}
+
+        self.data = data
+        self.dataset = LeadDataset(data, previous=self.dataset, changed=changed)
+        self.consolidated = self.dataset.consolidated
+        self.consolidated_data = self.consolidated.df
+        self.cube = self.dataset.cube
+
+        invalid = changed | set(removed)
+        self.aggregate_cache.invalidate(invalid)
+        self.view_cache.invalidate(invalid)
+        if self.city_var.get() in invalid | {"Total"}:
+            self.detail_key = None
+
+        for sheet_name in removed:
+            self.sheet_periods.pop(sheet_name, None)
+        for sheet_name in fresh:
+            self.sheet_periods[sheet_name] = self.collect_periods(data[sheet_name])
+        self.update_period_selectors(keep_selection=True)
+        self.update_city_selector()
+        if self.store_var.get():
+            self.save_store()
+        self.update_origin_checklist()
+        self.update_dashboard()
+
+    def toggle_watch(self):
+        """Liga ou desliga o monitor de alterações da origem dos dados"""
+        if self.watch_job is not None:
+            self.root.after_cancel(self.watch_job)
+            self.watch_job = None
+        if self.watch_var.get():
+            self.watch_job = self.root.after(WATCH_INTERVAL_MS, self.check_source_changes)
+
+    def check_source_changes(self, pending=None):
+        """Compara a assinatura da origem com a da última leitura. Recarrega quando a
+        mudança se mantém por uma verificação inteira (o Excel terminou de salvar)."""
+        self.watch_job = None
+        if not self.watch_var.get():
+            return
+
+        if self.data_source is not None:
+            try:
+                signature = source_signature(self.data_source)
+            except OSError:
+                signature = None  # Arquivo sendo substituído: tentar de novo
+
+            if signature is not None and signature != self.watch_signature:
+                if signature == pending:
+                    self.reload_data(show_messages=False)
+                    pending = None
+                else:
+                    pending = signature
+            else:
+                pending = None
+
+        self.watch_job = self.root.after(WATCH_INTERVAL_MS, self.check_source_changes, pending)
+    
+    def read_workbook(self, file_path):
+        """Lê e limpa todas as abas de cidade, reaproveitando o cache quando possível"""
+        return read_workbook(file_path, self.sheet_cache, self.ingest_workers, self.streaming_min_file_mb)
+
+    def read_folder(self, folder):
+        """Lê e junta as planilhas de uma pasta (o arquivo mais recente prevalece)"""
+        return read_folder(folder, self.sheet_cache, self.ingest_workers, self.streaming_min_file_mb)
+
+    def clean_sheet(self, df, sheet_name):
+        """Aplica o pipeline de limpeza a uma aba recém-lida"""
+        return clean_sheet(df, sheet_name)
+
+    def clean_column_name(self, name):
+        """Padroniza nomes de colunas"""
+        return clean_column_name(name)
+    
+    def apply_filters(self):
+        """Aplica os filtros sem recriar a lista de origens"""
+        self.update_dashboard()
+
+    def on_filter_change(self, event=None):
+        """Atualiza a lista de origens quando os filtros mudam"""
+        self.update_origin_checklist()
+        self.update_dashboard()
+
+    def convert_numeric_columns(self, df):
+        """Converte colunas numéricas conhecidas para tipo float"""
+        return convert_numeric_columns(df)
+    
+    def convert_percentage(self, series):
+        """Converte porcentagens para valores numéricos"""
+        return convert_percentage(series)
+    
+    def parse_period(self, period_str):
+        """Converte período em formato datetime para ordenação"""
+        return parse_period_cached(period_str)
+    
+    def format_period_display(self, dt):
+        """Formata período para exibição no formato 'jan/25'"""
+        return format_period_display(dt)
+    
+    def process_data(self):
+        """Processa dados brutos e prepara para análise"""
+        # Criar base consolidada (usada pela cidade "Total") e o cubo de agregação
+        self.set_dataset(LeadDataset(self.data))
+        self.consolidated = self.dataset.consolidated
+        self.consolidated_data = self.consolidated.df
+        self.cube = self.dataset.cube
+
+    def set_dataset(self, dataset):
+        """Troca a fonte das consultas, descartando os caches e o cálculo em andamento"""
+        self.cancel_dashboard_job()
+        if isinstance(self.dataset, LeadStore) and self.dataset is not dataset:
+            self.dataset.close()
+        self.dataset = dataset
+        self.aggregate_cache.clear()
+        self.view_cache.clear()
+        self.detail_key = None
+    
+    def select_all_origins(self):
+        """Marca todas as origens"""
+        for origin in self.all_origins:
+            self.origin_vars[origin].set(True)
+
+    def clear_all_origins(self):
+        """Desmarca todas as origens"""
+        for origin in self.all_origins:
+            self.origin_vars[origin].set(False)
     
-    def show_detailed_data(self, df):
-        """Mostra dados detalhados na segunda aba"""
-        frame = self.data_frame
-        
-        # Criar Treeview para exibir dados tabulares
-        tree_frame = ctk.CTkFrame(frame)
-        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
-        
-        # Criar barra de rolagem
-        tree_scroll = ctk.CTkScrollbar(tree_frame)
-        tree_scroll.pack(side="right", fill="y")
+    def filter_origin_list(self, event=None):
+        """Filtra a lista de origens visíveis (só a última tecla dentro do intervalo conta)"""
+        if self.origin_search_job is not None:
+            self.root.after_cancel(self.origin_search_job)
+        self.origin_search_job = self.root.after(ORIGIN_SEARCH_DEBOUNCE_MS, self.refresh_origin_list)
+
+    def update_origin_checklist(self):
+        """Atualiza a lista de origens mantendo o estado das seleções"""
+        origins = self.dataset.origin_names(self.get_filter_state()) if self.dataset is not None else None
         
-        # Criar Treeview
-        tree = ttk.Treeview(tree_frame, yscrollcommand=tree_scroll.set)
+        if origins is None:
+            self.all_origins = []
+            self.refresh_origin_list()
+            return
+            
+        # Obter novas origens únicas (com o banco SQLite, um SELECT DISTINCT)
+        new_origins = sorted(origins)
+        new_origins = [o for o in new_origins if o.lower() not in ['total', 'geral', 'consolidado']]
         
-        # Configurar colunas
-        tree["columns"] = list(df.columns)
-        tree.column("#0", width=0, stretch=False)  # Coluna fantasma
+        # Verificar se houve mudança na lista de origens
+        if set(new_origins) == set(self.all_origins):
+            return
+            
+        self.all_origins = new_origins
         
-        for col in df.columns:
-            tree.column(col, anchor="w", width=100)
-            tree.heading(col, text=col, anchor="w")
+        # Criar novas variáveis para novas origens
+        for origin in self.all_origins:
+            if origin not in self.origin_vars:
+                self.origin_vars[origin] = ctk.BooleanVar(value=True)
         
-        # Adicionar dados
-        for i, row in df.iterrows():
-            tree.insert("", "end", values=list(row))
+        # Remover variáveis de origens que não existem mais
+        for origin in list(self.origin_vars.keys()):
+            if origin not in self.all_origins:
+                del self.origin_vars[origin]
         
-        tree.pack(fill="both", expand=True)
-        tree_scroll.configure(command=tree.yview)
+        self.origin_search_index = OriginSearchIndex(self.all_origins)
+        self.refresh_origin_list()
     
-    def export_report(self):
-        """Exporta relatório em PDF"""
-        if self.data is None:
+    def get_selected_origins(self):
+        """Retorna as origens selecionadas"""
+        return [origin for origin in self.all_origins if self.origin_vars[origin].get()]
+
+    def refresh_origin_list(self):
+        """Aplica a pesquisa atual e volta ao topo da lista"""
+        self.origin_search_job = None
+        self.origin_matches = self.origin_search_index.search(self.search_origin.get())
+        self.origin_offset = 0
+        self.render_origin_rows()
+
+    def render_origin_rows(self):
+        """Associa as linhas de checkbox às origens da janela visível"""
+        window = self.origin_matches[self.origin_offset:self.origin_offset + ORIGIN_POOL_ROWS]
+
+        for i, cb in enumerate(self.origin_checkboxes):
+            if i < len(window):
+                cb.configure(text=window[i], variable=self.origin_vars[window[i]])
+                if not cb.winfo_ismapped():
+                    cb.pack(anchor="w", padx=5, pady=2)
+            else:
+                cb.pack_forget()
+
+        total = len(self.origin_matches)
+        if total > ORIGIN_POOL_ROWS:
+            self.origin_scrollbar.set(self.origin_offset / total,
+                                      (self.origin_offset + len(window)) / total)
+        else:
+            self.origin_scrollbar.set(0.0, 1.0)
+
+    def scroll_origin_list(self, action, value, unit=None):
+        """Comando da barra de rolagem da lista de origens"""
+        if action == "moveto":
+            offset = int(float(value) * len(self.origin_matches))
+        else:
+            step = ORIGIN_POOL_ROWS if unit == "pages" else 1
+            offset = self.origin_offset + int(value) * step
+        self.scroll_origins_to(offset)
+
+    def on_origin_wheel(self, event):
+        """Rolagem da lista de origens pela roda do mouse"""
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_origins_to(self.origin_offset - 1)
+        else:
+            self.scroll_origins_to(self.origin_offset + 1)
+
+    def scroll_origins_to(self, offset):
+        offset = max(0, min(offset, len(self.origin_matches) - ORIGIN_POOL_ROWS))
+        if offset != self.origin_offset:
+            self.origin_offset = offset
+            self.render_origin_rows()
+
+    def get_filter_state(self):
+        """Lê a seleção atual dos controles como um FilterState"""
+        period_start = self.period_mapping.get(self.period_var_start.get(), "")
+        period_end = self.period_mapping.get(self.period_var_end.get(), "")
+
+        start_dt = end_dt = None
+        if period_start and period_end:
+            start_dt = np.datetime64(pd.Timestamp(self.parse_period(period_start)), 'ns')
+            end_dt = np.datetime64(pd.Timestamp(self.parse_period(period_end)), 'ns')
+
+        return FilterState(self.city_var.get(), start_dt, end_dt, tuple(self.get_selected_origins()))
+
+    def get_current_rows(self, state=None):
+        """Retorna (DataFrame da cidade, posições das linhas que passam nos filtros).
+        Nenhuma cópia é feita: os filtros usam os índices de linha montados em process_data.
+        Sem state, usa a seleção atual dos controles."""
+        if self.dataset is None:
+            return None, None
+
+        if state is None:
+            state = self.get_filter_state()
+
+        return self.dataset.rows(state)
+
+    def get_current_aggregates(self, state=None):
+        """Agregados da seleção atual, derivados do cubo (uma vez por seleção de filtros)"""
+        if self.dataset is None:
+            return None
+
+        if state is None:
+            state = self.get_filter_state()
+        key = filter_state_key(state)
+        agg = self.aggregate_cache.get(key)
+        if agg is not None:
+            return agg
+
+        agg = self.dataset.aggregate(state)
+        self.aggregate_cache.put(key, agg, state.city)
+        return agg
+
+    def get_current_data(self, state=None):
+        """Obtém dados filtrados para seleção atual"""
+        df, rows = self.get_current_rows(state)
+        if df is None:
+            return None
+
+        # Sem filtro efetivo: devolve o próprio DataFrame, sem copiar
+        if len(rows) == len(df):
+            return df
+        return df.take(rows)
+    
+    def get_detail_data(self, state):
+        """Dados da aba de detalhes: {'df': linhas} em memória; no banco SQLite, só
+        {'detail_rows': quantidade}, e as páginas são lidas na rolagem"""
+        if isinstance(self.dataset, LeadStore):
+            return {'detail_rows': self.dataset.count(state)}
+        return {'df': self.get_current_data(state)}
+
+    def export_origin_performance_excel(self, agg):
+        """Exporta a tabela de desempenho por origem para Excel (valores numéricos)"""
+        table = origin_performance_frame(agg)
+        if table is None or table.empty:
+            messagebox.showwarning("Exportar", "Nenhum dado disponível para exportação")
+            return
+
+        # Mesmas colunas e títulos da tabela da tela, com formatos do Excel
+        df_export = pd.DataFrame({title: table[col] for title, col, _ in ORIGIN_PERFORMANCE_COLUMNS})
+        formats = {title: EXCEL_NUMBER_FORMATS[spec] for title, _, spec in ORIGIN_PERFORMANCE_COLUMNS if spec}
+
+        # Solicitar local para salvar
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")]
+        )
+        if not file_path:
+            return
+
+        try:
+            write_excel(file_path, [("Desempenho por Origem", df_export, formats, None)])
+            messagebox.showinfo("Exportar", f"Tabela exportada com sucesso!\n{file_path}")
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao exportar tabela:\n{str(e)}")
+
+    def export_filtered_data(self):
+        """Exporta para Excel as linhas brutas da seleção atual (opcionalmente uma aba por cidade)"""
+        if self.dataset is None:
             messagebox.showwarning("Exportar", "Carregue os dados primeiro")
             return
-            
+
+        # Posições das linhas, sem copiar o DataFrame: a gravação lê em blocos
+        df, rows = self.get_current_rows()
+        if df is None or len(rows) == 0:
+            messagebox.showwarning("Exportar", "Nenhum dado disponível para exportação")
+            return
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx")]
+        )
+        if not file_path:
+            return
+
         try:
-            # Obter dados atuais
-            df = self.get_current_data()
-            if df is None or df.empty:
-                messagebox.showwarning("Exportar", "Nenhum dado disponível para exportação")
-                return
-            
-            # Solicitar local para salvar
-            file_path = filedialog.asksaveasfilename(
-                defaultextension=".pdf",
-                filetypes=[("PDF files", "*.pdf")]
-            )
-            if not file_path:
-                return
-            
-            # Gerar relatório
-            self.generate_pdf_report(df, file_path)
-            messagebox.showinfo("Exportar", f"Relatório exportado com sucesso!\n{file_path}")
-            
+            with TIMINGS.span('export', file=os.path.basename(file_path)) as span:
+                sheets = data_export_sheets(df, rows, by_city=self.export_by_city_var.get())
+                span['rows'] = write_excel(file_path, sheets)
+            self.refresh_diagnostics()
+            messagebox.showinfo("Exportar", f"{len(rows):,} linhas exportadas com sucesso!\n{file_path}")
         except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao exportar relatório:\n{str(e)}")
+            messagebox.showerror("Erro", f"Falha ao exportar dados:\n{str(e)}")
 
-    def create_summary_figures(self, df):
-        """Cria figuras para a visão geral"""
-        if df.empty:
-            return None
-            
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+    def update_dashboard(self, event=None):
+        if self.dataset is None:
+            return
+
+        # Atualizar lista de origens
+        # self.update_origin_checklist()
+
+        current_view = self.view_var.get()
+        state = self.get_filter_state()
+        filter_key = filter_state_key(state)
+        view_key = (current_view, filter_key, self.root.winfo_width(), self.root.winfo_height())
+
+        # Um cálculo em andamento para outra seleção deixa de ser útil
+        self.cancel_dashboard_job()
+
+        # Esconder a visualização atual e limpar o que não está em cache
+        cached_frames = self.view_cache.frames()
+        for widget in self.summary_frame.winfo_children():
+            if widget in cached_frames:
+                widget.pack_forget()
+            else:
+                widget.destroy()
+
+        # Visualização recente com os mesmos filtros: apenas reexibir
+        cached_frame = self.view_cache.get(view_key)
+        if cached_frame is not None:
+            cached_frame.pack(fill="both", expand=True)
+            return
+
+        # Calcular em segundo plano; o resultado volta por _poll_dashboard_job
+        job = DashboardJob(current_view, state, view_key, filter_key,
+                           max(self.summary_frame.winfo_width() - 40, 400),
+                           profile=self.profile_next_refresh)
+        self.profile_next_refresh = False
+        self.dashboard_job = job
+        self.show_progress()
+        threading.Thread(target=self._run_dashboard_job, args=(job,), daemon=True).start()
+        self.root.after(DASHBOARD_POLL_MS, self._poll_dashboard_job, job)
+
+    def cancel_dashboard_job(self):
+        """Cancela o cálculo do dashboard em andamento, se houver"""
+        if self.dashboard_job is not None:
+            self.dashboard_job.cancel()
+            self.dashboard_job = None
+            self.hide_progress()
+
+    def _run_dashboard_job(self, job):
+        """Filtra, agrega e renderiza a visualização fora da thread da interface"""
+        profiler = cProfile.Profile() if job.profile else None
+        try:
+            with TIMINGS.span('dashboard', view=job.view, city=job.state.city, profile=job.profile):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    result = self._compute_dashboard_view(job)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+
+            if profiler is not None:
+                result['profile'] = save_profile(profiler, job.view)
+            job.finish(result)
+        except JobCancelled:
+            pass
+        except Exception:
+            import traceback
+            job.fail(traceback.format_exc())
+
+    def _compute_dashboard_view(self, job):
+        """Etapas do cálculo de uma visualização; interrompidas se o job for cancelado.
+        Só os agregados são calculados sempre; as linhas brutas, apenas quando usadas."""
+        agg = self.get_current_aggregates(job.state)
+        job.check()
+        if agg is None or agg.empty:
+            return {'empty': True}
+
+        builders = {
+            "Visão Geral": lambda: self.build_summary_view(agg),
+            "Desempenho por Origem": lambda: self.build_origin_performance_view(agg),
+            "Conversão por Canal": lambda: self.build_conversion_by_channel_view(agg),
+            "Evolução Mensal": lambda: self.build_monthly_trend_view(agg),
+            "Top Canais": lambda: self.build_top_channels_view(agg),
+            "Eficiência de Vendas": lambda: self.build_sales_efficiency_view(agg),
+            "Correlação Leads-Vendas": lambda: self.build_correlation_view(self.dataset.correlations(job.state)),
+            "Dispersão Leads x Vendas": lambda: self.build_scatter_plots_view(agg),
+        }
+        with TIMINGS.span('view.build', view=job.view):
+            result = builders[job.view]() if job.view in builders else {}
+        job.check()
+
+        # Rasterizar as figuras aqui mesmo (Agg), entregando só a imagem à interface
+        with TIMINGS.span('view.draw', view=job.view) as span:
+            figures = result.pop('figures', [])
+            result['images'] = [render_figure_png(fig, job.width) for fig in figures]
+            span['figures'] = len(figures)
+        job.check()
+
+        # Dados detalhados: no banco SQLite, só a contagem; as páginas são lidas na rolagem
+        if job.filter_key != self.detail_key:
+            result.update(self.get_detail_data(job.state))
+            job.check()
+
+        result.update(agg=agg)
+        return result
+
+    def _poll_dashboard_job(self, job):
+        """Verifica (na thread da interface) se o cálculo terminou"""
+        if job is not self.dashboard_job or job.cancelled:
+            return
+        if not job.done:
+            self.root.after(DASHBOARD_POLL_MS, self._poll_dashboard_job, job)
+            return
+
+        self.dashboard_job = None
+        self.hide_progress()
+
+        if job.error:
+            messagebox.showerror("Erro", f"Falha ao atualizar o dashboard:\n{job.error}")
+            return
+
+        result = job.result
+        if result.get('profile'):
+            self.show_profile(*result['profile'])
+
+        if result.get('empty'):
+            for widget in self.data_frame.winfo_children():
+                widget.destroy()
+            self.detail_key = None
+            ctk.CTkLabel(self.summary_frame, text="Nenhum dado disponível para a seleção atual").pack(pady=50)
+            self.refresh_diagnostics()
+            return
+
+        with TIMINGS.span('view.present', view=job.view):
+            self.view_frame = ctk.CTkFrame(self.summary_frame, fg_color="transparent")
+            self.view_frame.pack(fill="both", expand=True)
+            self.present_view(result)
+            self.view_cache.put(job.view_key, self.view_frame, job.state.city)
+
+        # Mostrar dados detalhados na segunda aba (só muda quando os filtros mudam)
+        if job.filter_key != self.detail_key:
+            if 'detail_rows' not in result and 'df' not in result:
+                # Dados detalhados descartados durante o cálculo: ler aqui mesmo
+                result.update(self.get_detail_data(job.state))
+            rows = result['detail_rows'] if 'detail_rows' in result else len(result['df'])
+            with TIMINGS.span('detail.present', rows=rows):
+                for widget in self.data_frame.winfo_children():
+                    widget.destroy()
+                if 'detail_rows' in result:
+                    self.show_paged_data(job.state, rows)
+                else:
+                    self.show_detailed_data(result['df'])
+            self.detail_key = job.filter_key
+
+        self.refresh_diagnostics()
+
+    def present_view(self, result):
+        """Monta os widgets de uma visualização já calculada"""
+        frame = self.view_frame
+
+        if result.get('message'):
+            ctk.CTkLabel(frame, text=result['message']).pack()
+            return
+
+        # Cards com métricas principais
+        if result.get('metrics'):
+            metrics_frame = ctk.CTkFrame(frame)
+            metrics_frame.pack(fill="x", pady=10, padx=10)
+
+            for i, (title, value) in enumerate(result['metrics']):
+                card = ctk.CTkFrame(metrics_frame, width=180, height=100)
+                card.grid(row=0, column=i, padx=10, pady=10)
+
+                ctk.CTkLabel(card, text=title, font=("Helvetica", 12, "bold")).pack(pady=(10, 5))
+                ctk.CTkLabel(card, text=value, font=("Arial", 14)).pack(pady=(0, 10))
+
+        if result.get('table') is not None:
+            self.show_origin_performance_table(frame, result['table'], result['agg'])
+
+        # Gráficos já renderizados
+        for png in result.get('images', []):
+            chart_frame = ctk.CTkFrame(frame)
+            chart_frame.pack(fill="both", expand=True, pady=10)
+
+            image = PILImage.open(BytesIO(png))
+            ctk_image = ctk.CTkImage(light_image=image, dark_image=image, size=image.size)
+            ctk.CTkLabel(chart_frame, text="", image=ctk_image).pack(fill="both", expand=True)
+
+    def show_progress(self):
+        """Exibe o indicador de processamento"""
+        self.progress_bar.pack(pady=(0, 10), padx=10, fill="x")
+        self.progress_bar.start()
+
+    def hide_progress(self):
+        """Esconde o indicador de processamento"""
+        self.progress_bar.stop()
+        self.progress_bar.pack_forget()
+
+    def toggle_diagnostics(self):
+        """Mostra ou esconde a aba de diagnóstico"""
+        if self.diagnostics_var.get():
+            self.notebook.add(self.tab3, text="Diagnóstico")
+            self.refresh_diagnostics()
+        else:
+            self.notebook.hide(self.tab3)
+
+    def refresh_diagnostics(self):
+        """Atualiza a tabela de tempos e o resumo por etapa (só com a aba visível)"""
+        if not self.diagnostics_var.get():
+            return
+
+        records = TIMINGS.snapshot()[::-1]  # Mais recentes primeiro
+        for widget in self.diagnostics_table_frame.winfo_children():
+            widget.destroy()
+
+        base = ('ts', 'stage', 'ms', 'thread')
+        details = [", ".join(f"{k}={v}" for k, v in r.items() if k not in base) for r in records]
+        self.diagnostics_table = VirtualTable(
+            self.diagnostics_table_frame,
+            ["Horário", "Etapa", "Duração (ms)", "Detalhes"],
+            [[r['ts'][11:] for r in records], [r['stage'] for r in records],
+             np.array([r['ms'] for r in records], dtype=float), details],
+            formatters=[format_cells, format_cells, number_formatter(",.1f"), format_cells],
+            widths=[110, 140, 110, 500]
+        )
+
+        # Resumo por etapa: quantidade, média e máximo
+        summary = ["Etapa                 Qtd.     Média (ms)    Máx. (ms)"]
+        if records:
+            frame = pd.DataFrame({'stage': [r['stage'] for r in records], 'ms': [r['ms'] for r in records]})
+            stats = frame.groupby('stage')['ms'].agg(['count', 'mean', 'max']).sort_values('mean', ascending=False)
+            for stage, row in stats.iterrows():
+                summary.append(f"{stage:<20} {row['count']:>5.0f} {row['mean']:>14,.1f} {row['max']:>12,.1f}")
+        if self.memory_report:
+            summary += ["", format_memory_report(self.memory_report)]
+        if self.last_profile:
+            summary += ["", self.last_profile]
+        self.show_diagnostics_text("\n".join(summary))
+
+    def show_diagnostics_text(self, text):
+        self.diagnostics_text.configure(state="normal")
+        self.diagnostics_text.delete("1.0", "end")
+        self.diagnostics_text.insert("1.0", text)
+        self.diagnostics_text.configure(state="disabled")
+
+    def clear_diagnostics(self):
+        """Descarta os tempos em memória (o arquivo de log é mantido)"""
+        TIMINGS.clear()
+        self.last_profile = None
+        self.refresh_diagnostics()
+
+    def profile_dashboard(self):
+        """Refaz a visualização atual do zero sob o cProfile"""
+        if self.dataset is None:
+            messagebox.showwarning("Diagnóstico", "Carregue os dados primeiro")
+            return
+        self.profile_next_refresh = True
+        self.aggregate_cache.clear()
+        self.view_cache.clear()
+        self.update_dashboard()
+
+    def show_profile(self, path, summary):
+        """Exibe o resumo de um perfil na aba de diagnóstico"""
+        header = f"Perfil gravado em: {path}\n\n" if path else ""
+        self.last_profile = header + summary
+        if not self.diagnostics_var.get():
+            self.diagnostics_var.set(True)
+            self.toggle_diagnostics()
+
+    def build_summary_view(self, agg):
+        """Exibe métricas de resumo principais"""
+        from matplotlib.ticker import FuncFormatter
+
+        # Verificar se as colunas necessárias existem
+        required_columns = ['contatos', 'aproveitados', 'vendas']
+        missing_columns = [col for col in required_columns if col not in agg.columns]
+        
+        if missing_columns:
+            return {'message': f"Colunas obrigatórias ausentes: {', '.join(missing_columns)}"}
         
-        # Gráfico 1: Distribuição de origens
-        if 'origem' in df.columns and 'contatos' in df.columns:
-            origin_counts = df.groupby('origem')['contatos'].sum()
+        # Calcular métricas
+        total_contacts = agg.totals['contatos']
+        total_leads = agg.totals['aproveitados']
+        total_sales = agg.totals['vendas']
+        
+        conversion_rate = total_sales / total_contacts if total_contacts > 0 else 0
+        lead_conversion_rate = total_sales / total_leads if total_leads > 0 else 0
+        lead_per_sale = total_contacts / total_sales if total_sales > 0 else 0
+        
+        # Métricas para mostrar
+        metrics = [
+            ("Total de Contatos", total_contacts, "{:,.0f}"),
+            ("Leads Aproveitados", total_leads, "{:,.0f}"),
+            ("Vendas Fechadas", total_sales, "{:,.0f}"),
+            ("Taxa de Conversão", conversion_rate, "{:.1%}"),
+            ("Conversão de Leads", lead_conversion_rate, "{:.1%}"),
+            ("Lead por Venda", lead_per_sale, "{:,.1f}")
+        ]
+        
+        metrics = [(title, fmt.format(value)) for title, value, fmt in metrics]
+        
+        # Gráficos
+        fig = new_figure((12, 5))
+        ax1, ax2 = fig.subplots(1, 2)
+        
+        # Gráfico 1: Distribuição de origens (Top 5 + Outros)
+        if 'origem' in agg.columns and 'contatos' in agg.columns:
+            origin_counts = agg.by_origin.set_index('origem')['contatos']
             
+            # Agrupar origens menores em "Outros"
             if len(origin_counts) > 5:
                 top_origins = origin_counts.nlargest(5)
                 other = origin_counts.sum() - top_origins.sum()
@@ -1254,299 +3914,352 @@ class LeadAnalyzerApp:
             else:
                 top_origins = origin_counts
             
+            # MODIFICAÇÃO 1: Remover o rótulo do eixo Y
             top_origins.plot.pie(autopct='%1.1f%%', ax=ax1, startangle=90, ylabel='')
             ax1.set_title("Distribuição por Origem (Top 5)")
+            # Remover completamente o label do eixo Y
+            ax1.set_ylabel('')
+        else:
+            ax1.set_title("Dados de origem não disponíveis")
         
-        # Gráfico 2: Top 5 Canais por Conversão
-        if 'origem' in df.columns and 'contatos' in df.columns and 'vendas' in df.columns:
-            channel_efficiency = df.groupby('origem').agg({
-                'contatos': 'sum',
-                'vendas': 'sum'
-            })
+        # Gráfico 2: Top 5 Canais por Conversão Total
+        if 'origem' in agg.columns and 'contatos' in agg.columns and 'vendas' in agg.columns:
+            # Calcular eficiência dos canais
+            channel_efficiency = agg.by_origin.set_index('origem')[['contatos', 'vendas']]
+            
+            # Calcular taxa de conversão
             channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
+            
+            # Filtrar canais com volume significativo
             channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
             
             if not channel_efficiency.empty:
+                # Pegar top 5
                 top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao')
                 top_conversion = top_conversion.sort_values('taxa_conversao', ascending=True)
                 
+                # Criar gráfico de barras
                 bars = ax2.barh(top_conversion.index, top_conversion['taxa_conversao'], color='skyblue')
                 ax2.set_title("Top 5 Canais - Conversão Total")
                 ax2.set_xlabel("Taxa de Conversão")
                 ax2.grid(axis='x', linestyle='--', alpha=0.7)
-                ax2.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
                 
+                # Formatar eixo X como porcentagem
+                ax2.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+                
+                # Adicionar valores nas barras
                 for bar in bars:
                     width = bar.get_width()
                     ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
                             f'{width:.1%}', ha='left', va='center')
+            else:
+                ax2.set_title("Sem canais com dados suficientes")
+        else:
+            ax2.set_title("Dados incompletos")
+        
+        fig.tight_layout()
         
-        plt.tight_layout()
-        return fig
+        return {'metrics': metrics, 'figures': [fig]}
+    
+    def build_origin_performance_view(self, agg):
+        """Mostra desempenho por origem de leads"""
+        # Mesmas métricas do PDF, ainda numéricas: a formatação fica para a tabela
+        table = origin_performance_frame(agg)
+        if table is None:
+            return {'message': "Dados de origem não disponíveis"}
+        return {'table': table}
 
-    def get_origin_performance_data(self, df):
-        """Prepara dados para tabela de desempenho por origem"""
-        if 'origem' not in df.columns or df.empty:
-            return None
-            
-        grouped = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'aproveitados': 'sum',
-            'vendas': 'sum'
-        }).reset_index()
+    def show_origin_performance_table(self, frame, table, agg):
+        """Monta a tabela de desempenho por origem (virtualizada e ordenável)"""
+        # Botão de exportação para Excel
+        export_btn = ctk.CTkButton(
+            frame, text="Exportar Excel",
+            command=lambda: self.export_origin_performance_excel(agg)
+        )
+        export_btn.pack(pady=(0, 10))
+
+        # Altura fixa: dentro da área rolável a tabela não se expandiria sozinha
+        table_frame = ctk.CTkFrame(frame, height=ORIGIN_TABLE_HEIGHT)
+        table_frame.pack(fill="x", pady=10, padx=10)
+        table_frame.pack_propagate(False)
+
+        # Os arrays continuam numéricos: clicar no cabeçalho ordena pelos valores,
+        # sem reagregar, e só as linhas visíveis são formatadas
+        self.origin_table = VirtualTable(
+            table_frame,
+            [title for title, _, _ in ORIGIN_PERFORMANCE_COLUMNS],
+            [table[col].to_numpy() for _, col, _ in ORIGIN_PERFORMANCE_COLUMNS],
+            formatters=[format_cells if spec is None else number_formatter(spec)
+                        for _, _, spec in ORIGIN_PERFORMANCE_COLUMNS],
+            widths=[220] + [100] * (len(ORIGIN_PERFORMANCE_COLUMNS) - 1)
+        )
+    
+    def build_conversion_by_channel_view(self, agg):
+        """Mostra análise de conversão por canal"""
+        from matplotlib.ticker import FuncFormatter
+
+        if 'origem' not in agg.columns:
+            return {'message': "Dados de origem não disponíveis"}
         
-        grouped['%_aproveitamento'] = grouped['aproveitados'] / grouped['contatos']
-        grouped['taxa_conversao'] = grouped['vendas'] / grouped['contatos']
-        grouped['conversao_ap'] = grouped['vendas'] / grouped['aproveitados']
-        grouped['lead_por_venda'] = grouped['contatos'] / grouped['vendas']
-        grouped.replace([np.inf, -np.inf], np.nan, inplace=True)
-        grouped = grouped.sort_values('vendas', ascending=False)
-        
-        # Preparar dados para tabela
-        table_data = [["Origem", "Contatos", "Aproveitados", "Vendas", "% Aproveit.", "Conv. Total", "Conv. Leads", "Lead/Venda"]]
-        
-        for _, row in grouped.iterrows():
-            lead_per_sale = "N/A" if pd.isna(row['lead_por_venda']) or np.isinf(row['lead_por_venda']) else f"{row['lead_por_venda']:,.1f}"
-            table_data.append([
-                row['origem'],
-                f"{row['contatos']:,.0f}",
-                f"{row['aproveitados']:,.0f}",
-                f"{row['vendas']:,.0f}",
-                f"{row['%_aproveitamento']:.1%}",
-                f"{row['taxa_conversao']:.1%}",
-                f"{row['conversao_ap']:.1%}" if not pd.isna(row['conversao_ap']) else "N/A",
-                lead_per_sale
-            ])
-        
-        return table_data
-
-    def create_conversion_by_channel_figure(self, df):
-        """Cria figura para conversão por canal"""
-        if 'origem' not in df.columns or df.empty:
-            return None
-            
-        grouped = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum',
-            'aproveitados': 'sum'
-        }).reset_index()
+        # Criar gráfico de comparação de conversões
+        fig = new_figure((12, 5))
+        ax1, ax2 = fig.subplots(1, 2)
+        
+        # Agrupar por origem
+        grouped = agg.by_origin.copy()
         
+        # Calcular taxas
         grouped['taxa_conversao'] = grouped['vendas'] / grouped['contatos']
         grouped['conversao_ap'] = grouped['vendas'] / grouped['aproveitados']
-        grouped = grouped[grouped['contatos'] >= 100]
         
-        if grouped.empty:
-            return None
-            
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+        # Filtrar origens com pelo menos 100 contatos
+        grouped = grouped[grouped['contatos'] >= 100]
         
         # Gráfico 1: Conversão total
-        grouped_sorted = grouped.sort_values('taxa_conversao', ascending=False)
-        bars1 = ax1.bar(grouped_sorted['origem'], grouped_sorted['taxa_conversao'], color='skyblue')
-        ax1.set_title("Conversão Total por Origem")
-        ax1.set_ylabel("Taxa de Conversão")
-        ax1.tick_params(axis='x', rotation=90, labelsize=8)
-        ax1.grid(axis='y', linestyle='--', alpha=0.7)
-        ax1.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
-        
-        for bar in bars1:
-            height = bar.get_height()
-            ax1.text(bar.get_x() + bar.get_width()/2., height + 0.01,
-                    f'{height:.1%}', ha='center', va='bottom', fontsize=6)
-        
-        # Gráfico 2: Conversão de leads
-        grouped_sorted = grouped.sort_values('conversao_ap', ascending=False)
-        bars2 = ax2.bar(grouped_sorted['origem'], grouped_sorted['conversao_ap'], color='lightgreen')
-        ax2.set_title("Conversão de Leads por Origem")
-        ax2.set_ylabel("Taxa de Conversão")
-        ax2.tick_params(axis='x', rotation=90, labelsize=8)
-        ax2.grid(axis='y', linestyle='--', alpha=0.7)
-        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
+        if not grouped.empty:
+            grouped_sorted = grouped.sort_values('taxa_conversao', ascending=False)
+            bars1 = ax1.bar(grouped_sorted['origem'], grouped_sorted['taxa_conversao'], color='skyblue')
+            ax1.set_title("Conversão Total por Origem")
+            ax1.set_ylabel("Taxa de Conversão")
+            ax1.tick_params(axis='x', rotation=90, labelsize=8)
+            ax1.grid(axis='y', linestyle='--', alpha=0.7)
+            
+            # Formatar eixo Y como porcentagem
+            ax1.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
+            
+            # Adicionar valores nas barras como porcentagem
+            for bar in bars1:
+                height = bar.get_height()
+                ax1.text(bar.get_x() + bar.get_width()/2., height + 0.01,
+                        f'{height:.1%}', ha='center', va='bottom', fontsize=6)
+            
+            # Gráfico 2: Conversão de leads
+            grouped_sorted = grouped.sort_values('conversao_ap', ascending=False)
+            bars2 = ax2.bar(grouped_sorted['origem'], grouped_sorted['conversao_ap'], color='lightgreen')
+            ax2.set_title("Conversão de Leads por Origem")
+            ax2.set_ylabel("Taxa de Conversão")
+            ax2.tick_params(axis='x', rotation=90, labelsize=8)
+            ax2.grid(axis='y', linestyle='--', alpha=0.7)
+            
+            # Formatar eixo Y como porcentagem
+            ax2.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
+            
+            # Adicionar valores nas barras como porcentagem
+            for bar in bars2:
+                height = bar.get_height()
+                ax2.text(bar.get_x() + bar.get_width()/2., height + 0.01,
+                        f'{height:.1%}', ha='center', va='bottom', fontsize=6)
         
-        for bar in bars2:
-            height = bar.get_height()
-            ax2.text(bar.get_x() + bar.get_width()/2., height + 0.01,
-                    f'{height:.1%}', ha='center', va='bottom', fontsize=6)
+        fig.tight_layout()
         
-        plt.tight_layout()
-        return fig
+        return {'figures': [fig]}
+    
+    def build_monthly_trend_view(self, agg):
+        """Mostra evolução mensal das métricas principais"""
+        from matplotlib.ticker import FuncFormatter
 
-    def create_monthly_trend_figure(self, df):
-        """Cria figura para evolução mensal"""
-        if 'periodo_dt' not in df.columns or df.empty:
-            return None
-            
-        monthly = df.groupby('periodo_dt').agg({
-            'contatos': 'sum',
-            'aproveitados': 'sum',
-            'vendas': 'sum'
-        }).sort_index()
+        if agg.by_period is None:
+            return {'message': "Dados temporais não disponíveis"}
+        
+        # Agrupar por período
+        monthly = agg.by_period.copy()
         
+        # Calcular métricas
         monthly['taxa_conversao'] = monthly['vendas'] / monthly['contatos']
         monthly['conversao_ap'] = monthly['vendas'] / monthly['aproveitados']
+        
+        # Formatar datas para exibição
         monthly['periodo_formatado'] = monthly.index.map(self.format_period_display)
         
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
+        # Criar gráfico
+        fig = new_figure((10, 8))
+        ax1, ax2 = fig.subplots(2, 1)
         
         # Gráfico 1: Volume
-        ax1.plot(monthly['periodo_formatado'], monthly['contatos'], marker='o', label='Contatos')
-        ax1.plot(monthly['periodo_formatado'], monthly['aproveitados'], marker='o', label='Aproveitados')
-        ax1.plot(monthly['periodo_formatado'], monthly['vendas'], marker='o', label='Vendas')
+        monthly[['contatos', 'aproveitados', 'vendas']].plot(ax=ax1, marker='o')
         ax1.set_title("Evolução Mensal - Volume")
         ax1.set_ylabel("Quantidade")
         ax1.grid(True, linestyle='--', alpha=0.7)
-        ax1.legend()
-        ax1.set_xticks(range(len(monthly)))
-        ax1.set_xticklabels(monthly['periodo_formatado'], rotation=45, ha='right')
+        ax1.legend(['Contatos', 'Aproveitados', 'Vendas'])
+        ax1.set_xlabel('')
         
         # Gráfico 2: Taxas
-        ax2.plot(monthly['periodo_formatado'], monthly['taxa_conversao'], marker='o', label='Conversão Total')
-        ax2.plot(monthly['periodo_formatado'], monthly['conversao_ap'], marker='o', label='Conversão de Aproveitados')
+        monthly[['taxa_conversao', 'conversao_ap']].plot(ax=ax2, marker='o')
         ax2.set_title("Evolução Mensal - Taxas de Conversão")
         ax2.set_ylabel("Taxa")
         ax2.grid(True, linestyle='--', alpha=0.7)
-        ax2.legend()
-        ax2.set_xticks(range(len(monthly)))
-        ax2.set_xticklabels(monthly['periodo_formatado'], rotation=45, ha='right')
-        ax2.yaxis.set_major_formatter(plt.FuncFormatter(lambda y, _: f'{y:.0%}'))
+        ax2.legend(['Conversão Total', 'Conversão de Aproveitados'])
+        ax2.set_xlabel('')
 
-        plt.tight_layout()
-        return fig
+        # Formatar eixos Y como porcentagem
+        ax2.yaxis.set_major_formatter(FuncFormatter(lambda y, _: f'{y:.0%}'))
 
-    def create_top_channels_figure(self, df):
-        """Cria figura para top canais"""
-        if 'origem' not in df.columns or df.empty:
-            return None
-            
-        channel_efficiency = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum',
-            'aproveitados': 'sum'
-        }).reset_index()
+        fig.tight_layout()
+        
+        return {'figures': [fig]}
+    
+    def build_top_channels_view(self, agg):
+        """Mostra os canais mais eficientes"""
+        from matplotlib.ticker import FuncFormatter
+
+        if 'origem' not in agg.columns:
+            return {'message': "Dados de origem não disponíveis"}
         
+        # Calcular eficiência dos canais
+        channel_efficiency = agg.by_origin.copy()
+        
+        # Calcular métricas
         channel_efficiency['taxa_conversao'] = channel_efficiency['vendas'] / channel_efficiency['contatos']
         channel_efficiency['conversao_ap'] = channel_efficiency['vendas'] / channel_efficiency['aproveitados']
         channel_efficiency = channel_efficiency[channel_efficiency['contatos'] >= 50]
         
-        if channel_efficiency.empty:
-            return None
-            
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5))
+        # Criar gráficos
+        fig = new_figure((12, 5))
+        ax1, ax2 = fig.subplots(1, 2)
         
         # Top 5 por conversão total
-        top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao').sort_values('taxa_conversao', ascending=True)
-        bars1 = ax1.barh(top_conversion['origem'], top_conversion['taxa_conversao'], color='skyblue')
-        ax1.set_title("Top 5 Canais - Conversão Total")
-        ax1.set_xlabel("Taxa de Conversão")
-        ax1.grid(axis='x', linestyle='--', alpha=0.7)
-        ax1.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
+        if not channel_efficiency.empty:
+            top_conversion = channel_efficiency.nlargest(5, 'taxa_conversao').sort_values('taxa_conversao', ascending=True)
+            bars1 = ax1.barh(top_conversion['origem'], top_conversion['taxa_conversao'], color='skyblue')
+            ax1.set_title("Top 5 Canais - Conversão Total")
+            ax1.set_xlabel("Taxa de Conversão")
+            ax1.grid(axis='x', linestyle='--', alpha=0.7)
+            
+            # Formatar eixo X como porcentagem
+            ax1.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+            
+            # Adicionar valores nas barras
+            for bar in bars1:
+                width = bar.get_width()
+                ax1.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
+                        f'{width:.1%}', ha='left', va='center')
+            
+            # Top 5 por conversão de leads
+            top_lead_conversion = channel_efficiency.nlargest(5, 'conversao_ap').sort_values('conversao_ap', ascending=True)
+            bars2 = ax2.barh(top_lead_conversion['origem'], top_lead_conversion['conversao_ap'], color='lightgreen')
+            ax2.set_title("Top 5 Canais - Conversão de Leads")
+            ax2.set_xlabel("Taxa de Conversão")
+            ax2.grid(axis='x', linestyle='--', alpha=0.7)
+            
+            # Formatar eixo X como porcentagem
+            ax2.xaxis.set_major_formatter(FuncFormatter(lambda x, _: f'{x:.0%}'))
+            
+            # Adicionar valores nas barras
+            for bar in bars2:
+                width = bar.get_width()
+                ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
+                        f'{width:.1%}', ha='left', va='center')
         
-        for bar in bars1:
-            width = bar.get_width()
-            ax1.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
-                    f'{width:.1%}', ha='left', va='center')
-        
-        # Top 5 por conversão de leads
-        top_lead_conversion = channel_efficiency.nlargest(5, 'conversao_ap').sort_values('conversao_ap', ascending=True)
-        bars2 = ax2.barh(top_lead_conversion['origem'], top_lead_conversion['conversao_ap'], color='lightgreen')
-        ax2.set_title("Top 5 Canais - Conversão de Leads")
-        ax2.set_xlabel("Taxa de Conversão")
-        ax2.grid(axis='x', linestyle='--', alpha=0.7)
-        ax2.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f'{x:.0%}'))
+        fig.tight_layout()
         
-        for bar in bars2:
-            width = bar.get_width()
-            ax2.text(width + 0.01, bar.get_y() + bar.get_height()/2, 
-                    f'{width:.1%}', ha='left', va='center')
+        return {'figures': [fig]}
+    
+    def build_sales_efficiency_view(self, agg):
+        """Mostra eficiência de vendas"""
+        # Verificar se as colunas necessárias existem
+        if 'contatos' not in agg.columns or 'vendas' not in agg.columns:
+            return {'message': "Dados de eficiência não disponíveis"}
         
-        plt.tight_layout()
-        return fig
-
-    def create_sales_efficiency_figure(self, df):
-        """Cria figura para eficiência de vendas"""
-        if 'contatos' not in df.columns or 'vendas' not in df.columns or df.empty:
-            return None
-            
-        grouped = df.groupby('origem').agg({
-            'contatos': 'sum',
-            'vendas': 'sum'
-        }).reset_index()
+        # Agrupar dados por origem e calcular totais
+        grouped = agg.by_origin.copy()
         
+        # Calcular eficiência como porcentagem
         grouped['eficiencia'] = (grouped['vendas'] / grouped['contatos']) * 100
+        
+        # Filtrar origens com pelo menos 10 vendas
         filtered = grouped[grouped['vendas'] >= 10]
         
         if filtered.empty:
-            return None
-            
+            return {'message': "Nenhuma origem com dados suficientes (mínimo 10 vendas)"}
+        
+        # Selecionar top 15
         top_15 = filtered.nlargest(15, 'eficiencia').sort_values('eficiencia', ascending=True)
         
-        fig, ax = plt.subplots(figsize=(10, 6))
+        # Criar gráfico
+        fig = new_figure((10, 6))
+        ax = fig.subplots()
+        
+        # Criar gráfico de barras horizontais
         bars = ax.barh(top_15['origem'], top_15['eficiencia'], color='skyblue')
-        ax.set_title("Eficiência de Vendas (Top 15)")
+        ax.set_title("Eficiência de Vendas (Vendas por Lead - Top 15)")
         ax.set_xlabel("Eficiência (%)")
         ax.grid(axis='x', linestyle='--', alpha=0.7)
         
+        # Adicionar valores nas barras
         for bar in bars:
             width = bar.get_width()
             ax.text(width + 0.5, bar.get_y() + bar.get_height()/2, 
                     f'{width:.1f}%', ha='left', va='center')
         
-        plt.tight_layout()
-        return fig
-
-    def create_correlation_figure(self, df):
-        """Cria figura para correlação"""
-        df_corr = self.calculate_correlations(df)
+        fig.tight_layout()
+        
+        return {'figures': [fig]}
+    
+    def calculate_correlations(self, df, method='pearson', by_city=False):
+        """Calcula correlação entre Leads e Vendas para cada origem (ou cidade e origem)"""
+        by = ('cidade', 'origem') if by_city else ('origem',)
+        return correlation_by_group(df, by=by, method=method)
+    
+    def build_correlation_view(self, df_corr):
+        """Mostra análise de correlação entre leads e vendas (resultado de correlations)"""
         
         if df_corr.empty:
-            return None
-            
+            return {'message': "Dados insuficientes para calcular correlações (mínimo 3 períodos por origem)"}
+        
+        # Separar em melhores e piores
         top_15 = df_corr.head(15).sort_values('correlacao', ascending=False)
         bottom_15 = df_corr.tail(15).sort_values('correlacao', ascending=True)
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7))
+        # Criar gráficos
+        fig = new_figure((14, 7))
+        ax1, ax2 = fig.subplots(1, 2)
         
-        # Melhores correlações
+        # Gráfico 1: Melhores correlações
         bars1 = ax1.barh(top_15['origem'], top_15['correlacao'], color='#2ecc71')
-        ax1.set_title('TOP 15 - Melhores Correlações')
+        ax1.set_title('TOP 15 - Melhores Correlações (Leads x Vendas)')
         ax1.set_xlabel("Coeficiente de Correlação")
         ax1.set_xlim(-1.1, 1.1)
         ax1.grid(axis='x', linestyle='--', alpha=0.7)
         
+        # Adicionar valores nas barras
         for bar in bars1:
             width = bar.get_width()
             ax1.text(width + 0.02 if width > 0 else width - 0.1, 
                     bar.get_y() + bar.get_height()/2, 
                     f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
         
-        # Piores correlações
+        # Gráfico 2: Piores correlações
         bars2 = ax2.barh(bottom_15['origem'], bottom_15['correlacao'], color='#e74c3c')
-        ax2.set_title('TOP 15 - Piores Correlações')
+        ax2.set_title('TOP 15 - Piores Correlações (Leads x Vendas)')
         ax2.set_xlabel("Coeficiente de Correlação")
         ax2.set_xlim(-1.1, 1.1)
         ax2.grid(axis='x', linestyle='--', alpha=0.7)
         
+        # Adicionar valores nas barras
         for bar in bars2:
             width = bar.get_width()
             ax2.text(width + 0.02 if width > 0 else width - 0.1, 
                     bar.get_y() + bar.get_height()/2, 
                     f'{width:.2f}', ha='left' if width > 0 else 'right', va='center')
         
-        plt.tight_layout()
-        return fig
+        fig.tight_layout()
+        
+        return {'figures': [fig]}
+    
+    def build_scatter_plots_view(self, agg):
+        """Mostra gráficos de dispersão entre leads e vendas"""
+        import seaborn as sns
 
-    def create_scatter_figure(self, df):
-        """Cria figura para dispersão"""
         required_columns = ['contatos', 'aproveitados', 'vendas', 'origem']
-        if any(col not in df.columns for col in required_columns) or df.empty:
-            return None
-            
-        df_agg = df.groupby('origem', as_index=False).agg({
-            'contatos': 'sum',
-            'aproveitados': 'sum',
-            'vendas': 'sum'
-        })
+        missing_columns = [col for col in required_columns if col not in agg.columns]
         
+        if missing_columns:
+            return {'message': f"Colunas obrigatórias ausentes: {', '.join(missing_columns)}"}
+        
+        # Agregar dados por origem (somar todos os períodos)
+        df_agg = agg.by_origin.copy()
+        
+        # Filtrar origens com dados válidos
         df_agg = df_agg[
             (df_agg['contatos'] > 0) & 
             (df_agg['vendas'] > 0) & 
@@ -1554,12 +4267,15 @@ class LeadAnalyzerApp:
         ]
         
         if df_agg.empty:
-            return None
-            
+            return {'message': "Sem dados válidos para análise"}
+        
+        # Limitar a 15 canais para melhor visualização
         top_origins = df_agg.nlargest(15, 'contatos')['origem']
         df_filtered = df_agg[df_agg['origem'].isin(top_origins)]
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6))
+        # Criar gráficos
+        fig = new_figure((14, 6))
+        ax1, ax2 = fig.subplots(1, 2)
         
         # Gráfico 1: Leads vs Vendas
         sns.scatterplot(
@@ -1571,15 +4287,12 @@ class LeadAnalyzerApp:
             sizes=(50, 300),
             ax=ax1
         )
-        ax1.set_title('Leads vs Vendas por Canal')
+        ax1.set_title('Relação Leads vs Vendas por Canal')
         ax1.set_xlabel("Total de Leads")
         ax1.set_ylabel("Total de Vendas")
         ax1.grid(True, linestyle='--', alpha=0.7)
         
-        # Remover a legenda do primeiro gráfico
-        if ax1.get_legend() is not None:
-            ax1.get_legend().remove()
-        
+        # Adicionar linha de tendência
         try:
             sns.regplot(data=df_filtered, x='contatos', y='vendas', 
                         scatter=False, ax=ax1, color='gray', line_kws={'alpha': 0.5})
@@ -1596,261 +4309,248 @@ class LeadAnalyzerApp:
             sizes=(50, 300),
             ax=ax2
         )
-        ax2.set_title('Leads Aproveitados vs Vendas')
+        ax2.set_title('Relação Leads Aproveitados vs Vendas por Canal')
         ax2.set_xlabel("Leads Aproveitados")
         ax2.set_ylabel("Total de Vendas")
         ax2.grid(True, linestyle='--', alpha=0.7)
         
+        # Adicionar linha de tendência
         try:
             sns.regplot(data=df_filtered, x='aproveitados', y='vendas', 
                         scatter=False, ax=ax2, color='gray', line_kws={'alpha': 0.5})
         except:
             pass
         
-        # Ajustar layout da legenda (apenas para o segundo gráfico)
-        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        # Ajustar layout da legenda
+        ax2.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+        
+        fig.tight_layout()
         
-        plt.tight_layout()
-        return fig
+        return {'figures': [fig]}
     
-    def generate_pdf_report(self, df, file_path):
-        """Gera relatório em PDF com base nos dados"""
-        # Configurações do documento
-        doc = SimpleDocTemplate(
-            file_path,
-            pagesize=letter,
-            rightMargin=40,
-            leftMargin=40,
-            topMargin=40,
-            bottomMargin=40
-        )
+    def show_detailed_data(self, df):
+        """Mostra dados detalhados na segunda aba"""
+        frame = self.data_frame
         
-        styles = getSampleStyleSheet()
-        
-        # Definir estilos personalizados
-        styles.add(ParagraphStyle(
-            name='TitleStyle',
-            fontSize=18,
-            alignment=TA_CENTER,
-            spaceAfter=12
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='SubtitleStyle',
-            fontSize=12,
-            alignment=TA_CENTER,
-            textColor=colors.grey,
-            spaceAfter=20
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='SectionStyle',
-            fontSize=14,
-            spaceBefore=20,
-            spaceAfter=10
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='BodyStyle',
-            fontSize=10,
-            alignment=TA_JUSTIFY,
-            leading=14
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='MetricStyle',
-            fontSize=14,
-            textColor=colors.darkblue,
-            spaceAfter=5
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='FooterStyle',
-            fontSize=8,
-            textColor=colors.grey,
-            alignment=TA_CENTER
-        ))
-        
-        elements = []
-        fig_paths = []
-        city = self.city_var.get()
-        period_start = self.period_var_start.get()
-        period_end = self.period_var_end.get()
+        # Tabela virtualizada: só as linhas visíveis viram itens do Treeview
+        tree_frame = ctk.CTkFrame(frame)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        try:
-            # Cabeçalho
-            elements.append(Paragraph("Relatório Completo de Performance de Leads", styles['TitleStyle']))
-            
-            # Formatar período
-            start_dt = self.parse_period(period_start)
-            end_dt = self.parse_period(period_end)
-            formatted_start = self.format_period_display(start_dt)
-            formatted_end = self.format_period_display(end_dt)
-            
-            elements.append(Paragraph(f"{city} | {formatted_start} - {formatted_end}", styles['SubtitleStyle']))
-            elements.append(Spacer(1, 12))
-            
-            # Seção: Visão Geral
-            elements.append(Paragraph("1. Visão Geral", styles['SectionStyle']))
-            
-            # Calcular métricas
-            total_contacts = df['contatos'].sum() if 'contatos' in df.columns else 0
-            total_leads = df['aproveitados'].sum() if 'aproveitados' in df.columns else 0
-            total_sales = df['vendas'].sum() if 'vendas' in df.columns else 0
-            
-            conversion_rate = total_sales / total_contacts if total_contacts > 0 else 0
-            lead_conversion_rate = total_sales / total_leads if total_leads > 0 else 0
-            
-            # Criar tabela de métricas
-            metrics_data = [
-                ["Métrica", "Valor", "Insight"],
-                ["Total de Contatos", f"{total_contacts:,.0f}", "Volume total de oportunidades geradas"],
-                ["Leads Aproveitados", f"{total_leads:,.0f}", f"({total_leads/total_contacts:.1%} dos contatos)" if total_contacts > 0 else ""],
-                ["Vendas Fechadas", f"{total_sales:,.0f}", f"({conversion_rate:.1%} de conversão geral)" if total_contacts > 0 else ""],
-                ["Conversão de Leads", f"{lead_conversion_rate:.1%}" if total_leads > 0 else "N/A", "Eficiência no aproveitamento de oportunidades"]
-            ]
-            
-            metrics_table = Table(metrics_data)
-            metrics_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2c3e50")),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ]))
-            elements.append(metrics_table)
-            elements.append(Spacer(1, 20))
-            
-            # Gráficos da Visão Geral
-            fig1 = self.create_summary_figures(df)
-            if fig1:
-                fig_path1 = tempfile.mktemp(suffix='.png')
-                fig1.savefig(fig_path1, bbox_inches='tight')
-                fig_paths.append(fig_path1)
-                elements.append(Image(fig_path1, width=500, height=300))
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Desempenho por Origem
-            elements.append(PageBreak())
-            elements.append(Paragraph("2. Desempenho por Origem", styles['SectionStyle']))
-            
-            # Tabela de desempenho
-            table_data = self.get_origin_performance_data(df)
-            if table_data:
-                origin_table = Table(table_data)
-                origin_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#2c3e50")),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 8),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ]))
-                elements.append(origin_table)
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Conversão por Canal
-            elements.append(PageBreak())
-            elements.append(Paragraph("3. Conversão por Canal", styles['SectionStyle']))
-            
-            fig2 = self.create_conversion_by_channel_figure(df)
-            if fig2:
-                fig_path2 = tempfile.mktemp(suffix='.png')
-                fig2.savefig(fig_path2, bbox_inches='tight')
-                fig_paths.append(fig_path2)
-                elements.append(Image(fig_path2, width=500, height=300))
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Evolução Mensal
-            elements.append(PageBreak())
-            elements.append(Paragraph("4. Evolução Mensal", styles['SectionStyle']))
-            elements.append(Paragraph("Análise: Acompanhe a evolução dos principais indicadores ao longo do tempo. Tendências de crescimento em contatos e vendas indicam eficácia nas estratégias. Quedas consistentes podem sinalizar problemas operacionais ou de mercado.", styles['BodyStyle']))
-    
-            fig3 = self.create_monthly_trend_figure(df)
-            if fig3:
-                fig_path3 = tempfile.mktemp(suffix='.png')
-                fig3.savefig(fig_path3, bbox_inches='tight')
-                fig_paths.append(fig_path3)
-                elements.append(Image(fig_path3, width=500, height=400))
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Top Canais
-            elements.append(PageBreak())
-            elements.append(Paragraph("5. Top Canais", styles['SectionStyle']))
-            elements.append(Paragraph("Análise: Identifique os canais com melhor desempenho. Canais com alta conversão representam oportunidades de investimento. Canais com baixa conversão podem precisar de otimização ou realocação de recursos.", styles['BodyStyle']))
-    
-            fig4 = self.create_top_channels_figure(df)
-            if fig4:
-                fig_path4 = tempfile.mktemp(suffix='.png')
-                fig4.savefig(fig_path4, bbox_inches='tight')
-                fig_paths.append(fig_path4)
-                elements.append(Image(fig_path4, width=500, height=300))
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Eficiência de Vendas
-            elements.append(PageBreak())
-            elements.append(Paragraph("6. Eficiência de Vendas", styles['SectionStyle']))
-            elements.append(Paragraph("Análise: Mede a porcentagem de vendas por lead. Quanto maior o valor, melhor será para investir", styles['BodyStyle']))
-    
-            fig5 = self.create_sales_efficiency_figure(df)
-            if fig5:
-                fig_path5 = tempfile.mktemp(suffix='.png')
-                fig5.savefig(fig_path5, bbox_inches='tight')
-                fig_paths.append(fig_path5)
-                elements.append(Image(fig_path5, width=500, height=350))
-                elements.append(Spacer(1, 20))
-            
-            # Seção: Correlação Leads-Vendas
-            elements.append(PageBreak())
-            elements.append(Paragraph("7. Correlação Leads-Vendas", styles['SectionStyle']))
-            elements.append(Paragraph("Análise: Correlação mede a relação entre leads e vendas. Valores próximos a 1 indicam que o aumento de leads acompanha o aumento de vendas. Valores próximos a -1 indicam relação inversa. Valores próximos a 0 indicam pouca relação entre as variáveis.", styles['BodyStyle']))
-            elements.append(Paragraph("Interpretação: Correlação > 0.7 = Forte relação positiva | 0.3-0.7 = Relação moderada | < 0.3 = Fraca relação", styles['BodyStyle']))
+        # Colunas derivadas na carga ficam ocultas
+        columns = [col for col in df.columns if col not in INTERNAL_COLUMNS]
+        self.detail_table = VirtualTable(tree_frame, [str(col) for col in columns],
+                                         [df[col].to_numpy() for col in columns])
+
+    def show_paged_data(self, state, row_count):
+        """Dados detalhados do banco SQLite: só a página visível é lida (LIMIT/OFFSET)"""
+        tree_frame = ctk.CTkFrame(self.data_frame)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
+
+        store = self.dataset
+        columns = store.detail_columns(state)
+
+        def fetch(offset, limit, sort):
+            if sort is not None:
+                sort = (columns[sort[0]], sort[1])
+            return store.page(state, offset, limit, sort)
+
+        self.detail_table = PagedTable(tree_frame, [str(col) for col in columns], row_count, fetch)
     
-            fig6 = self.create_correlation_figure(df)
-            if fig6:
-                fig_path6 = tempfile.mktemp(suffix='.png')
-                fig6.savefig(fig_path6, bbox_inches='tight')
-                fig_paths.append(fig_path6)
-                elements.append(Image(fig_path6, width=500, height=350))
-                elements.append(Spacer(1, 20))
+    def export_report(self):
+        """Exporta relatório em PDF"""
+        if self.dataset is None:
+            messagebox.showwarning("Exportar", "Carregue os dados primeiro")
+            return
             
-            # Seção: Dispersão Leads x Vendas
-            elements.append(PageBreak())
-            elements.append(Paragraph("8. Dispersão Leads x Vendas", styles['SectionStyle']))
-            elements.append(Paragraph("Análise: Mostra a relação entre volume de leads e vendas geradas. Canais no canto superior direito (muitos leads e vendas) são os mais eficientes. Canais com muitos leads e poucas vendas precisam de otimização.", styles['BodyStyle']))
-
-            fig7 = self.create_scatter_figure(df)
-            if fig7:
-                fig_path7 = tempfile.mktemp(suffix='.png')
-                fig7.savefig(fig_path7, bbox_inches='tight')
-                fig_paths.append(fig_path7)
-                elements.append(Image(fig_path7, width=500, height=300))
-                elements.append(Spacer(1, 20))
+        try:
+            # Obter dados atuais
+            agg = self.get_current_aggregates()
+            if agg is None or agg.empty:
+                messagebox.showwarning("Exportar", "Nenhum dado disponível para exportação")
+                return
             
-            # Rodapé
-            elements.append(Spacer(1, 20))
-            elements.append(Paragraph(f"Relatório gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['FooterStyle']))
-            elements.append(Paragraph("Sistema de Análise de Leads | Dados Confidenciais", styles['FooterStyle']))
+            # Solicitar local para salvar
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".pdf",
+                filetypes=[("PDF files", "*.pdf")]
+            )
+            if not file_path:
+                return
             
-            # Construir PDF
-            doc.build(elements)
+            # Gerar relatório
+            self.generate_pdf_report(file_path, agg)
+            self.refresh_diagnostics()
+            messagebox.showinfo("Exportar", f"Relatório exportado com sucesso!\n{file_path}")
             
-        finally:
-            # Remover arquivos temporários
-            for path in fig_paths:
-                try:
-                    os.remove(path)
-                except:
-                    pass
+        except Exception as e:
+            messagebox.showerror("Erro", f"Falha ao exportar relatório:\n{str(e)}")
+
+    def get_origin_performance_data(self, agg):
+        """Prepara dados para tabela de desempenho por origem"""
+        return origin_performance_table(agg)
+
+    def generate_pdf_report(self, file_path, agg=None):
+        """Gera relatório em PDF com base nos dados"""
+        state = self.get_filter_state()
+        if agg is None:
+            agg = self.get_current_aggregates(state)
+
+        timings = write_pdf_report(
+            file_path,
+            self.city_var.get(),
+            self.parse_period(self.period_var_start.get()),
+            self.parse_period(self.period_var_end.get()),
+            agg,
+            self.dataset.correlations(state)
+        )
+        print("Relatório PDF gerado em {:.1f}s ({})".format(
+            timings['Total'], ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items() if name != 'Total')))
+        return timings
+
+
+# Modo em lote: tamanho (em meses) de cada janela de relatório; None = período inteiro
+BATCH_WINDOWS = {'mensal': 1, 'trimestral': 3, 'semestral': 6, 'anual': 12, 'completo': None}
+
+# Dados compartilhados pelos processos do modo em lote (definidos em _init_batch_worker)
+_batch_dataset = None
+
+
+def period_windows(periods, months):
+    """Agrupa os períodos presentes nos dados (ordinais de mês) em janelas de calendário
+    de `months` meses e devolve [(primeiro período, último período)] de cada janela,
+    em datetime64"""
+    periods = np.unique(periods)
+    periods = periods[periods != month_ordinals(DEFAULT_PERIOD)]
+    if len(periods) == 0:
+        return []
+    starts = month_starts(periods)
+    if months is None:
+        return [(starts[0], starts[-1])]
+
+    # Ordinal 0 é jan/1970: somar os meses até lá alinha as janelas ao ano civil
+    buckets = (periods.astype(np.int64) + 1970 * 12) // months
+    windows = []
+    for bucket in np.unique(buckets):
+        selected = starts[buckets == bucket]
+        windows.append((selected[0], selected[-1]))
+    return windows
+
+
+def report_file_name(state):
+    """Nome do PDF de um relatório do modo em lote"""
+    city = re.sub(r'[^\w.-]+', '_', state.city)
+    start = pd.Timestamp(state.start_dt)
+    end = pd.Timestamp(state.end_dt)
+    return f"{city}_{start:%Y-%m}_a_{end:%Y-%m}.pdf"
+
+
+def _init_batch_worker(dataset):
+    global _batch_dataset
+    _batch_dataset = dataset
+
+
+def run_report_job(state, file_path):
+    """Gera um relatório do modo em lote. Devolve os tempos por seção, ou None
+    quando a seleção não tem dados."""
+    agg = _batch_dataset.aggregate(state)
+    if agg.empty:
+        return None
+
+    df_corr = _batch_dataset.correlations(state)
+    # Os gráficos ficam no próprio processo: o paralelismo é entre relatórios
+    return write_pdf_report(file_path, state.city, pd.Timestamp(state.start_dt), pd.Timestamp(state.end_dt),
+                            agg, df_corr, workers=1)
+
+
+def run_batch(argv=None):
+    """Gera relatórios PDF para cidades × janelas de período sem interface gráfica.
+    Retorna o código de saída do processo (0 = todos os relatórios gerados)."""
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Gera relatórios PDF em lote (uma planilha, várias cidades e períodos) sem abrir a interface."
+    )
+    parser.add_argument("arquivo", help="planilha Excel (.xlsx/.xls), pasta com planilhas ou banco SQLite (.sqlite)")
+    parser.add_argument("-o", "--saida", default="relatorios", help="pasta de destino dos PDFs")
+    parser.add_argument("--cidades", nargs="+", help="cidades (abas) a incluir; padrão: Total e todas as abas")
+    parser.add_argument("--janela", choices=list(BATCH_WINDOWS), default="trimestral",
+                        help="tamanho de cada intervalo de períodos")
+    parser.add_argument("--processos", type=int, default=INGEST_WORKERS,
+                        help="relatórios gerados em paralelo")
+    args = parser.parse_args(argv)
+
+    TIMINGS.enable_log()
+    start = time.perf_counter()
+    try:
+        if args.arquivo.lower().endswith(SQLITE_EXTENSIONS):
+            # Cada processo abre o banco por conta própria (LeadStore segue só com o caminho)
+            dataset = LeadStore(args.arquivo)
+        else:
+            if os.path.isdir(args.arquivo):
+                data = read_folder(args.arquivo, SheetCache(), workers=args.processos)
+            else:
+                data = read_workbook(args.arquivo, SheetCache(), workers=args.processos)
+            prepare_workbook(data)
+            dataset = LeadDataset(data)
+    except Exception as e:
+        print(f"Falha ao carregar arquivo: {args.arquivo}, erro: {str(e)}", file=sys.stderr)
+        return 1
+
+    cities = args.cidades or ["Total"] + dataset.cities
+    unknown = [city for city in cities if city != "Total" and city not in dataset.cities]
+    if unknown:
+        print(f"Cidades não encontradas na planilha: {', '.join(unknown)}", file=sys.stderr)
+        return 1
+
+    windows = period_windows(dataset.periods, BATCH_WINDOWS[args.janela])
+    jobs = [FilterState(city, start_dt, end_dt, ()) for city in cities for start_dt, end_dt in windows]
+    os.makedirs(args.saida, exist_ok=True)
+    print(f"{len(jobs)} relatórios ({len(cities)} cidades × {len(windows)} janelas) em {args.saida}")
+
+    failures = 0
+    workers = max(1, min(args.processos, len(jobs)))
+
+    def report(state, future_result):
+        nonlocal failures
+        path = os.path.join(args.saida, report_file_name(state))
+        try:
+            timings = future_result()
+        except Exception as e:
+            failures += 1
+            print(f"ERRO  {path}: {str(e)}", file=sys.stderr)
+            return
+        if timings is None:
+            print(f"vazio {path} (sem dados no período)")
+        else:
+            print(f"ok    {path} ({timings['Total']:.1f}s)")
+
+    if workers <= 1:
+        _init_batch_worker(dataset)
+        for state in jobs:
+            path = os.path.join(args.saida, report_file_name(state))
+            report(state, lambda: run_report_job(state, path))
+    else:
+        # Os dados carregados seguem uma única vez para cada processo, não a cada relatório
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(dataset,)) as executor:
+            futures = {
+                executor.submit(run_report_job, state, os.path.join(args.saida, report_file_name(state))): state
+                for state in jobs
+            }
+            for future in as_completed(futures):
+                report(futures[future], future.result)
+
+    print(f"Concluído em {time.perf_counter() - start:.1f}s: "
+          f"{len(jobs) - failures} de {len(jobs)} relatórios sem erro")
+    return 1 if failures else 0
+
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
+
+    # Com argumentos, roda o modo em lote sem interface gráfica
+    if len(sys.argv) > 1:
+        sys.exit(run_batch(sys.argv[1:]))
+
     root = ctk.CTk()
     app = LeadAnalyzerApp(root)
     root.mainloop()
\ No newline at end of file